@@ -8,13 +8,13 @@ class DescribeObjectColor(Dispatchable):
     color_tmpl = 'The {obj_name} is primarily {color}'
     color_fail_tmpl = 'I cannot determine the color'
 
-    def __init__(self, state_q):
-        self.state_q = state_q
+    def __init__(self, state_store):
+        self.state_store = state_store
 
     def __call__(self, payload):
-        state = self.state_q.get()
+        version, state = self.state_store.read()
 
-        if state:
+        if len(state):
 
             if type(state[0]) is not constants.ObjectSeries:
                 vecs = to_object_series_list(state)
@@ -55,5 +55,6 @@ class DescribeSceneColor(Dispatchable):
 
 
 def to_object_series_list(state):
-    return [constants.ObjectSeries(obj, index=constants.OBJECT_VECTOR_KEYS) for obj in state]
+    # list() also unpacks the rows of a structured object vector array
+    return [constants.ObjectSeries(list(obj), index=constants.OBJECT_VECTOR_KEYS) for obj in state]
 
@@ -4,13 +4,13 @@ from nlp.dispatch import Dispatchable
 
 class DescribeScene(Dispatchable):
 
-    def __init__(self, state_q):
-        self.state_q = state_q
+    def __init__(self, state_store):
+        self.state_store = state_store
 
     def __call__(self, payload):
-        state = self.state_q.get()
+        version, state = self.state_store.read()
 
-        if state:
+        if len(state):
             description = describe_scene(state)
 
             self.send({'response': description})
@@ -1,18 +1,21 @@
 """ Natural Language Processing (Generation) utilities """
 import os
 import typing
+import logging
 
+import numpy as np
 import pandas as pd
 import object_detection.constants as constants
 
 # fix the antipattern of having a separate folder for every function/class
-from object_detection.color_labeler import estimate as estimate_color
+from object_detection.color_labeler import estimate_colors
 from nlp.plurals import PLURALS
 from collections import defaultdict
-from nlp.transform import position, estimate_distance
+from nlp.transform import position, estimate_distances
 
 from collections import Counter
 
+logger = logging.getLogger(__name__)
 
 
 def pluralize(s):
@@ -49,38 +52,59 @@ def pluralize(s):
         return word + 's'
 
 
-def update_state(image, boxes, classes, scores, category_index, window=10, max_boxes_to_draw=None, min_score_thresh=.5):
+def update_state(image, boxes, classes, scores, category_index, window=10, max_boxes_to_draw=None, min_score_thresh=.5,
+                 color_index=None, instances=None):
     """ Revise state based on latest frame of information (object boxes)
 
-    TODO: complete docstring
+    All the boxes of the frame are handled at once: scores are thresholded with a single mask, the position
+    features are computed in one NumPy operation and the frame is converted to HSV once for all the color histograms.
 
     Args:
-        boxes (list): 2D numpy array of shape (N, 4): (ymin, xmin, ymax, xmax), in normalized format between [0, 1].
-        classes,
+        image (np.array): RGB frame the boxes were detected in
+        boxes (np.array): 2D numpy array of shape (N, 4): (ymin, xmin, ymax, xmax), in normalized format between [0, 1].
+        classes (np.array): N integer class ids
+        scores (np.array): N detection scores, or None to keep every box
+        color_index (ColorHistogramIndex): optional precomputed color index of `image`, if it's going to be queried anyway
+        instances (np.array): optional N persistent instance ids of the boxes, e.g. from `utils.tracking.Tracker`
     Args (that should be class attributes):
         category_index (dict of dicts): {1: {'id': 1, 'name': 'person'}, 2: {'id': 2, 'name': 'bicycle'},...}
     Returns:
-        list: list of object vectors, for example:
-            [
-                ['cup', 0, .95, -.5, .1, 0, .1, .1, 0, .5, .3, .14, .01, .01, .01, .01, .01, .01, .01]
-                ['ski', 0, .80, -.5, .1, 0, .1, .1, 0, .5, .3, .14, .01, .01, .01, .01, .01, .01, .01]
-            ]
-            The object vector keys are defined in constants.OBJECT_VECTOR_KEYS:
+        np.array: structured array of object vectors (dtype constants.OBJECT_VECTOR_DTYPE), one row per object, e.g.
+            [('cup', 0, .95, -.5, .1, 0, .1, .1, 0, .5, .3, .14, .01, .01, .01, .01, .01, .01, .01),
+             ('ski', 0, .80, -.5, .1, 0, .1, .1, 0, .5, .3, .14, .01, .01, .01, .01, .01, .01, .01)]
+            The object vector keys (field names) are defined in constants.OBJECT_VECTOR_KEYS:
                 [category instance confidence x y z width height depth
                  black white red orange yellow green cyan blue purple pink]
+
+    >>> from skimage.data import coffee
+    >>> boxes = np.array([[0., 0., 1., 1.], [0., 0., .5, .5], [.5, .5, 1., 1.]])
+    >>> object_vectors = update_state(coffee(), boxes, np.array([47, 1, 3]), np.array([.9, .3, .6]),
+    ...                               {47: {'id': 47, 'name': 'cup'}})
+    >>> object_vectors[['category', 'confidence', 'x']].tolist()
+    [('cup', 0.8999999761581421, 0.5), ('unknown object', 0.6000000238418579, 0.75)]
     """
     num_boxes = min([boxes.shape[0] if max_boxes_to_draw is None else max_boxes_to_draw, boxes.shape[0], len(classes)])
-    object_vectors = []
-    for i in range(num_boxes):
-        if scores is None or scores[i] > min_score_thresh:
-            # box = tuple(boxes[i].tolist())
-            class_name = category_index.get(classes[i], {'name': 'unknown object'})['name']
-            display_str = '{}: {} {}%'.format(classes[i], class_name, int(100 * scores[i]))
-            print(display_str)  # TODO: Convert to logging
-            # change variable name later
-
-            object_vectors.append([class_name, 0, scores[i]] + list(estimate_distance(boxes[i])) +
-                                  list(estimate_color(image, box=boxes[i])))
+    boxes, classes = np.asarray(boxes)[:num_boxes], np.asarray(classes)[:num_boxes]
+    instances = np.zeros(num_boxes, dtype=np.int32) if instances is None else np.asarray(instances)[:num_boxes]
+    if scores is None:
+        scores = np.ones(num_boxes)
+    else:
+        scores = np.asarray(scores)[:num_boxes]
+        keep = scores > min_score_thresh
+        boxes, classes, scores, instances = boxes[keep], classes[keep], scores[keep], instances[keep]
+
+    object_vectors = np.zeros(len(boxes), dtype=constants.OBJECT_VECTOR_DTYPE)
+    object_vectors['category'] = [category_index.get(c, {'name': 'unknown object'})['name'] for c in classes]
+    object_vectors['instance'] = instances
+    object_vectors['confidence'] = scores
+    for key, column in zip(constants.BB_KEYS, estimate_distances(boxes).T):
+        object_vectors[key] = column
+    for key, column in zip(constants.COLOR_KEYS, estimate_colors(image, boxes, index=color_index).T):
+        object_vectors[key] = column
+
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug(', '.join('{}: {} {}%'.format(c, v['category'], int(100 * v['confidence']))
+                               for c, v in zip(classes, object_vectors)))
     return object_vectors
 
 
@@ -313,7 +337,7 @@ def object_features(obj_vec):
     """Converts object vector to a tuple of labels (name, color, position, etc.)
 
     Args:
-        obj_vec:
+        obj_vec: list, pd.Series or a row of a constants.OBJECT_VECTOR_DTYPE structured array
 
     Returns:
         Tuple of strings with the following format:
@@ -323,7 +347,15 @@ def object_features(obj_vec):
         >>> obj_vec = ['cup', 0, .95, -.5, .1, 0, .1, .1, 0, .5, .3, .14, .01, .01, .01, .01, .01, .01, .01]
         >>> object_features(obj_vec)
         ('cup', 'black', 'left')
+        >>> object_features(np.array([tuple(obj_vec)], dtype=constants.OBJECT_VECTOR_DTYPE)[0])
+        ('cup', 'black', 'left')
     """
+    if isinstance(obj_vec, np.void):
+        # structured array row, no need for a pandas Series
+        colors = [obj_vec[key] for key in constants.COLOR_KEYS]
+        bbox = tuple(obj_vec[key] for key in constants.BB_KEYS)
+        return str(obj_vec['category']), constants.COLOR_KEYS[int(np.argmax(colors))], position(bbox)
+
     if type(obj_vec) is list or type(obj_vec) is pd.Series:
         obj_vec = constants.ObjectSeries(obj_vec, index=constants.ObjectSeries.OBJECT_VECTOR_KEYS)
 
@@ -1,3 +1,6 @@
+import numpy as np
+
+
 def normalize_position(image, box):
     """ Takes in an image which will be provided and then computes the normalized bouding box information.
 
@@ -129,6 +132,24 @@ def estimate_distance(box):
     return x, y, z, width, height, depth
 
 
+def estimate_distances(boxes):
+    """ Vectorized `estimate_distance` for all the boxes in a frame at once
+
+    Args:
+        boxes (np.array): shape (N, 4) of (ymin, xmin, ymax, xmax) rows, normalized between 0 and 1
+
+    Returns:
+        np.array: shape (N, 6) of (x, y, z, width, height, depth) rows
+
+    >>> estimate_distances(np.array([(0.0, 0.0, 1.0, 1.0), (0.0, 0.0, 0.5, 0.75)])).tolist()
+    [[0.5, 0.5, 0.0, 1.0, 1.0, 0.0], [0.375, 0.25, 0.0, 0.75, 0.5, 0.0]]
+    """
+    boxes = np.asarray(boxes, dtype=float).reshape(-1, 4)
+    ymin, xmin, ymax, xmax = boxes.T
+    zeros = np.zeros(len(boxes))
+    return np.column_stack([(xmin + xmax) / 2.0, (ymin + ymax) / 2.0, zeros, xmax - xmin, ymax - ymin, zeros])
+
+
 def position(normalized_box):
     """ takes an image and the bounding box, returns the position of the bounding box with respect to the image
 
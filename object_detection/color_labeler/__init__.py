@@ -1,3 +1,3 @@
 from object_detection.color_labeler.core import estimate_color as estimate  # TODO: this is an anti-pattern, __init__.py should always be empty
-from object_detection.color_labeler.core import estimate_color
+from object_detection.color_labeler.core import estimate_color, estimate_colors, ColorHistogramIndex
 
@@ -11,6 +11,177 @@ import cv2
 
 from object_detection.constants import COLOR_KEYS
 
+# Value histogram bins (out of n_bins_val) at or below which a pixel is black, or above which it's white
+N_BINS_VAL = 32
+BLACK_BIN_THRESH = 5
+WHITE_BIN_THRESH = 7
+# Hue bin edges for [red, orange, yellow, green, cyan, blue, purple, pink], hue is in [0, 179] for uint8 images
+BINS_HUE = [-8, 7, 22, 37, 82, 97, 127, 142, 171]
+
+
+def _pixel_color_lookup_tables():
+    """ Lookup tables that map a uint8 Value to black/white and a uint8 Hue to one of the COLOR_KEYS indices
+
+    Pixels that aren't black or white and whose hue falls outside of BINS_HUE get index len(COLOR_KEYS),
+    so they are left out of the histograms, just like np.histogram leaves them out in `estimate_color`.
+    """
+    bins_val = np.linspace(0, 255, N_BINS_VAL, endpoint=True, dtype='uint8')
+    val_idx = np.digitize(np.arange(256), bins_val)
+    val_lut = np.full(256, -1, dtype=np.int16)
+    val_lut[val_idx <= BLACK_BIN_THRESH] = COLOR_KEYS.index('black')
+    val_lut[val_idx >= (N_BINS_VAL - WHITE_BIN_THRESH)] = COLOR_KEYS.index('white')
+
+    hue_idx = np.digitize(np.arange(256), BINS_HUE) + 1  # 2 for red ... 9 for pink
+    hue_idx[np.arange(256) == BINS_HUE[-1]] = len(COLOR_KEYS) - 1  # np.histogram's last bin includes its right edge
+    hue_idx[(hue_idx < 2) | (hue_idx > len(COLOR_KEYS) - 1)] = len(COLOR_KEYS)
+    return val_lut, hue_idx.astype(np.uint8)
+
+
+VAL_LUT, HUE_LUT = _pixel_color_lookup_tables()
+
+
+def pixel_color_labels(img):
+    """ Label every pixel of an RGB image with the index of its color in COLOR_KEYS
+
+    The frame is converted to HSV only once, whatever the number of boxes that are later looked up in it.
+
+    Returns:
+        np.array: uint8 array of shape img.shape[:2], len(COLOR_KEYS) for pixels that aren't counted
+    """
+    hsv_img = cv2.cvtColor(img, cv2.COLOR_RGB2HSV)
+    val_labels = VAL_LUT[hsv_img[:, :, 2]]
+    return np.where(val_labels >= 0, val_labels, HUE_LUT[hsv_img[:, :, 0]]).astype(np.uint8)
+
+
+def bbox_windows(img_shape, boxes):
+    """ Pixel windows (ystart, xstart, yend, xend) of boxes that are either normalized or in pixels
+
+    Args:
+        img_shape: shape of the image the boxes are in
+        boxes: array of shape (N, 4) with (ymin, xmin, ymax, xmax) rows
+
+    Returns:
+        np.array: int array of shape (N, 4)
+    """
+    boxes = np.asarray(boxes, dtype=float).reshape(-1, 4)
+    scale = np.array([img_shape[0], img_shape[1], img_shape[0], img_shape[1]], dtype=float)
+    normalized = boxes.sum(axis=1) <= 4
+    return np.where(normalized[:, np.newaxis], boxes * scale, boxes).astype(int)
+
+
+def bbox_center_windows(img_shape, boxes):
+    """ Pixel windows (ystart, xstart, yend, xend) around the center of each box, see `_get_bbox_center_img`
+
+    Args:
+        img_shape: shape of the image the boxes are in
+        boxes: array of shape (N, 4) with (ymin, xmin, ymax, xmax) rows, either normalized or in pixels
+
+    Returns:
+        np.array: int array of shape (N, 4)
+    """
+    ymin, xmin, ymax, xmax = bbox_windows(img_shape, boxes).T
+    ht, wd = ymax - ymin, xmax - xmin
+    return np.column_stack([ymin + ht // 4, xmin + wd // 4, ymax - ht // 4, xmax - wd // 4])
+
+
+class ColorHistogramIndex:
+    """ Integral histogram of the pixel colors of one frame, for O(1) color queries on any rectangle
+
+    Building the index costs about as much as counting every pixel of the frame once. After that the color counts of
+    any region take four lookups, however large the region is, so it pays off when a frame is queried many times
+    (lots of boxes, or color questions about arbitrary regions). Memory is 40 bytes per pixel (about 7MB at 480x360).
+
+    >>> img = np.zeros((4, 6, 3), dtype=np.uint8)
+    >>> img[:2, :3] = (150, 0, 0)
+    >>> index = ColorHistogramIndex(img)
+    >>> index.region_counts([(0, 0, 2, 3), (0, 0, 4, 6)]).tolist()
+    [[0, 0, 6, 0, 0, 0, 0, 0, 0, 0], [18, 0, 6, 0, 0, 0, 0, 0, 0, 0]]
+    >>> index.histogram([(0, 0, 1, 1)], center=False).round(2).tolist()
+    [[0.75, 0.0, 0.25, 0.0, 0.0, 0.0, 0.0, 0.0, 0.0, 0.0]]
+    """
+
+    def __init__(self, img):
+        self.shape = img.shape[:2]
+        labels = pixel_color_labels(img)
+        onehot = labels[:, :, np.newaxis] == np.arange(len(COLOR_KEYS), dtype=np.uint8)
+        # zero padded on the top and left so a window starting at row/column 0 needs no special case
+        self.integral = np.zeros((self.shape[0] + 1, self.shape[1] + 1, len(COLOR_KEYS)), dtype=np.int32)
+        np.cumsum(np.cumsum(onehot, axis=0, dtype=np.int32), axis=1, out=self.integral[1:, 1:])
+
+    def region_counts(self, windows):
+        """ Pixel counts per color for pixel windows (ystart, xstart, yend, xend), end exclusive like a slice
+
+        Returns:
+            np.array: int array of shape (N, len(COLOR_KEYS))
+        """
+        windows = np.asarray(windows, dtype=int).reshape(-1, 4)
+        ystart, xstart, yend, xend = np.clip(windows, 0, np.array(self.shape * 2)).T
+        yend, xend = np.maximum(yend, ystart), np.maximum(xend, xstart)
+        return (self.integral[yend, xend] - self.integral[ystart, xend] -
+                self.integral[yend, xstart] + self.integral[ystart, xstart])
+
+    def histogram(self, boxes, center=True):
+        """ Normalized color histograms of boxes (ymin, xmin, ymax, xmax), normalized or in pixels
+
+        Args:
+            boxes: array of shape (N, 4)
+            center: only count the center of each box like `estimate_color` does, rather than the whole box
+
+        Returns:
+            np.array: float array of shape (N, len(COLOR_KEYS)), all zeros for a box with no pixels in it
+        """
+        windows = bbox_center_windows(self.shape, boxes) if center else bbox_windows(self.shape, boxes)
+        return _normalize_counts(self.region_counts(windows).astype(float))
+
+
+def _normalize_counts(counts):
+    totals = counts.sum(axis=1, keepdims=True)
+    return np.divide(counts, totals, out=np.zeros_like(counts), where=totals > 0)
+
+
+def estimate_colors(img, boxes, index=None):
+    """ Color histograms of the center of every box in a frame at once
+
+    Equivalent to calling `estimate_color` for each box, without converting a crop to HSV or building a
+    pandas Series per box: the whole frame is labeled once and all the boxes are counted with one bincount.
+
+    Args:
+        img: source RGB image
+        boxes: array of shape (N, 4) with (ymin, xmin, ymax, xmax) rows
+        index (ColorHistogramIndex): optional precomputed index of `img`, to answer with lookups instead of counting
+
+    Returns:
+        np.array: float array of shape (N, len(COLOR_KEYS)) of normalized pixel color frequencies,
+            all zeros for a box with no pixels in it
+
+    Examples:
+        >>> from skimage.data import coffee
+        >>> img = coffee()
+        >>> colors = estimate_colors(img, [(0, 0, img.shape[0], img.shape[1]), (.1, .2, .6, .5)])
+        >>> colors.shape
+        (2, 10)
+        >>> np.allclose(colors[0], estimate_color(img))
+        True
+        >>> np.allclose(colors, estimate_colors(img, [(0, 0, img.shape[0], img.shape[1]), (.1, .2, .6, .5)],
+        ...                                     index=ColorHistogramIndex(img)))
+        True
+    """
+    if index is not None:
+        return index.histogram(boxes)
+
+    windows = bbox_center_windows(img.shape, boxes)
+    num_labels = len(COLOR_KEYS) + 1
+    if len(windows) == 0:
+        return np.zeros((0, len(COLOR_KEYS)))
+
+    labels = pixel_color_labels(img)
+    # offset each box's labels so a single bincount produces all the histograms
+    box_labels = [labels[ystart:yend, xstart:xend].ravel().astype(np.intp) + i * num_labels
+                  for i, (ystart, xstart, yend, xend) in enumerate(windows)]
+    counts = np.bincount(np.concatenate(box_labels), minlength=len(windows) * num_labels)
+    counts = counts.reshape(len(windows), num_labels)[:, :len(COLOR_KEYS)].astype(float)
+    return _normalize_counts(counts)
+
 
 def estimate_color(img, box=None):
     """
@@ -24,6 +24,9 @@ LABEL_KEYS = 'category instance confidence'.split()
 COLOR_KEYS = 'black white red orange yellow green cyan blue purple pink'.split()
 BB_KEYS = 'x y z width height depth'.split()
 OBJECT_VECTOR_KEYS = LABEL_KEYS + BB_KEYS + COLOR_KEYS
+# one row per object in a frame, see nlp.core.update_state
+OBJECT_VECTOR_DTYPE = np.dtype([('category', 'U32'), ('instance', np.int32), ('confidence', np.float32)] +
+                               [(key, np.float32) for key in BB_KEYS + COLOR_KEYS])
 
 
 class ObjectSeries(pd.Series):
@@ -31,8 +31,8 @@ import logging
 import os
 import random
 import re
+from xml.etree import ElementTree
 
-from lxml import etree
 import PIL.Image
 import tensorflow as tf
 
@@ -40,10 +40,6 @@ from object_detection.utils import dataset_util
 from object_detection.utils import label_map_util
 
 flags = tf.app.flags
-flags.DEFINE_string('data_dir', '', 'Root directory to raw pet dataset.')
-flags.DEFINE_string('output_dir', '', 'Path to directory to output TFRecords.')
-flags.DEFINE_string('label_map_path', 'data/pet_label_map.pbtxt',
-                    'Path to label map proto')
 FLAGS = flags.FLAGS
 
 
@@ -86,7 +82,7 @@ def dict_to_tf_example(data,
     ValueError: if the image pointed to by data['filename'] is not a valid JPEG
   """
   img_path = os.path.join(image_subdirectory, data['filename'])
-  with tf.gfile.GFile(img_path) as fid:
+  with tf.gfile.GFile(img_path, 'rb') as fid:
     encoded_jpg = fid.read()
   encoded_jpg_io = io.BytesIO(encoded_jpg)
   image = PIL.Image.open(encoded_jpg_io)
@@ -118,19 +114,21 @@ def dict_to_tf_example(data,
     xmax.append(float(obj['bndbox']['xmax']) / width)
     ymax.append(float(obj['bndbox']['ymax']) / height)
     class_name = get_class_name_from_filename(data['filename'])
-    classes_text.append(class_name)
+    classes_text.append(class_name.encode('utf8'))
     classes.append(label_map_dict[class_name])
     truncated.append(int(obj['truncated']))
-    poses.append(obj['pose'])
+    poses.append(obj['pose'].encode('utf8'))
 
   example = tf.train.Example(features=tf.train.Features(feature={
       'image/height': dataset_util.int64_feature(height),
       'image/width': dataset_util.int64_feature(width),
-      'image/filename': dataset_util.bytes_feature(data['filename']),
-      'image/source_id': dataset_util.bytes_feature(data['filename']),
-      'image/key/sha256': dataset_util.bytes_feature(key),
+      'image/filename': dataset_util.bytes_feature(
+          data['filename'].encode('utf8')),
+      'image/source_id': dataset_util.bytes_feature(
+          data['filename'].encode('utf8')),
+      'image/key/sha256': dataset_util.bytes_feature(key.encode('utf8')),
       'image/encoded': dataset_util.bytes_feature(encoded_jpg),
-      'image/format': dataset_util.bytes_feature('jpeg'),
+      'image/format': dataset_util.bytes_feature(b'jpeg'),
       'image/object/bbox/xmin': dataset_util.float_list_feature(xmin),
       'image/object/bbox/xmax': dataset_util.float_list_feature(xmax),
       'image/object/bbox/ymin': dataset_util.float_list_feature(ymin),
@@ -169,7 +167,7 @@ def create_tf_record(output_filename,
       continue
     with tf.gfile.GFile(path, 'r') as fid:
       xml_str = fid.read()
-    xml = etree.fromstring(xml_str)
+    xml = ElementTree.fromstring(xml_str)
     data = dataset_util.recursive_parse_xml_to_dict(xml)['annotation']
 
     tf_example = dict_to_tf_example(data, label_map_dict, image_dir)
@@ -208,4 +206,11 @@ def main(_):
                    image_dir, val_examples)
 
 if __name__ == '__main__':
+  # The flags are only defined when run as a script so that the example
+  # builders can be imported next to the other dataset tools.
+  flags.DEFINE_string('data_dir', '', 'Root directory to raw pet dataset.')
+  flags.DEFINE_string('output_dir', '', 'Path to directory to output '
+                      'TFRecords.')
+  flags.DEFINE_string('label_map_path', 'data/pet_label_map.pbtxt',
+                      'Path to label map proto')
   tf.app.run()
@@ -0,0 +1,233 @@
+# Copyright 2017 The TensorFlow Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+
+r"""Convert a detection dataset to sharded TFRecord files in parallel.
+
+The annotations are parsed and the images read and encoded into tf.Examples in
+a pool of worker processes, and the examples are written round robin to
+num_shards TFRecord files, each with an index of its records (see
+utils/tf_record_index.py). Point an input reader at all the shards with
+  input_path: "/data/train.record-?????-of-00010"
+and raise its num_readers to read them in parallel.
+
+The examples are built by the dict_to_tf_example of create_pascal_tf_record.py
+and create_pet_tf_record.py, so the images must be JPEG. Supported annotation
+formats:
+  pascal: one PASCAL VOC XML file per image, the class is the object name.
+  pet: one Oxford-IIIT Pet XML file per image, the class is taken from the
+    image file name.
+  jsonl: JSON lines files with one image per line:
+    {"filename": "frame_0001.jpg", "boxes": [[ymin, xmin, ymax, xmax], ...],
+     "classes": ["person", ...], "difficult": [0, ...]}
+    with the boxes normalized to [0, 1] and "difficult" optional.
+
+Example usage:
+    ./create_sharded_tf_record --format=pascal \
+        --annotations='/home/user/VOC2012/Annotations/*.xml' \
+        --image_dir=/home/user/VOC2012/JPEGImages \
+        --label_map_path=data/pascal_label_map.pbtxt \
+        --output_path=/home/user/VOC2012/output/train.record \
+        --num_shards=10
+"""
+
+import json
+import logging
+import multiprocessing
+import os
+from xml.etree import ElementTree
+
+import PIL.Image
+import tensorflow as tf
+
+from object_detection import create_pascal_tf_record
+from object_detection import create_pet_tf_record
+from object_detection.utils import dataset_util
+from object_detection.utils import label_map_util
+from object_detection.utils import tf_record_index
+
+flags = tf.app.flags
+flags.DEFINE_string('annotations', '', 'Comma separated annotation files or '
+                    'glob patterns.')
+flags.DEFINE_string('format', 'pascal', 'Annotation format, one of pascal, pet '
+                    'and jsonl.')
+flags.DEFINE_string('image_dir', '', 'Directory the image file names of the '
+                    'annotations are relative to.')
+flags.DEFINE_string('label_map_path', 'data/pascal_label_map.pbtxt',
+                    'Path to label map proto')
+flags.DEFINE_string('output_path', '', 'Path of the output TFRecord file, '
+                    'the shards get a -?????-of-????? suffix.')
+flags.DEFINE_integer('num_shards', 10, 'Number of output shards.')
+flags.DEFINE_integer('num_workers', 0, 'Number of worker processes, one per '
+                     'core if 0.')
+flags.DEFINE_boolean('ignore_difficult_instances', False, 'Whether to skip '
+                     'difficult instances.')
+FLAGS = flags.FLAGS
+
+FORMATS = ('pascal', 'pet', 'jsonl')
+
+# The jsonl records are converted to PASCAL dicts, see json_record_to_dict.
+_BUILDERS = {
+    'pascal': create_pascal_tf_record.dict_to_tf_example,
+    'pet': create_pet_tf_record.dict_to_tf_example,
+    'jsonl': create_pascal_tf_record.dict_to_tf_example,
+}
+
+# Label map and options of each pool worker, see _init_worker.
+_worker = {}
+
+
+def json_record_to_dict(record, image_dir):
+  """Converts a JSON lines record (see the module docstring) to the dict
+  returned by dataset_util.recursive_parse_xml_to_dict for a PASCAL XML file.
+
+  Args:
+    record: the decoded JSON record of one image.
+    image_dir: Directory the image file name is relative to, the size of the
+      image is read from its header.
+
+  Returns:
+    data: dict holding the PASCAL XML fields of the image.
+  """
+  with tf.gfile.GFile(os.path.join(image_dir, record['filename']),
+                      'rb') as fid:
+    width, height = PIL.Image.open(fid).size
+  boxes = record.get('boxes', [])
+  difficult = record.get('difficult') or [0] * len(boxes)
+  objects = []
+  for box, class_name, is_difficult in zip(boxes, record.get('classes', []),
+                                           difficult):
+    objects.append({
+        'name': class_name,
+        'pose': 'Unspecified',
+        'truncated': 0,
+        'difficult': int(is_difficult),
+        'bndbox': {'ymin': box[0] * height, 'xmin': box[1] * width,
+                   'ymax': box[2] * height, 'xmax': box[3] * width},
+    })
+  return {'filename': record['filename'],
+          'size': {'width': width, 'height': height},
+          'object': objects}
+
+
+def list_tasks(annotation_paths, annotation_format):
+  """Lists the units of work of the pool workers.
+
+  Args:
+    annotation_paths: annotation file paths.
+    annotation_format: one of FORMATS.
+
+  Returns:
+    the XML file paths for the XML formats, the JSON lines for jsonl.
+  """
+  if annotation_format != 'jsonl':
+    return list(annotation_paths)
+  tasks = []
+  for path in annotation_paths:
+    with tf.gfile.GFile(path, 'r') as fid:
+      tasks.extend(line for line in fid if line.strip())
+  return tasks
+
+
+def _init_worker(label_map_dict, image_dir, annotation_format,
+                 ignore_difficult_instances):
+  _worker['label_map_dict'] = label_map_dict
+  _worker['image_dir'] = image_dir
+  _worker['format'] = annotation_format
+  _worker['ignore_difficult_instances'] = ignore_difficult_instances
+
+
+def _build_example(task):
+  """Returns (serialized tf.Example, source id, class labels) or None."""
+  try:
+    if _worker['format'] == 'jsonl':
+      data = json_record_to_dict(json.loads(task), _worker['image_dir'])
+    else:
+      with tf.gfile.GFile(task, 'r') as fid:
+        xml = ElementTree.fromstring(fid.read())
+      data = dataset_util.recursive_parse_xml_to_dict(xml)['annotation']
+    tf_example = _BUILDERS[_worker['format']](
+        data, _worker['label_map_dict'], _worker['image_dir'],
+        _worker['ignore_difficult_instances'])
+  except (IOError, KeyError, ValueError) as e:
+    logging.warning('Could not convert %s, ignoring example: %s',
+                    task.strip(), e)
+    return None
+  feature = tf_example.features.feature
+  return (tf_example.SerializeToString(),
+          feature['image/source_id'].bytes_list.value[0].decode('utf8'),
+          list(feature['image/object/class/label'].int64_list.value))
+
+
+def create_sharded_tf_record(output_path, label_map_dict, annotation_paths,
+                             image_dir, annotation_format='pascal',
+                             num_shards=10, num_workers=None,
+                             ignore_difficult_instances=False):
+  """Creates sharded TFRecord files and their indexes from annotation files.
+
+  The examples are written in the order of the annotations, example i to
+  shard i % num_shards.
+
+  Args:
+    output_path: path of the unsharded output file.
+    label_map_dict: The label map dictionary.
+    annotation_paths: annotation file paths.
+    image_dir: Directory the image file names are relative to.
+    annotation_format: one of FORMATS.
+    num_shards: number of output shards.
+    num_workers: number of worker processes, one per core if None.
+    ignore_difficult_instances: Whether to skip difficult instances.
+
+  Returns:
+    the paths of the shards.
+
+  Raises:
+    ValueError: if annotation_format is not one of FORMATS.
+  """
+  if annotation_format not in FORMATS:
+    raise ValueError('Unknown annotation format: %s' % annotation_format)
+  tasks = list_tasks(annotation_paths, annotation_format)
+  pool = multiprocessing.Pool(
+      num_workers or None, _init_worker,
+      (label_map_dict, image_dir, annotation_format,
+       ignore_difficult_instances))
+  try:
+    with tf_record_index.ShardedTFRecordWriter(output_path,
+                                               num_shards) as writer:
+      for idx, result in enumerate(pool.imap(_build_example, tasks,
+                                             chunksize=16)):
+        if idx % 1000 == 0:
+          logging.info('On image %d of %d', idx, len(tasks))
+        if result is not None:
+          writer.write(*result)
+  finally:
+    pool.terminate()
+  logging.info('Wrote %d examples to %d shards.', writer.num_records,
+               num_shards)
+  return writer.record_paths
+
+
+def main(_):
+  label_map_dict = label_map_util.get_label_map_dict(FLAGS.label_map_path)
+  annotation_paths = []
+  for pattern in FLAGS.annotations.split(','):
+    annotation_paths.extend(sorted(tf.gfile.Glob(pattern)))
+  create_sharded_tf_record(FLAGS.output_path, label_map_dict,
+                           annotation_paths, FLAGS.image_dir, FLAGS.format,
+                           FLAGS.num_shards, FLAGS.num_workers,
+                           FLAGS.ignore_difficult_instances)
+
+
+if __name__ == '__main__':
+  tf.app.run()
@@ -0,0 +1,157 @@
+# Copyright 2017 The TensorFlow Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+
+"""Tests for object_detection.create_sharded_tf_record."""
+import json
+import os
+
+import numpy as np
+import PIL.Image
+import tensorflow as tf
+
+from object_detection import create_sharded_tf_record
+from object_detection.utils import tf_record_index
+
+PASCAL_XML = """<annotation>
+  <filename>%s</filename>
+  <size><width>8</width><height>4</height><depth>3</depth></size>
+  <object>
+    <name>dog</name><pose>Left</pose><truncated>0</truncated>
+    <difficult>0</difficult>
+    <bndbox><xmin>2</xmin><ymin>1</ymin><xmax>6</xmax><ymax>3</ymax></bndbox>
+  </object>
+  <object>
+    <name>cat</name><pose>Left</pose><truncated>1</truncated>
+    <difficult>1</difficult>
+    <bndbox><xmin>0</xmin><ymin>0</ymin><xmax>4</xmax><ymax>4</ymax></bndbox>
+  </object>
+</annotation>"""
+
+
+class CreateShardedTfRecordTest(tf.test.TestCase):
+
+  def setUp(self):
+    self.image_dir = os.path.join(self.get_temp_dir(), 'images')
+    tf.gfile.MakeDirs(self.image_dir)
+    self.filenames = ['image_%d.jpg' % idx for idx in range(7)]
+    for filename in self.filenames:
+      image = np.random.randint(256, size=(4, 8, 3)).astype(np.uint8)
+      PIL.Image.fromarray(image).save(os.path.join(self.image_dir, filename))
+    self.label_map_dict = {'cat': 1, 'dog': 2}
+
+  def _read_examples(self, record_paths):
+    examples = []
+    for path in record_paths:
+      for record in tf.python_io.tf_record_iterator(path):
+        examples.append(tf.train.Example.FromString(record))
+    return examples
+
+  def test_pascal_examples_are_sharded_and_indexed(self):
+    annotation_paths = []
+    for filename in self.filenames:
+      path = os.path.join(self.get_temp_dir(), filename + '.xml')
+      with tf.gfile.GFile(path, 'w') as fid:
+        fid.write(PASCAL_XML % filename)
+      annotation_paths.append(path)
+    output_path = os.path.join(self.get_temp_dir(), 'pascal.record')
+
+    record_paths = create_sharded_tf_record.create_sharded_tf_record(
+        output_path, self.label_map_dict, annotation_paths, self.image_dir,
+        'pascal', num_shards=3, num_workers=2)
+
+    self.assertEqual(record_paths,
+                     [output_path + '-00000-of-00003',
+                      output_path + '-00001-of-00003',
+                      output_path + '-00002-of-00003'])
+    examples = self._read_examples(record_paths)
+    self.assertEqual(len(examples), 7)
+    source_ids = [example.features.feature['image/source_id'].bytes_list
+                  .value[0].decode('utf8') for example in examples]
+    # Example i is written to shard i % 3.
+    self.assertEqual(source_ids, [self.filenames[i] for i in (0, 3, 6, 1, 4,
+                                                              2, 5)])
+    feature = examples[0].features.feature
+    self.assertAllClose(feature['image/object/bbox/ymin'].float_list.value,
+                        [0.25, 0.0])
+    self.assertAllClose(feature['image/object/bbox/xmax'].float_list.value,
+                        [0.75, 0.5])
+    self.assertAllEqual(feature['image/object/class/label'].int64_list.value,
+                        [2, 1])
+    self.assertAllEqual(feature['image/object/difficult'].int64_list.value,
+                        [0, 1])
+
+    # The index offsets point at the records of the shard.
+    for path in record_paths:
+      with tf.gfile.GFile(tf_record_index.index_path(path), 'r') as fid:
+        entries = [json.loads(line) for line in fid]
+      with tf.gfile.GFile(path, 'rb') as fid:
+        data = fid.read()
+      records = list(tf.python_io.tf_record_iterator(path))
+      self.assertEqual(len(entries), len(records))
+      for entry, record in zip(entries, records):
+        start = entry['offset'] + 12
+        self.assertEqual(data[start:start + entry['length']], record)
+        self.assertEqual(entry['classes'], {'1': 1, '2': 1})
+
+  def test_pet_class_is_taken_from_file_name(self):
+    filename = 'beagle_12.jpg'
+    image = np.random.randint(256, size=(4, 8, 3)).astype(np.uint8)
+    PIL.Image.fromarray(image).save(os.path.join(self.image_dir, filename))
+    path = os.path.join(self.get_temp_dir(), 'beagle_12.xml')
+    with tf.gfile.GFile(path, 'w') as fid:
+      fid.write(PASCAL_XML % filename)
+    output_path = os.path.join(self.get_temp_dir(), 'pet.record')
+
+    record_paths = create_sharded_tf_record.create_sharded_tf_record(
+        output_path, {'beagle': 3}, [path], self.image_dir, 'pet',
+        num_shards=1, num_workers=1)
+
+    examples = self._read_examples(record_paths)
+    self.assertEqual(len(examples), 1)
+    feature = examples[0].features.feature
+    self.assertAllEqual(feature['image/object/class/label'].int64_list.value,
+                        [3, 3])
+    self.assertAllEqual(feature['image/object/class/text'].bytes_list.value,
+                        [b'beagle', b'beagle'])
+
+  def test_jsonl_examples_ignore_difficult_instances(self):
+    path = os.path.join(self.get_temp_dir(), 'annotations.jsonl')
+    with tf.gfile.GFile(path, 'w') as fid:
+      for filename in self.filenames:
+        fid.write(json.dumps({'filename': filename,
+                              'boxes': [[0.1, 0.2, 0.3, 0.4],
+                                        [0.5, 0.6, 0.7, 0.8]],
+                              'classes': ['cat', 'dog'],
+                              'difficult': [0, 1]}) + '\n')
+    output_path = os.path.join(self.get_temp_dir(), 'jsonl.record')
+
+    record_paths = create_sharded_tf_record.create_sharded_tf_record(
+        output_path, self.label_map_dict, [path], self.image_dir, 'jsonl',
+        num_shards=2, num_workers=2, ignore_difficult_instances=True)
+
+    examples = self._read_examples(record_paths)
+    self.assertEqual(len(examples), 7)
+    for example in examples:
+      feature = example.features.feature
+      self.assertAllEqual(feature['image/object/class/label'].int64_list.value,
+                          [1])
+      self.assertAllClose(feature['image/object/bbox/xmin'].float_list.value,
+                          [0.2])
+      self.assertEqual(feature['image/height'].int64_list.value[0], 4)
+      self.assertEqual(feature['image/format'].bytes_list.value[0], b'jpeg')
+
+
+if __name__ == '__main__':
+  tf.test.main()
@@ -54,7 +54,9 @@ from object_detection.protos import eval_pb2
 from object_detection.protos import input_reader_pb2
 from object_detection.protos import model_pb2
 from object_detection.protos import pipeline_pb2
+from object_detection.utils import eval_input_cache
 from object_detection.utils import label_map_util
+from object_detection.utils import tf_record_index
 
 tf.logging.set_verbosity(tf.logging.INFO)
 
@@ -75,6 +77,19 @@ flags.DEFINE_string('input_config_path', '',
                     'Path to an input_reader_pb2.InputReader config file.')
 flags.DEFINE_string('model_config_path', '',
                     'Path to a model_pb2.DetectionModel config file.')
+flags.DEFINE_string('input_cache_dir', '',
+                    'Directory to cache the decoded eval inputs in, so they '
+                    'are decoded once rather than for every checkpoint. The '
+                    'cache is rebuilt when the input config changes.')
+flags.DEFINE_float('eval_subset_fraction', 0.,
+                   'If set, evaluate on this random fraction of the input '
+                   'records only, for a quick look. The subset is copied to '
+                   'eval_dir and reused for every checkpoint.')
+flags.DEFINE_integer('eval_subset_per_class', 0,
+                     'If set, evaluate on a class balanced subset with this '
+                     'many records per class instead.')
+flags.DEFINE_integer('eval_subset_seed', 0,
+                     'Seed of the eval subset sampling.')
 
 FLAGS = flags.FLAGS
 
@@ -139,6 +154,14 @@ def main(unused_argv):
   else:
     model_config, eval_config, input_config = get_configs_from_multiple_files()
 
+  if FLAGS.eval_subset_fraction or FLAGS.eval_subset_per_class:
+    input_config, eval_config.num_examples = (
+        tf_record_index.subset_input_config(
+            input_config, FLAGS.eval_dir,
+            fraction=FLAGS.eval_subset_fraction,
+            num_per_class=FLAGS.eval_subset_per_class,
+            seed=FLAGS.eval_subset_seed))
+
   model_fn = functools.partial(
       model_builder.build,
       model_config=model_config,
@@ -153,8 +176,15 @@ def main(unused_argv):
   categories = label_map_util.convert_label_map_to_categories(
       label_map, max_num_classes)
 
+  input_cache = None
+  if FLAGS.input_cache_dir:
+    input_cache = eval_input_cache.EvalInputCache(
+        FLAGS.input_cache_dir,
+        eval_input_cache.config_hash(input_config, eval_config.num_examples))
+
   evaluator.evaluate(create_input_dict_fn, model_fn, eval_config, categories,
-                     FLAGS.checkpoint_dir, FLAGS.eval_dir)
+                     FLAGS.checkpoint_dir, FLAGS.eval_dir,
+                     input_cache=input_cache)
 
 
 if __name__ == '__main__':
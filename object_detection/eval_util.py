@@ -16,7 +16,9 @@
 """Common functions for repeatedly evaluating a checkpoint.
 """
 import copy
+import functools
 import logging
+import multiprocessing
 import os
 import time
 
@@ -29,6 +31,13 @@ from object_detection.utils import visualization_utils as vis_utils
 
 slim = tf.contrib.slim
 
+# Inputs of the shard workers of evaluate_detection_results_pascal_voc, set by
+# _init_shard_worker in each worker process (and directly when evaluating
+# serially). Handed over as the pool initializer's arguments, the result lists
+# are inherited by forked workers rather than pickled, and pickled once per
+# worker (not per shard) under the spawn and forkserver start methods.
+_shard_inputs = {}
+
 
 def write_metrics(metrics, global_step, summary_dir):
   """Write metrics to a summary directory.
@@ -54,7 +63,9 @@ def evaluate_detection_results_pascal_voc(result_lists,
                                           categories,
                                           label_id_offset=0,
                                           iou_thres=0.5,
-                                          corloc_summary=False):
+                                          corloc_summary=False,
+                                          num_workers=1,
+                                          num_score_bins=None):
   """Computes Pascal VOC detection metrics given groundtruth and detections.
 
   This function computes Pascal VOC metrics. This function by default
@@ -87,6 +98,11 @@ def evaluate_detection_results_pascal_voc(result_lists,
     iou_thres: float determining the IoU threshold at which a box is considered
         correct. Defaults to the standard 0.5.
     corloc_summary: boolean. If True, also outputs CorLoc metrics.
+    num_workers: number of processes to evaluate shards of the images in. The
+      evaluations of the shards are merged into one.
+    num_score_bins: if set, use a StreamingObjectDetectionEvaluation with this
+      many score bins per class, which takes constant memory and is cheap to
+      merge, rather than an exact ObjectDetectionEvaluation.
 
   Returns:
     A dictionary of metric names to scalar values.
@@ -121,24 +137,26 @@ def evaluate_detection_results_pascal_voc(result_lists,
   else:
     image_ids = range(num_results)
 
-  evaluator = object_detection_evaluation.ObjectDetectionEvaluation(
-      num_classes, matching_iou_threshold=iou_thres)
-
-  difficult_lists = None
-  if 'difficult' in result_lists and result_lists['difficult']:
-    difficult_lists = result_lists['difficult']
-  for idx, image_id in enumerate(image_ids):
-    difficult = None
-    if difficult_lists is not None and difficult_lists[idx].size:
-      difficult = difficult_lists[idx].astype(np.bool)
-    evaluator.add_single_ground_truth_image_info(
-        image_id, result_lists['groundtruth_boxes'][idx],
-        result_lists['groundtruth_classes'][idx] - label_id_offset,
-        difficult)
-    evaluator.add_single_detected_image_info(
-        image_id, result_lists['detection_boxes'][idx],
-        result_lists['detection_scores'][idx],
-        result_lists['detection_classes'][idx] - label_id_offset)
+  shard_inputs = dict(result_lists=result_lists, image_ids=image_ids,
+                      num_classes=num_classes, iou_thres=iou_thres,
+                      label_id_offset=label_id_offset,
+                      num_score_bins=num_score_bins)
+  if num_workers > 1 and num_results > 1:
+    shards = np.array_split(np.arange(num_results),
+                            min(num_workers, num_results))
+    pool = multiprocessing.Pool(len(shards), initializer=_init_shard_worker,
+                                initargs=(shard_inputs,))
+    try:
+      evaluators = pool.map(_evaluate_shard, shards)
+    finally:
+      pool.terminate()
+    evaluator = functools.reduce(lambda a, b: a.merge(b), evaluators)
+  else:
+    _init_shard_worker(shard_inputs)
+    try:
+      evaluator = _evaluate_shard(np.arange(num_results))
+    finally:
+      _shard_inputs.clear()
   per_class_ap, mean_ap, _, _, per_class_corloc, mean_corloc = (
       evaluator.evaluate())
 
@@ -161,6 +179,53 @@ def evaluate_detection_results_pascal_voc(result_lists,
   return metrics
 
 
+def _init_shard_worker(shard_inputs):
+  """Sets the inputs _evaluate_shard reads in this process."""
+  _shard_inputs.clear()
+  _shard_inputs.update(shard_inputs)
+
+
+def _evaluate_shard(indices):
+  """Evaluates the images at indices of the result lists in _shard_inputs.
+
+  Args:
+    indices: a numpy array of indices into the result lists.
+
+  Returns:
+    an ObjectDetectionEvaluation (or StreamingObjectDetectionEvaluation) holding
+      the ground truth and detections of those images.
+  """
+  result_lists = _shard_inputs['result_lists']
+  label_id_offset = _shard_inputs['label_id_offset']
+  if _shard_inputs['num_score_bins']:
+    evaluator = object_detection_evaluation.StreamingObjectDetectionEvaluation(
+        _shard_inputs['num_classes'],
+        matching_iou_threshold=_shard_inputs['iou_thres'],
+        num_score_bins=_shard_inputs['num_score_bins'])
+  else:
+    evaluator = object_detection_evaluation.ObjectDetectionEvaluation(
+        _shard_inputs['num_classes'],
+        matching_iou_threshold=_shard_inputs['iou_thres'])
+
+  difficult_lists = None
+  if 'difficult' in result_lists and result_lists['difficult']:
+    difficult_lists = result_lists['difficult']
+  for idx in indices:
+    image_id = _shard_inputs['image_ids'][idx]
+    difficult = None
+    if difficult_lists is not None and difficult_lists[idx].size:
+      difficult = difficult_lists[idx].astype(bool)
+    evaluator.add_single_ground_truth_image_info(
+        image_id, result_lists['groundtruth_boxes'][idx],
+        result_lists['groundtruth_classes'][idx] - label_id_offset,
+        difficult)
+    evaluator.add_single_detected_image_info(
+        image_id, result_lists['detection_boxes'][idx],
+        result_lists['detection_scores'][idx],
+        result_lists['detection_classes'][idx] - label_id_offset)
+  return evaluator
+
+
 # TODO: Add tests.
 def visualize_detection_results(result_dict,
                                 tag,
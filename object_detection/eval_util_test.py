@@ -0,0 +1,85 @@
+# Copyright 2017 The TensorFlow Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+
+"""Tests for object_detection.eval_util."""
+import multiprocessing
+from unittest import mock
+
+import numpy as np
+import tensorflow as tf
+
+from object_detection import eval_util
+
+
+def _random_result_lists(num_images, seed=0):
+  rng = np.random.RandomState(seed)
+  result_lists = {key: [] for key in [
+      'image_id', 'detection_boxes', 'detection_scores', 'detection_classes',
+      'groundtruth_boxes', 'groundtruth_classes', 'difficult']}
+  for i in range(num_images):
+    num_groundtruth = rng.randint(1, 4)
+    corners = rng.uniform(0., .6, (num_groundtruth, 2))
+    groundtruth_boxes = np.concatenate([corners, corners + .3], axis=1)
+    # detections are jittered ground truth boxes plus a false positive
+    detection_boxes = np.concatenate([
+        groundtruth_boxes + rng.uniform(-.05, .05, groundtruth_boxes.shape),
+        [[.1, .1, .2, .2]]]).astype(np.float32)
+    result_lists['image_id'].append(str(i))
+    result_lists['groundtruth_boxes'].append(groundtruth_boxes)
+    result_lists['groundtruth_classes'].append(
+        rng.randint(1, 3, num_groundtruth).astype(np.int32))
+    result_lists['difficult'].append(np.zeros(num_groundtruth, dtype=bool))
+    result_lists['detection_boxes'].append(detection_boxes)
+    result_lists['detection_scores'].append(
+        rng.rand(num_groundtruth + 1).astype(np.float32))
+    result_lists['detection_classes'].append(np.concatenate([
+        result_lists['groundtruth_classes'][-1], [1]]).astype(np.int32))
+  return result_lists
+
+
+class EvaluateDetectionResultsPascalVocTest(tf.test.TestCase):
+
+  def setUp(self):
+    self.categories = [{'id': 1, 'name': 'cat'}, {'id': 2, 'name': 'dog'}]
+    self.result_lists = _random_result_lists(12)
+
+  def _evaluate(self, **kwargs):
+    return eval_util.evaluate_detection_results_pascal_voc(
+        self.result_lists, self.categories, label_id_offset=1,
+        corloc_summary=True, **kwargs)
+
+  def test_parallel_matches_serial(self):
+    serial = self._evaluate()
+    self.assertAllClose(serial, self._evaluate(num_workers=3))
+    self.assertGreater(serial['Precision/mAP@0.5IOU'], 0.)
+
+  def test_parallel_streaming_matches_serial_streaming(self):
+    self.assertAllClose(self._evaluate(num_score_bins=100),
+                        self._evaluate(num_workers=2, num_score_bins=100))
+
+  def test_parallel_without_fork(self):
+    spawn_pool = multiprocessing.get_context('spawn').Pool
+    with mock.patch.object(eval_util.multiprocessing, 'Pool', spawn_pool):
+      parallel = self._evaluate(num_workers=2)
+    self.assertAllClose(self._evaluate(), parallel)
+
+  def test_missing_keys_raise(self):
+    del self.result_lists['groundtruth_boxes']
+    with self.assertRaises(ValueError):
+      self._evaluate(num_workers=2)
+
+
+if __name__ == '__main__':
+  tf.test.main()
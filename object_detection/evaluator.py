@@ -35,22 +35,79 @@ EVAL_METRICS_FN_DICT = {
 }
 
 
+# Input fields read by _extract_prediction_tensors, which are the ones kept in
+# an input cache.
+_CACHED_INPUT_FIELDS = (
+    fields.InputDataFields.image,
+    fields.InputDataFields.source_id,
+    fields.InputDataFields.groundtruth_boxes,
+    fields.InputDataFields.groundtruth_classes,
+    fields.InputDataFields.groundtruth_area,
+    fields.InputDataFields.groundtruth_is_crowd,
+    fields.InputDataFields.groundtruth_difficult,
+    fields.InputDataFields.groundtruth_instance_masks,
+)
+
+
+def _populate_input_cache(create_input_dict_fn, input_cache, num_examples):
+  """Decodes the first num_examples inputs into input_cache.
+
+  The inputs are decoded in a graph and session of their own, so the
+  evaluation graph does not need an input pipeline.
+
+  Args:
+    create_input_dict_fn: function to create input tensor dictionaries.
+    input_cache: an eval_input_cache.EvalInputCache to populate.
+    num_examples: maximum number of examples to decode.
+  """
+  logging.info('Caching decoded inputs in %s.', input_cache.directory)
+  with tf.Graph().as_default():
+    input_dict = create_input_dict_fn()
+    input_dict = {key: value for key, value in input_dict.items()
+                  if key in _CACHED_INPUT_FIELDS}
+    with tf.Session() as sess:
+      sess.run(tf.local_variables_initializer())
+      with slim.queues.QueueRunners(sess):
+        try:
+          for _ in range(int(num_examples)):
+            try:
+              input_cache.add(sess.run(input_dict))
+            except tf.errors.InvalidArgumentError:
+              logging.info('Skipping image')
+        except tf.errors.OutOfRangeError:
+          logging.info('Done caching inputs -- epoch limit reached')
+  input_cache.finish()
+  logging.info('Cached %d inputs.', len(input_cache))
+
+
+def _create_input_placeholders(input_cache):
+  """Returns a dictionary of placeholders fed with the inputs of the cache."""
+  static_shapes = input_cache.static_shapes
+  return {key: tf.placeholder(tf.as_dtype(dtype), static_shapes[key],
+                              name='cached_' + key)
+          for key, dtype in input_cache.dtypes.items()}
+
+
 def _extract_prediction_tensors(model,
                                 create_input_dict_fn,
-                                ignore_groundtruth=False):
+                                ignore_groundtruth=False,
+                                prefetch=True):
   """Restores the model in a tensorflow session.
 
   Args:
     model: model to perform predictions with.
     create_input_dict_fn: function to create input tensor dictionaries.
     ignore_groundtruth: whether groundtruth should be ignored.
+    prefetch: whether to read the inputs through a prefetch queue. Turn this
+      off for inputs that are fed.
 
   Returns:
     tensor_dict: A tensor dictionary with evaluations.
   """
   input_dict = create_input_dict_fn()
-  prefetch_queue = prefetcher.prefetch(input_dict, capacity=500)
-  input_dict = prefetch_queue.dequeue()
+  if prefetch:
+    prefetch_queue = prefetcher.prefetch(input_dict, capacity=500)
+    input_dict = prefetch_queue.dequeue()
   original_image = tf.expand_dims(input_dict[fields.InputDataFields.image], 0)
   preprocessed_image = model.preprocess(tf.to_float(original_image))
   prediction_dict = model.predict(preprocessed_image)
@@ -107,7 +164,7 @@ def _extract_prediction_tensors(model,
 
 
 def evaluate(create_input_dict_fn, create_model_fn, eval_config, categories,
-             checkpoint_dir, eval_dir):
+             checkpoint_dir, eval_dir, input_cache=None):
   """Evaluation function for detection models.
 
   Args:
@@ -118,6 +175,9 @@ def evaluate(create_input_dict_fn, create_model_fn, eval_config, categories,
                 have an integer 'id' field and string 'name' field.
     checkpoint_dir: directory to load the checkpoints to evaluate from.
     eval_dir: directory to write evaluation metrics summary to.
+    input_cache: optional eval_input_cache.EvalInputCache. The inputs are
+      then decoded once (unless the cache is already complete) and every
+      checkpoint is evaluated on the cached inputs.
   """
 
   model = create_model_fn()
@@ -126,10 +186,21 @@ def evaluate(create_input_dict_fn, create_model_fn, eval_config, categories,
     logging.fatal('If ignore_groundtruth=True then an export_path is '
                   'required. Aborting!!!')
 
+  num_batches = eval_config.num_examples
+  input_placeholders = None
+  if input_cache is not None:
+    if not input_cache.complete:
+      _populate_input_cache(create_input_dict_fn, input_cache,
+                            eval_config.num_examples)
+    num_batches = min(num_batches, len(input_cache))
+    input_placeholders = _create_input_placeholders(input_cache)
+    create_input_dict_fn = lambda: input_placeholders
+
   tensor_dict = _extract_prediction_tensors(
       model=model,
       create_input_dict_fn=create_input_dict_fn,
-      ignore_groundtruth=eval_config.ignore_groundtruth)
+      ignore_groundtruth=eval_config.ignore_groundtruth,
+      prefetch=input_cache is None)
 
   def _process_batch(tensor_dict, sess, batch_index, counters, update_op):
     """Evaluates tensors in tensor_dict, visualizing the first K examples.
@@ -156,8 +227,14 @@ def evaluate(create_input_dict_fn, create_model_fn, eval_config, categories,
       if 'original_image' in tensor_dict:
         tensor_dict = {k: v for (k, v) in tensor_dict.iteritems()
                        if k != 'original_image'}
+    feed_dict = None
+    if input_placeholders is not None:
+      cached_inputs = input_cache.get(batch_index)
+      feed_dict = {input_placeholders[key]: value
+                   for key, value in cached_inputs.items()}
     try:
-      (result_dict, _) = sess.run([tensor_dict, update_op])
+      (result_dict, _) = sess.run([tensor_dict, update_op],
+                                  feed_dict=feed_dict)
       counters['success'] += 1
     except tf.errors.InvalidArgumentError:
       logging.info('Skipping image')
@@ -200,7 +277,7 @@ def evaluate(create_input_dict_fn, create_model_fn, eval_config, categories,
       checkpoint_dirs=[checkpoint_dir],
       variables_to_restore=None,
       restore_fn=_restore_latest_checkpoint,
-      num_batches=eval_config.num_examples,
+      num_batches=num_batches,
       eval_interval_secs=eval_config.eval_interval_secs,
       max_number_of_evaluations=(
           1 if eval_config.ignore_groundtruth else
@@ -0,0 +1,201 @@
+# Copyright 2017 The TensorFlow Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+
+"""On-disk cache of decoded evaluation inputs.
+
+The evaluation set is decoded once and its images and groundtruth are written
+to a cache directory, one raw file per input field holding the flattened
+arrays of all the examples back to back. Later evaluations memory-map those
+files instead of reading and decoding the input files again.
+
+A cache lives in a subdirectory named after a hash of the configuration of
+the inputs (see config_hash), so changing the configuration starts a new
+cache. It only counts as complete once its manifest has been written.
+"""
+
+import hashlib
+import json
+import os
+import shutil
+
+import numpy as np
+
+MANIFEST_FILENAME = 'manifest.json'
+
+
+def config_hash(*configs):
+  """Returns a hex digest identifying a set of configurations.
+
+  Args:
+    *configs: protos (hashed by their serialization) or other values (hashed
+      by their repr).
+  """
+  digest = hashlib.sha256()
+  for config in configs:
+    if hasattr(config, 'SerializeToString'):
+      digest.update(config.SerializeToString())
+    else:
+      digest.update(repr(config).encode('utf8'))
+  return digest.hexdigest()[:16]
+
+
+class EvalInputCache(object):
+  """Decoded evaluation inputs cached on disk.
+
+  Populate the cache with add() for every example followed by finish(), then
+  read the examples back with get().
+  """
+
+  def __init__(self, cache_dir, key):
+    """Constructor.
+
+    Args:
+      cache_dir: directory holding the caches.
+      key: name of this cache, e.g. the config_hash of the input config.
+    """
+    self.directory = os.path.join(cache_dir, key)
+    self._manifest = None
+    self._arrays = {}
+    # Open field files and manifest entries while the cache is populated.
+    self._files = None
+    self._manifest_fields = {}
+    self._num_examples = 0
+    manifest_path = os.path.join(self.directory, MANIFEST_FILENAME)
+    if os.path.exists(manifest_path):
+      with open(manifest_path) as fid:
+        self._load(json.load(fid))
+
+  @property
+  def complete(self):
+    return self._manifest is not None
+
+  def __len__(self):
+    return self._manifest['num_examples'] if self.complete else 0
+
+  @property
+  def dtypes(self):
+    """Mapping from the cached field names to their numpy dtypes.
+
+    Bytes fields have dtype object.
+    """
+    dtypes = {key: np.dtype(field['dtype'])
+              for key, field in self._manifest['fields'].items()}
+    dtypes.update({key: np.dtype(object)
+                   for key in self._manifest['bytes_fields']})
+    return dtypes
+
+  @property
+  def static_shapes(self):
+    """Mapping from the cached field names to the shapes of their values.
+
+    Dimensions that differ between examples are None.
+    """
+    static_shapes = {}
+    for key, field in self._manifest['fields'].items():
+      shapes = np.array(field['shapes'], dtype=np.int64).reshape(
+          -1, field['rank'])
+      static_shapes[key] = [
+          int(dims[0]) if len(dims) and np.all(dims == dims[0]) else None
+          for dims in shapes.T]
+    static_shapes.update({key: [] for key in self._manifest['bytes_fields']})
+    return static_shapes
+
+  def _field_path(self, key):
+    return os.path.join(self.directory, key + '.bin')
+
+  def _load(self, manifest):
+    self._manifest = manifest
+    for key, field in manifest['fields'].items():
+      dtype = np.dtype(field['dtype'])
+      shapes = field['shapes']
+      sizes = [int(np.prod(shape)) for shape in shapes]
+      field['offsets'] = np.concatenate([[0], np.cumsum(sizes)]).astype(
+          np.int64)
+      if field['offsets'][-1]:
+        self._arrays[key] = np.memmap(self._field_path(key), dtype=dtype,
+                                      mode='r')
+      else:
+        self._arrays[key] = np.zeros(0, dtype=dtype)
+
+  def add(self, input_dict):
+    """Appends the decoded inputs of one example to the cache.
+
+    Args:
+      input_dict: dictionary from field names to the numpy values of the
+        example, e.g. the result of running the tensors of a decoded input
+        dictionary. Every example must have the same fields; bytes values
+        (such as source ids) are kept in the manifest.
+    """
+    if self._files is None:
+      if os.path.exists(self.directory):
+        shutil.rmtree(self.directory)
+      os.makedirs(self.directory)
+      self._files = {}
+      self._manifest_fields = {}
+      self._num_examples = 0
+    for key, value in input_dict.items():
+      if key not in self._manifest_fields:
+        if isinstance(value, bytes):
+          self._manifest_fields[key] = {'dtype': 'bytes', 'values': []}
+        else:
+          value = np.asarray(value)
+          self._manifest_fields[key] = {'dtype': value.dtype.str,
+                                        'rank': value.ndim, 'shapes': []}
+          self._files[key] = open(self._field_path(key), 'wb')
+      field = self._manifest_fields[key]
+      if field['dtype'] == 'bytes':
+        field['values'].append(value.decode('latin-1'))
+      else:
+        value = np.ascontiguousarray(value, dtype=field['dtype'])
+        self._files[key].write(value.tobytes())
+        field['shapes'].append(list(value.shape))
+    self._num_examples += 1
+
+  def finish(self):
+    """Completes a cache populated with add()."""
+    if self._files is None:
+      if os.path.exists(self.directory):
+        shutil.rmtree(self.directory)
+      os.makedirs(self.directory)
+      self._files = {}
+    for fid in self._files.values():
+      fid.close()
+    self._files = None
+    manifest = {'num_examples': self._num_examples,
+                'fields': {key: field for key, field
+                           in self._manifest_fields.items()
+                           if field['dtype'] != 'bytes'},
+                'bytes_fields': {key: field['values'] for key, field
+                                 in self._manifest_fields.items()
+                                 if field['dtype'] == 'bytes'}}
+    manifest_path = os.path.join(self.directory, MANIFEST_FILENAME)
+    with open(manifest_path + '.tmp', 'w') as fid:
+      json.dump(manifest, fid)
+    os.rename(manifest_path + '.tmp', manifest_path)
+    self._load(manifest)
+
+  def get(self, index):
+    """Returns the inputs of example index.
+
+    The arrays are read only views of the memory-mapped cache files.
+    """
+    input_dict = {}
+    for key, field in self._manifest['fields'].items():
+      start, end = field['offsets'][index], field['offsets'][index + 1]
+      input_dict[key] = self._arrays[key][start:end].reshape(
+          field['shapes'][index])
+    for key, values in self._manifest['bytes_fields'].items():
+      input_dict[key] = values[index].encode('latin-1')
+    return input_dict
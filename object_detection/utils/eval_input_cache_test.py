@@ -0,0 +1,98 @@
+# Copyright 2017 The TensorFlow Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+
+"""Tests for object_detection.utils.eval_input_cache."""
+import numpy as np
+import tensorflow as tf
+
+from object_detection.protos import input_reader_pb2
+from object_detection.utils import eval_input_cache
+
+
+class EvalInputCacheTest(tf.test.TestCase):
+
+  def _make_inputs(self, num_examples):
+    random_state = np.random.RandomState(0)
+    inputs = []
+    for idx in range(num_examples):
+      num_boxes = idx % 3
+      inputs.append({
+          'image': random_state.randint(
+              256, size=(4 + idx, 6, 3)).astype(np.uint8),
+          'source_id': ('image_%d' % idx).encode('utf8'),
+          'groundtruth_boxes': random_state.rand(num_boxes, 4).astype(
+              np.float32),
+          'groundtruth_classes': np.arange(num_boxes, dtype=np.int64),
+      })
+    return inputs
+
+  def test_cached_inputs_are_read_back(self):
+    inputs = self._make_inputs(5)
+    cache = eval_input_cache.EvalInputCache(self.get_temp_dir(), 'key')
+    self.assertFalse(cache.complete)
+    for input_dict in inputs:
+      cache.add(input_dict)
+    self.assertFalse(eval_input_cache.EvalInputCache(self.get_temp_dir(),
+                                                     'key').complete)
+    cache.finish()
+
+    cache = eval_input_cache.EvalInputCache(self.get_temp_dir(), 'key')
+    self.assertTrue(cache.complete)
+    self.assertEqual(len(cache), 5)
+    for idx in [3, 0, 4]:
+      cached = cache.get(idx)
+      self.assertEqual(sorted(cached), sorted(inputs[idx]))
+      self.assertEqual(cached['source_id'], inputs[idx]['source_id'])
+      for key in ['image', 'groundtruth_boxes', 'groundtruth_classes']:
+        self.assertEqual(cached[key].dtype, inputs[idx][key].dtype)
+        self.assertAllEqual(cached[key], inputs[idx][key])
+
+  def test_static_shapes_and_dtypes(self):
+    cache = eval_input_cache.EvalInputCache(self.get_temp_dir(), 'shapes')
+    for input_dict in self._make_inputs(4):
+      cache.add(input_dict)
+    cache.finish()
+    self.assertEqual(cache.static_shapes, {'image': [None, 6, 3],
+                                           'source_id': [],
+                                           'groundtruth_boxes': [None, 4],
+                                           'groundtruth_classes': [None]})
+    self.assertEqual(cache.dtypes['image'], np.uint8)
+    self.assertEqual(tf.as_dtype(cache.dtypes['source_id']), tf.string)
+
+  def test_repopulating_replaces_the_cache(self):
+    cache = eval_input_cache.EvalInputCache(self.get_temp_dir(), 'again')
+    for input_dict in self._make_inputs(4):
+      cache.add(input_dict)
+    cache.finish()
+    inputs = self._make_inputs(2)
+    cache = eval_input_cache.EvalInputCache(self.get_temp_dir(), 'again')
+    for input_dict in inputs:
+      cache.add(input_dict)
+    cache.finish()
+    self.assertEqual(len(cache), 2)
+    self.assertAllEqual(cache.get(1)['image'], inputs[1]['image'])
+
+  def test_config_hash_changes_with_the_config(self):
+    input_config = input_reader_pb2.InputReader()
+    input_config.tf_record_input_reader.input_path = 'eval.record'
+    key = eval_input_cache.config_hash(input_config, 5000)
+    self.assertEqual(key, eval_input_cache.config_hash(input_config, 5000))
+    self.assertNotEqual(key, eval_input_cache.config_hash(input_config, 500))
+    input_config.tf_record_input_reader.input_path = 'other.record'
+    self.assertNotEqual(key, eval_input_cache.config_hash(input_config, 5000))
+
+
+if __name__ == '__main__':
+  tf.test.main()
@@ -18,6 +18,9 @@ from __future__ import division
 
 import numpy as np
 
+# IOU thresholds of the COCO detection metrics, 0.5:0.05:0.95
+COCO_IOU_THRESHOLDS = np.linspace(0.5, 0.95, 10)
+
 
 def compute_precision_recall(scores, labels, num_gt):
   """Compute precision and recall.
@@ -38,7 +41,7 @@ def compute_precision_recall(scores, labels, num_gt):
 
   """
   if not isinstance(
-      labels, np.ndarray) or labels.dtype != np.bool or len(labels.shape) != 1:
+      labels, np.ndarray) or labels.dtype != np.bool_ or len(labels.shape) != 1:
     raise ValueError("labels must be single dimension bool numpy array")
 
   if not isinstance(
@@ -88,12 +91,12 @@ def compute_average_precision(precision, recall):
   if precision is None:
     if recall is not None:
       raise ValueError("If precision is None, recall must also be None")
-    return np.NAN
+    return np.nan
 
   if not isinstance(precision, np.ndarray) or not isinstance(recall,
                                                              np.ndarray):
     raise ValueError("precision and recall must be numpy array")
-  if precision.dtype != np.float or recall.dtype != np.float:
+  if precision.dtype != np.float64 or recall.dtype != np.float64:
     raise ValueError("input must be float numpy array.")
   if len(precision) != len(recall):
     raise ValueError("precision and recall must be of the same size.")
@@ -103,22 +106,168 @@ def compute_average_precision(precision, recall):
     raise ValueError("Precision must be in the range of [0, 1].")
   if np.amin(recall) < 0 or np.amax(recall) > 1:
     raise ValueError("recall must be in the range of [0, 1].")
-  if not all(recall[i] <= recall[i + 1] for i in xrange(len(recall) - 1)):
+  if np.any(np.diff(recall) < 0):
     raise ValueError("recall must be a non-decreasing array")
 
   recall = np.concatenate([[0], recall, [1]])
   precision = np.concatenate([[0], precision, [0]])
+  return _area_under_precision_envelope(precision, recall)
+
+
+def _area_under_precision_envelope(precision, recall):
+  """Area under the precision envelope of precision recall curves.
+
+  Args:
+    precision: A float [N, ...] numpy array of precisions, padded with a 0 at
+      both ends of the first dimension.
+    recall: A float [N, ...] numpy array of non-decreasing recalls, padded with
+      0 at the start and 1 at the end of the first dimension.
+
+  Returns:
+    A float numpy array of shape [...], the area under each curve.
+  """
+  # Preprocess precision to be a non-increasing array, i.e. the maximum
+  # precision at any recall at least as large, with one reverse cumulative max
+  precision = np.maximum.accumulate(precision[::-1], axis=0)[::-1]
+  # steps where recall does not change contribute nothing
+  return np.sum((recall[1:] - recall[:-1]) * precision[1:], axis=0)
+
+
+def compute_average_precision_at_iou_thresholds(scores,
+                                                max_overlaps,
+                                                max_overlap_gt_ids,
+                                                num_gt,
+                                                iou_thresholds=(
+                                                    COCO_IOU_THRESHOLDS),
+                                                is_gt_ignored=None,
+                                                is_detection_ignored=None):
+  """Compute Average Precision of a class at several IOU thresholds at once.
+
+  Detections are matched to ground truth the way PerImageEvaluation matches
+  them: each detection is assigned the ground truth box it overlaps most, and
+  at a given IOU threshold it is a true positive if it overlaps that box at
+  least by the threshold and no higher scoring detection already did. So the
+  true/false positive labels at every threshold follow from the best overlap of
+  each detection, and the detections are sorted only once for all thresholds
+  and area ranges.
+
+  Area ranges (or any other subsets of ground truth, such as difficult boxes)
+  are evaluated by ignoring ground truth boxes outside the range, along with
+  the detections matched to them, and the unmatched detections outside the
+  range, as in the COCO evaluation.
+
+  Args:
+    scores: A float numpy array of shape [N], the scores of all the detections
+      of a class over the whole dataset.
+    max_overlaps: A float numpy array of shape [N], the IOU of each detection
+      with the ground truth box of the same class and image it overlaps most,
+      0 if there is none.
+    max_overlap_gt_ids: An integer numpy array of shape [N], an id of that
+      ground truth box, unique over the whole dataset. Ignored where
+      max_overlaps is 0.
+    num_gt: Number of ground truth instances, or an integer numpy array of
+      shape [R] with the number of ground truth instances that are not ignored
+      in each of R area ranges.
+    iou_thresholds: A float numpy array of shape [T].
+    is_gt_ignored: (optional) A boolean numpy array of shape [N] or [N, R],
+      whether the ground truth box each detection overlaps most is ignored
+      (difficult, or outside the area range).
+    is_detection_ignored: (optional) A boolean numpy array of shape [N] or
+      [N, R], whether each detection is ignored if it is not matched (outside
+      the area range).
+
+  Returns:
+    average_precision: A float numpy array of shape [T], or [T, R] if num_gt is
+      an array, the average precision at each IOU threshold (and area range),
+      NaN where there is no ground truth.
+  """
+  scores = np.asarray(scores, dtype=float)
+  max_overlaps = np.asarray(max_overlaps, dtype=float)
+  max_overlap_gt_ids = np.asarray(max_overlap_gt_ids)
+  iou_thresholds = np.asarray(iou_thresholds, dtype=float).reshape([-1])
+  num_gt = np.asarray(num_gt)
+  num_ranges = 1 if num_gt.ndim == 0 else num_gt.size
+  num_detections = scores.size
+  if (max_overlaps.shape != (num_detections,) or
+      max_overlap_gt_ids.shape != (num_detections,)):
+    raise ValueError("scores, max_overlaps and max_overlap_gt_ids must be "
+                     "single dimension arrays of the same size.")
 
-  # Preprocess precision to be a non-decreasing array
-  for i in range(len(precision) - 2, -1, -1):
-    precision[i] = np.maximum(precision[i], precision[i + 1])
+  def _per_range(is_ignored):
+    if is_ignored is None:
+      return np.zeros([num_detections, num_ranges], dtype=bool)
+    return np.broadcast_to(
+        np.asarray(is_ignored, dtype=bool).reshape([num_detections, -1]),
+        [num_detections, num_ranges])
 
-  indices = np.where(recall[1:] != recall[:-1])[0] + 1
-  average_precision = np.sum(
-      (recall[indices] - recall[indices - 1]) * precision[indices])
+  # the one sort, by decreasing score
+  order = np.argsort(-scores, kind="mergesort")
+  max_overlaps = max_overlaps[order]
+  max_overlap_gt_ids = max_overlap_gt_ids[order]
+  is_gt_ignored = _per_range(is_gt_ignored)[order]
+  is_detection_ignored = _per_range(is_detection_ignored)[order]
+
+  # [N, T]: matched at a threshold, and first to match its box at it
+  is_matched = max_overlaps[:, np.newaxis] >= iou_thresholds
+  is_first_match = (_max_of_previous_in_group(
+      max_overlaps, max_overlap_gt_ids)[:, np.newaxis] < iou_thresholds)
+  # [N, T, R]
+  is_ignored = np.where(is_matched[:, :, np.newaxis],
+                        is_gt_ignored[:, np.newaxis, :],
+                        is_detection_ignored[:, np.newaxis, :])
+  true_positives = np.logical_and(
+      (is_matched & is_first_match)[:, :, np.newaxis], ~is_ignored)
+  false_positives = np.logical_and(~true_positives, ~is_ignored)
+
+  cum_true_positives = np.cumsum(true_positives, axis=0, dtype=float)
+  cum_detections = cum_true_positives + np.cumsum(
+      false_positives, axis=0, dtype=float)
+  # before the first counted detection the precision is 0 at recall 0, which
+  # does not add to the area
+  precision = cum_true_positives / np.maximum(cum_detections, 1)
+  with np.errstate(divide="ignore", invalid="ignore"):
+    recall = cum_true_positives / num_gt.reshape([num_ranges])
+  padding_shape = [1, iou_thresholds.size, num_ranges]
+  precision = np.concatenate(
+      [np.zeros(padding_shape), precision, np.zeros(padding_shape)])
+  recall = np.concatenate(
+      [np.zeros(padding_shape), recall, np.ones(padding_shape)])
+  average_precision = _area_under_precision_envelope(precision, recall)
+  average_precision[:, num_gt.reshape([num_ranges]) == 0] = np.nan
+  if num_gt.ndim == 0:
+    return average_precision[:, 0]
   return average_precision
 
 
+def _max_of_previous_in_group(values, groups):
+  """Maximum of the earlier values with the same group, for each value.
+
+  Args:
+    values: A float numpy array of shape [N] with values in [0, 1].
+    groups: A numpy array of shape [N], the group of each value.
+
+  Returns:
+    A float numpy array of shape [N], -1 where there is no earlier value in the
+      group.
+  """
+  if not values.size:
+    return np.zeros(0)
+  # stable sort by group, which keeps the original order within each group
+  order = np.argsort(groups, kind="mergesort")
+  sorted_groups = groups[order]
+  is_group_start = np.concatenate(
+      [[True], sorted_groups[1:] != sorted_groups[:-1]])
+  # offset each group above all the previous groups so one running max over
+  # everything never carries a value over from one group to the next
+  offsets = 2. * np.cumsum(is_group_start)
+  running_max = np.maximum.accumulate(values[order] + offsets)
+  previous_max = np.concatenate([[-1.], running_max[:-1]]) - offsets
+  previous_max[is_group_start] = -1.
+  result = np.empty_like(previous_max)
+  result[order] = previous_max
+  return result
+
+
 def compute_cor_loc(num_gt_imgs_per_class,
                     num_images_correctly_detected_per_class):
   """Compute CorLoc according to the definition in the following paper.
@@ -75,5 +75,73 @@ class MetricsTest(tf.test.TestCase):
     self.assertTrue(np.isnan(ap))
 
 
+  def test_compute_average_precision_of_unsorted_recall(self):
+    precision = np.array([0.5, 0.5], dtype=float)
+    recall = np.array([0.5, 0.4], dtype=float)
+    with self.assertRaises(ValueError):
+      metrics.compute_average_precision(precision, recall)
+
+  def _greedy_tp_fp_labels(self, scores, max_overlaps, max_overlap_gt_ids,
+                           iou_threshold):
+    tp_fp_labels = np.zeros(scores.size, dtype=bool)
+    is_gt_box_detected = set()
+    for i in np.argsort(-scores, kind='mergesort'):
+      if (max_overlaps[i] >= iou_threshold and
+          max_overlap_gt_ids[i] not in is_gt_box_detected):
+        tp_fp_labels[i] = True
+        is_gt_box_detected.add(max_overlap_gt_ids[i])
+    return tp_fp_labels
+
+  def test_compute_average_precision_at_iou_thresholds(self):
+    np.random.seed(0)
+    scores = np.random.uniform(size=200)
+    max_overlaps = np.random.uniform(size=200)
+    max_overlap_gt_ids = np.random.randint(0, 60, size=200)
+    num_gt = 80
+    iou_thresholds = np.array([0.3, 0.5, 0.75, 0.9])
+    average_precisions = metrics.compute_average_precision_at_iou_thresholds(
+        scores, max_overlaps, max_overlap_gt_ids, num_gt, iou_thresholds)
+
+    expected_average_precisions = []
+    for iou_threshold in iou_thresholds:
+      tp_fp_labels = self._greedy_tp_fp_labels(
+          scores, max_overlaps, max_overlap_gt_ids, iou_threshold)
+      precision, recall = metrics.compute_precision_recall(
+          scores, tp_fp_labels, num_gt)
+      expected_average_precisions.append(
+          metrics.compute_average_precision(precision, recall))
+    self.assertAllClose(average_precisions, expected_average_precisions)
+    self.assertTrue(np.all(np.diff(average_precisions) <= 0))
+
+  def test_compute_average_precision_at_iou_thresholds_per_area_range(self):
+    scores = np.array([0.9, 0.8, 0.7, 0.6], dtype=float)
+    max_overlaps = np.array([0.9, 0.6, 0.0, 0.8], dtype=float)
+    max_overlap_gt_ids = np.array([0, 1, -1, 0])
+    # two area ranges: box 1 and the unmatched detection are only in the
+    # second range
+    num_gt = np.array([1, 2])
+    is_gt_ignored = np.array([[False, False], [True, False], [False, False],
+                              [False, False]])
+    is_detection_ignored = np.array([[False, False], [True, False],
+                                     [True, False], [False, False]])
+    average_precisions = metrics.compute_average_precision_at_iou_thresholds(
+        scores, max_overlaps, max_overlap_gt_ids, num_gt, [0.5, 0.7],
+        is_gt_ignored, is_detection_ignored)
+    # first range: only the 0.9 detection counts before the duplicate at 0.6
+    # second range: at 0.5 both boxes are found by the first two detections,
+    # at 0.7 the second box is missed
+    expected_average_precisions = np.array([[1.0, 1.0], [1.0, 0.5]])
+    self.assertAllClose(average_precisions, expected_average_precisions)
+
+  def test_compute_average_precision_at_iou_thresholds_no_groundtruth(self):
+    average_precisions = metrics.compute_average_precision_at_iou_thresholds(
+        np.array([0.5]), np.array([0.]), np.array([0]), 0)
+    self.assertEqual(average_precisions.shape,
+                     metrics.COCO_IOU_THRESHOLDS.shape)
+    self.assertTrue(np.all(np.isnan(average_precisions)))
+    average_precisions = metrics.compute_average_precision_at_iou_thresholds(
+        np.array([]), np.array([]), np.array([], dtype=int), 3)
+    self.assertAllClose(average_precisions, np.zeros(10))
+
 if __name__ == '__main__':
   tf.test.main()
@@ -126,8 +126,4 @@ class BoxList(object):
       a boolean indicating whether all ymax of boxes are equal or greater than
           ymin, and all xmax of boxes are equal or greater than xmin.
     """
-    if data.shape[0] > 0:
-      for i in xrange(data.shape[0]):
-        if data[i, 0] > data[i, 2] or data[i, 1] > data[i, 3]:
-          return False
-    return True
+    return not np.any((data[:, 0] > data[:, 2]) | (data[:, 1] > data[:, 3]))
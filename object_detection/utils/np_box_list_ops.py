@@ -26,6 +26,11 @@ from object_detection.utils import np_box_list
 from object_detection.utils import np_box_ops
 
 
+# Number of candidate boxes whose IOU with all the later boxes is computed at
+# once by _greedy_nms.
+_NMS_BLOCK_SIZE = 256
+
+
 class SortOrder(object):
   """Enum class for sort order.
 
@@ -162,7 +167,8 @@ def sort_by_field(boxlist, field, order=SortOrder.DESCEND):
 def non_max_suppression(boxlist,
                         max_output_size=10000,
                         iou_threshold=1.0,
-                        score_threshold=-10.0):
+                        score_threshold=-10.0,
+                        class_field=None):
   """Non maximum suppression.
 
   This op greedily selects a subset of detection bounding boxes, pruning
@@ -179,6 +185,9 @@ def non_max_suppression(boxlist,
                      less than this value. Default value is set to -10. A very
                      low threshold to pass pretty much all the boxes, unless
                      the user sets a different score threshold.
+    class_field: (optional) name of a rank-1 field holding the class of each
+                 box. If given, boxes only suppress boxes of the same class;
+                 see batched_non_max_suppression.
 
   Returns:
     a BoxList holding M boxes where M <= max_output_size
@@ -208,29 +217,187 @@ def non_max_suppression(boxlist,
     else:
       return boxlist
 
+  classes = boxlist.get_field(class_field) if class_field else None
+  selected_indices = _greedy_nms(boxlist.get(), iou_threshold, max_output_size,
+                                 classes=classes)
+  return gather(boxlist, selected_indices)
+
+
+def batched_non_max_suppression(boxlist,
+                                max_output_size=10000,
+                                iou_threshold=1.0,
+                                score_threshold=-10.0,
+                                class_field='classes'):
+  """Non maximum suppression applied independently to each class.
+
+  Boxes only suppress boxes that have the same value in class_field, but all
+  classes are sorted together and suppressed in a single pass, rather than
+  running non_max_suppression once per class.
+
+  Args:
+    boxlist: BoxList holding N boxes.  Must contain a rank-1 'scores' field
+      representing detection scores and a rank-1 class_field.
+    max_output_size: maximum number of retained boxes (over all classes).
+    iou_threshold: intersection over union threshold.
+    score_threshold: minimum score threshold. Remove the boxes with scores
+                     less than this value.
+    class_field: name of the field holding the class of each box.
+
+  Returns:
+    a BoxList holding M boxes where M <= max_output_size, sorted by decreasing
+      score.
+  Raises:
+    ValueError: if 'scores' or class_field does not exist
+    ValueError: if threshold is not in [0, 1]
+    ValueError: if max_output_size < 0
+  """
+  if not boxlist.has_field(class_field):
+    raise ValueError('Field ' + class_field + ' does not exist')
+  return non_max_suppression(boxlist, max_output_size, iou_threshold,
+                             score_threshold, class_field=class_field)
+
+
+def soft_non_max_suppression(boxlist,
+                             max_output_size=10000,
+                             iou_threshold=0.3,
+                             sigma=0.5,
+                             score_threshold=0.001,
+                             method='gaussian'):
+  """Soft non maximum suppression (Bodla et al., 2017).
+
+  Rather than discarding the boxes that overlap the selected box, their scores
+  are decayed, by exp(-iou^2 / sigma) with the 'gaussian' method or by
+  (1 - iou) for overlaps above iou_threshold with the 'linear' method. Boxes
+  whose decayed score drops to score_threshold or below are discarded. In each
+  iteration the box with the highest (decayed) score is selected.
+
+  Args:
+    boxlist: BoxList holding N boxes.  Must contain a rank-1 'scores' field
+      representing detection scores. All scores belong to the same class.
+    max_output_size: maximum number of retained boxes
+    iou_threshold: intersection over union threshold of the 'linear' method.
+    sigma: width of the 'gaussian' decay, must be positive.
+    score_threshold: minimum score threshold, applied before and after decay.
+    method: 'gaussian' or 'linear'.
+
+  Returns:
+    a BoxList holding M boxes where M <= max_output_size, in the order they
+      were selected, with their decayed scores in the 'scores' field.
+  Raises:
+    ValueError: if 'scores' field does not exist
+    ValueError: if threshold is not in [0, 1] or sigma is not positive
+    ValueError: if max_output_size < 0
+    ValueError: if method is not 'gaussian' or 'linear'
+  """
+  if not boxlist.has_field('scores'):
+    raise ValueError('Field scores does not exist')
+  if iou_threshold < 0. or iou_threshold > 1.0:
+    raise ValueError('IOU threshold must be in [0, 1]')
+  if sigma <= 0.:
+    raise ValueError('sigma must be positive')
+  if max_output_size < 0:
+    raise ValueError('max_output_size must be bigger than 0.')
+  if method not in ('gaussian', 'linear'):
+    raise ValueError('method must be \'gaussian\' or \'linear\'')
+
+  boxlist = filter_scores_greater_than(boxlist, score_threshold)
   boxes = boxlist.get()
-  num_boxes = boxlist.num_boxes()
+  scores = boxlist.get_field('scores').astype(np.float64)
+  remaining = np.arange(boxlist.num_boxes())
+  selected_indices = []
+  selected_scores = []
+  while remaining.size and len(selected_indices) < max_output_size:
+    best = np.argmax(scores[remaining])
+    i = remaining[best]
+    selected_indices.append(i)
+    selected_scores.append(scores[i])
+    remaining = np.delete(remaining, best)
+    if not remaining.size:
+      break
+
+    intersect_over_union = np_box_ops.iou(boxes[i:i + 1], boxes[remaining])[0]
+    if method == 'gaussian':
+      decay = np.exp(-np.square(intersect_over_union) / sigma)
+    else:
+      decay = np.where(intersect_over_union > iou_threshold,
+                       1. - intersect_over_union, 1.)
+    scores[remaining] *= decay
+    remaining = remaining[scores[remaining] > score_threshold]
+
+  fields = [field for field in boxlist.get_extra_fields() if field != 'scores']
+  selected_boxes = gather(boxlist, np.array(selected_indices, dtype=np.int32),
+                          fields=fields)
+  selected_boxes.add_field(
+      'scores', np.array(selected_scores, dtype=scores.dtype))
+  return selected_boxes
+
+
+def _greedy_nms(boxes, iou_threshold, max_output_size, classes=None):
+  """Greedy NMS over boxes already sorted by decreasing score.
+
+  Rather than computing the IOU of each selected box against the remaining
+  boxes one at a time, the pairwise IOU of a block of up to _NMS_BLOCK_SIZE
+  candidate boxes against all the unsuppressed boxes after them is computed in
+  a single vectorized call, and the greedy selection within the block only
+  updates a boolean mask. Blocking bounds the memory to _NMS_BLOCK_SIZE * N
+  IOU values and keeps the block's temporaries in cache.
+
+  With classes, the boxes are first stably sorted by class, which keeps each
+  class in decreasing score order and makes it contiguous. Blocks are then cut
+  at class boundaries so no IOU is ever computed between boxes of different
+  classes. Classes are independent, so the order they are processed in does
+  not change the result.
+
+  Args:
+    boxes: a numpy array of shape [N, 4] sorted by decreasing score.
+    iou_threshold: intersection over union threshold.
+    max_output_size: maximum number of selected boxes.
+    classes: (optional) a numpy array of shape [N]. If given, boxes only
+      suppress boxes of the same class.
+
+  Returns:
+    a numpy int32 array of the selected indices in increasing order.
+  """
+  num_boxes = boxes.shape[0]
+  if classes is not None:
+    order = np.argsort(classes, kind='mergesort')
+    boxes = boxes[order]
+    classes = classes[order]
+    class_ends = np.searchsorted(classes, classes, side='right')
+    # selection follows class order here, so the cap is applied at the end
+    max_selected = num_boxes
+  else:
+    max_selected = max_output_size
+
   # is_index_valid is True only for all remaining valid boxes,
-  is_index_valid = np.full(num_boxes, 1, dtype=bool)
+  is_index_valid = np.ones(num_boxes, dtype=bool)
   selected_indices = []
-  num_output = 0
-  for i in xrange(num_boxes):
-    if num_output < max_output_size:
-      if is_index_valid[i]:
-        num_output += 1
-        selected_indices.append(i)
-        is_index_valid[i] = False
-        valid_indices = np.where(is_index_valid)[0]
-        if valid_indices.size == 0:
+  start = 0
+  while start < num_boxes and len(selected_indices) < max_selected:
+    # blocks never span two classes, so only boxes up to the end of the class
+    # can be suppressed by the block
+    stop = num_boxes if classes is None else class_ends[start]
+    end = min(start + _NMS_BLOCK_SIZE, stop)
+    candidates = start + np.flatnonzero(is_index_valid[start:end])
+    if candidates.size:
+      # boxes already suppressed by an earlier block need no IOU computed
+      remaining = start + np.flatnonzero(is_index_valid[start:stop])
+      suppressed = np.greater(
+          np_box_ops.iou(boxes[candidates], boxes[remaining]), iou_threshold)
+      for row, i in enumerate(candidates):
+        if len(selected_indices) >= max_selected:
           break
+        if is_index_valid[i]:
+          selected_indices.append(i)
+          is_index_valid[remaining[suppressed[row]]] = False
+    start = end
 
-        intersect_over_union = np_box_ops.iou(
-            np.expand_dims(boxes[i, :], axis=0), boxes[valid_indices, :])
-        intersect_over_union = np.squeeze(intersect_over_union, axis=0)
-        is_index_valid[valid_indices] = np.logical_and(
-            is_index_valid[valid_indices],
-            intersect_over_union <= iou_threshold)
-  return gather(boxlist, np.array(selected_indices))
+  selected_indices = np.array(selected_indices, dtype=np.int32)
+  if classes is not None:
+    # a box is selected or not based on higher scoring boxes only, so keeping
+    # the highest scoring selections is the same as stopping early
+    selected_indices = np.sort(order[selected_indices])[:max_output_size]
+  return selected_indices.astype(np.int32)
 
 
 def multi_class_non_max_suppression(boxlist, score_thresh, iou_thresh,
@@ -282,28 +449,31 @@ def multi_class_non_max_suppression(boxlist, score_thresh, iou_thresh,
     raise ValueError('scores field must be of rank 1 or 2')
   num_boxes = boxlist.num_boxes()
   num_scores = scores.shape[0]
-  num_classes = scores.shape[1]
 
   if num_boxes != num_scores:
     raise ValueError('Incorrect scores field length: actual vs expected.')
 
-  selected_boxes_list = []
-  for class_idx in range(num_classes):
-    boxlist_and_class_scores = np_box_list.BoxList(boxlist.get())
-    class_scores = np.reshape(scores[0:num_scores, class_idx], [-1])
-    boxlist_and_class_scores.add_field('scores', class_scores)
-    boxlist_filt = filter_scores_greater_than(boxlist_and_class_scores,
-                                              score_thresh)
-    nms_result = non_max_suppression(boxlist_filt,
-                                     max_output_size=max_output_size,
-                                     iou_threshold=iou_thresh,
-                                     score_threshold=score_thresh)
-    nms_result.add_field(
-        'classes', np.zeros_like(nms_result.get_field('scores')) + class_idx)
-    selected_boxes_list.append(nms_result)
-  selected_boxes = concatenate(selected_boxes_list)
-  sorted_boxes = sort_by_field(selected_boxes, 'scores')
-  return sorted_boxes
+  # Every (box, class) pair that passes the score threshold is a candidate.
+  # All candidates are sorted once and suppressed in a single pass in which
+  # boxes only suppress boxes of their own class.
+  box_indices, class_indices = np.nonzero(scores > score_thresh)
+  candidates = np_box_list.BoxList(boxlist.get()[box_indices])
+  candidates.add_field('scores', scores[box_indices, class_indices])
+  candidates.add_field('classes', class_indices.astype(scores.dtype))
+  candidates = sort_by_field(candidates, 'scores')
+  selected_indices = _greedy_nms(candidates.get(), iou_thresh,
+                                 candidates.num_boxes(),
+                                 classes=candidates.get_field('classes'))
+
+  # Capping each class afterwards is the same as stopping each class early:
+  # boxes past the cap only ever suppress lower scoring boxes of their class.
+  selected_classes = candidates.get_field('classes')[selected_indices]
+  order = np.argsort(selected_classes, kind='mergesort')
+  sorted_classes = selected_classes[order]
+  rank_in_class = np.empty_like(order)
+  rank_in_class[order] = np.arange(order.size) - np.searchsorted(
+      sorted_classes, sorted_classes)
+  return gather(candidates, selected_indices[rank_in_class < max_output_size])
 
 
 def scale(boxlist, y_scale, x_scale):
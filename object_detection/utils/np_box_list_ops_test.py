@@ -382,6 +382,79 @@ class NonMaximumSuppressionTest(tf.test.TestCase):
         boxlist, max_output_size, iou_threshold)
     self.assertAllClose(nms_boxlist.get(), expected_boxes)
 
+  def test_blockwise_nms_matches_single_block(self):
+    np.random.seed(0)
+    corners = np.random.uniform(0, 10, size=(200, 2))
+    sizes = np.random.uniform(0.5, 3, size=(200, 2))
+    boxlist = np_box_list.BoxList(np.hstack([corners, corners + sizes]))
+    boxlist.add_field('scores', np.random.uniform(size=200))
+
+    nms_boxlist = np_box_list_ops.non_max_suppression(
+        boxlist, max_output_size=50, iou_threshold=0.3)
+    block_size = np_box_list_ops._NMS_BLOCK_SIZE
+    np_box_list_ops._NMS_BLOCK_SIZE = 7
+    try:
+      blockwise_boxlist = np_box_list_ops.non_max_suppression(
+          boxlist, max_output_size=50, iou_threshold=0.3)
+    finally:
+      np_box_list_ops._NMS_BLOCK_SIZE = block_size
+    self.assertEqual(nms_boxlist.num_boxes(), 50)
+    self.assertAllClose(nms_boxlist.get(), blockwise_boxlist.get())
+
+  def test_batched_nms_only_suppresses_boxes_of_the_same_class(self):
+    boxlist = np_box_list.BoxList(self._boxes)
+    boxlist.add_field('scores',
+                      np.array([.9, .75, .6, .95, .2, .3], dtype=float))
+    boxlist.add_field('classes', np.array([1, 2, 1, 1, 1, 1]))
+
+    nms_boxlist = np_box_list_ops.batched_non_max_suppression(
+        boxlist, max_output_size=10, iou_threshold=0.5)
+    expected_boxes = np.array([[0, 10, 1, 11], [0, 0, 1, 1], [0, 0.1, 1, 1.1],
+                               [0, 100, 1, 101]],
+                              dtype=float)
+    self.assertAllClose(nms_boxlist.get(), expected_boxes)
+    self.assertAllEqual(nms_boxlist.get_field('classes'), [1, 1, 2, 1])
+
+  def test_batched_nms_with_no_classes_field(self):
+    boxlist = np_box_list.BoxList(self._boxes)
+    boxlist.add_field('scores',
+                      np.array([.9, .75, .6, .95, .2, .3], dtype=float))
+    with self.assertRaises(ValueError):
+      np_box_list_ops.batched_non_max_suppression(
+          boxlist, max_output_size=10, iou_threshold=0.5)
+
+  def test_soft_nms_gaussian_decays_overlapping_scores(self):
+    boxes = np.array([[0, 0, 1, 1], [0, 0, 1, 1], [0, 0.5, 1, 1.5],
+                      [0, 10, 1, 11]], dtype=float)
+    boxlist = np_box_list.BoxList(boxes)
+    boxlist.add_field('scores', np.array([.9, .8, .7, .6]))
+
+    nms_boxlist = np_box_list_ops.soft_non_max_suppression(
+        boxlist, max_output_size=4, sigma=0.5, score_threshold=0.001)
+    iou = 1. / 3.
+    # the partly overlapping box falls behind the isolated one once decayed.
+    expected_boxes = np.array([[0, 0, 1, 1], [0, 10, 1, 11], [0, 0.5, 1, 1.5],
+                               [0, 0, 1, 1]], dtype=float)
+    expected_scores = np.array([
+        .9, .6, .7 * np.exp(-iou**2 / 0.5),
+        .8 * np.exp(-1. / 0.5) * np.exp(-iou**2 / 0.5)])
+    self.assertAllClose(nms_boxlist.get(), expected_boxes)
+    self.assertAllClose(nms_boxlist.get_field('scores'), expected_scores)
+
+  def test_soft_nms_linear_drops_boxes_below_score_threshold(self):
+    boxes = np.array([[0, 0, 1, 1], [0, 0, 1, 1], [0, 0.5, 1, 1.5]],
+                     dtype=float)
+    boxlist = np_box_list.BoxList(boxes)
+    boxlist.add_field('scores', np.array([.9, .8, .7]))
+
+    nms_boxlist = np_box_list_ops.soft_non_max_suppression(
+        boxlist, max_output_size=3, iou_threshold=0.5, method='linear')
+    # the duplicate box has iou 1 with the first box so its score drops to 0,
+    # the third box has iou 1/3 so it is kept as is.
+    expected_boxes = np.array([[0, 0, 1, 1], [0, 0.5, 1, 1.5]], dtype=float)
+    self.assertAllClose(nms_boxlist.get(), expected_boxes)
+    self.assertAllClose(nms_boxlist.get_field('scores'), [.9, .7])
+
   def test_multiclass_nms(self):
     boxlist = np_box_list.BoxList(
         np.array(
@@ -410,5 +483,38 @@ class NonMaximumSuppressionTest(tf.test.TestCase):
     self.assertAllClose(boxes, expected_boxes)
 
 
+  def test_multiclass_nms_matches_per_class_nms(self):
+    np.random.seed(0)
+    corners = np.random.uniform(0, 10, size=(100, 2))
+    sizes = np.random.uniform(0.5, 3, size=(100, 2))
+    boxes = np.hstack([corners, corners + sizes])
+    scores = np.random.uniform(size=(100, 6))
+    boxlist = np_box_list.BoxList(boxes)
+    boxlist.add_field('scores', scores)
+    boxlist_clean = np_box_list_ops.multi_class_non_max_suppression(
+        boxlist, score_thresh=0.5, iou_thresh=0.3, max_output_size=4)
+
+    classes_clean = boxlist_clean.get_field('classes')
+    for class_idx in range(scores.shape[1]):
+      class_boxlist = np_box_list.BoxList(boxes)
+      class_boxlist.add_field('scores', scores[:, class_idx])
+      expected = np_box_list_ops.non_max_suppression(
+          class_boxlist, max_output_size=4, iou_threshold=0.3,
+          score_threshold=0.5)
+      in_class = classes_clean == class_idx
+      self.assertAllClose(boxlist_clean.get()[in_class], expected.get())
+      self.assertAllClose(boxlist_clean.get_field('scores')[in_class],
+                          expected.get_field('scores'))
+    self.assertTrue(
+        np.all(np.diff(boxlist_clean.get_field('scores')) <= 0))
+
+  def test_multiclass_nms_with_no_boxes_above_threshold(self):
+    boxlist = np_box_list.BoxList(self._boxes)
+    boxlist.add_field('scores', np.full((6, 3), 0.1))
+    boxlist_clean = np_box_list_ops.multi_class_non_max_suppression(
+        boxlist, score_thresh=0.5, iou_thresh=0.5, max_output_size=3)
+    self.assertEqual(boxlist_clean.num_boxes(), 0)
+    self.assertEqual(boxlist_clean.get_field('classes').shape, (0,))
+
 if __name__ == '__main__':
   tf.test.main()
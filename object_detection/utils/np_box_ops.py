@@ -47,17 +47,14 @@ def intersection(boxes1, boxes2):
   [y_min1, x_min1, y_max1, x_max1] = np.split(boxes1, 4, axis=1)
   [y_min2, x_min2, y_max2, x_max2] = np.split(boxes2, 4, axis=1)
 
-  all_pairs_min_ymax = np.minimum(y_max1, np.transpose(y_max2))
-  all_pairs_max_ymin = np.maximum(y_min1, np.transpose(y_min2))
-  intersect_heights = np.maximum(
-      np.zeros(all_pairs_max_ymin.shape),
-      all_pairs_min_ymax - all_pairs_max_ymin)
-  all_pairs_min_xmax = np.minimum(x_max1, np.transpose(x_max2))
-  all_pairs_max_xmin = np.maximum(x_min1, np.transpose(x_min2))
-  intersect_widths = np.maximum(
-      np.zeros(all_pairs_max_xmin.shape),
-      all_pairs_min_xmax - all_pairs_max_xmin)
-  return intersect_heights * intersect_widths
+  intersect_heights = np.minimum(y_max1, np.transpose(y_max2))
+  intersect_heights -= np.maximum(y_min1, np.transpose(y_min2))
+  np.maximum(intersect_heights, 0, out=intersect_heights)
+  intersect_widths = np.minimum(x_max1, np.transpose(x_max2))
+  intersect_widths -= np.maximum(x_min1, np.transpose(x_min2))
+  np.maximum(intersect_widths, 0, out=intersect_widths)
+  intersect_heights *= intersect_widths
+  return intersect_heights
 
 
 def iou(boxes1, boxes2):
@@ -28,6 +28,7 @@ It supports the following operations:
 Note: This module operates on numpy boxes and box lists.
 """
 
+import collections
 import logging
 import numpy as np
 
@@ -42,21 +43,40 @@ class ObjectDetectionEvaluation(object):
                num_groundtruth_classes,
                matching_iou_threshold=0.5,
                nms_iou_threshold=1.0,
-               nms_max_output_boxes=10000):
+               nms_max_output_boxes=10000,
+               iou_thresholds=None):
+    """Constructor.
+
+    Args:
+      num_groundtruth_classes: Number of ground truth object classes.
+      matching_iou_threshold: IOU threshold of a true positive for evaluate().
+      nms_iou_threshold: IOU threshold used in Non Maximum Suppression.
+      nms_max_output_boxes: Number of maximum output boxes in NMS.
+      iou_thresholds: (optional) A float numpy array of shape [T]. If set, the
+        best ground truth overlap of every detection is kept as well, and
+        evaluate_at_iou_thresholds() gives the average precision at each of
+        these IOU thresholds, e.g. metrics.COCO_IOU_THRESHOLDS.
+    """
     self.per_image_eval = per_image_evaluation.PerImageEvaluation(
         num_groundtruth_classes, matching_iou_threshold, nms_iou_threshold,
         nms_max_output_boxes)
     self.num_class = num_groundtruth_classes
+    self.iou_thresholds = iou_thresholds
 
     self.groundtruth_boxes = {}
     self.groundtruth_class_labels = {}
     self.groundtruth_is_difficult_list = {}
     self.num_gt_instances_per_class = np.zeros(self.num_class, dtype=int)
     self.num_gt_imgs_per_class = np.zeros(self.num_class, dtype=int)
+    # id of the first ground truth box of each image, so that the boxes have
+    # ids unique over the dataset
+    self.groundtruth_id_offsets = {}
+    self.num_groundtruth_boxes = 0
 
     self.detection_keys = set()
     self.scores_per_class = [[] for _ in range(self.num_class)]
     self.tp_fp_labels_per_class = [[] for _ in range(self.num_class)]
+    self._clear_max_overlaps()
     self.num_images_correctly_detected_per_class = np.zeros(self.num_class)
     self.average_precision_per_class = np.empty(self.num_class, dtype=float)
     self.average_precision_per_class.fill(np.nan)
@@ -68,12 +88,19 @@ class ObjectDetectionEvaluation(object):
     self.detection_keys = {}
     self.scores_per_class = [[] for _ in range(self.num_class)]
     self.tp_fp_labels_per_class = [[] for _ in range(self.num_class)]
+    self._clear_max_overlaps()
     self.num_images_correctly_detected_per_class = np.zeros(self.num_class)
     self.average_precision_per_class = np.zeros(self.num_class, dtype=float)
     self.precisions_per_class = []
     self.recalls_per_class = []
     self.corloc_per_class = np.ones(self.num_class, dtype=float)
 
+  def _clear_max_overlaps(self):
+    self.overlap_scores_per_class = [[] for _ in range(self.num_class)]
+    self.max_overlaps_per_class = [[] for _ in range(self.num_class)]
+    self.max_overlap_gt_ids_per_class = [[] for _ in range(self.num_class)]
+    self.is_gt_difficult_per_class = [[] for _ in range(self.num_class)]
+
   def add_single_ground_truth_image_info(self,
                                          image_key,
                                          groundtruth_boxes,
@@ -99,6 +126,8 @@ class ObjectDetectionEvaluation(object):
 
     self.groundtruth_boxes[image_key] = groundtruth_boxes
     self.groundtruth_class_labels[image_key] = groundtruth_class_labels
+    self.groundtruth_id_offsets[image_key] = self.num_groundtruth_boxes
+    self.num_groundtruth_boxes += groundtruth_boxes.shape[0]
     if groundtruth_is_difficult_list is None:
       num_boxes = groundtruth_boxes.shape[0]
       groundtruth_is_difficult_list = np.zeros(num_boxes, dtype=bool)
@@ -157,6 +186,72 @@ class ObjectDetectionEvaluation(object):
     (self.num_images_correctly_detected_per_class
     ) += is_class_correctly_detected_in_image
 
+    if self.iou_thresholds is None:
+      return
+    scores, max_overlaps, max_overlap_gt_ids, is_gt_difficult = (
+        self.per_image_eval.compute_max_overlaps(
+            detected_boxes, detected_scores, detected_class_labels,
+            groundtruth_boxes, groundtruth_class_labels,
+            groundtruth_is_difficult_list))
+    id_offset = self.groundtruth_id_offsets.get(image_key, 0)
+    for i in range(self.num_class):
+      self.overlap_scores_per_class[i].append(scores[i])
+      self.max_overlaps_per_class[i].append(max_overlaps[i])
+      self.max_overlap_gt_ids_per_class[i].append(
+          np.where(max_overlap_gt_ids[i] >= 0,
+                   max_overlap_gt_ids[i] + id_offset, -1))
+      self.is_gt_difficult_per_class[i].append(is_gt_difficult[i])
+
+  def merge(self, other):
+    """Add the ground truth and detections of another evaluation to this one.
+
+    Evaluations of disjoint sets of images, such as shards of a dataset that
+    were evaluated in separate processes, can be merged in any order and
+    grouping and evaluate() gives the same result as evaluating all the images
+    in one ObjectDetectionEvaluation.
+
+    Args:
+      other: ObjectDetectionEvaluation with the same number of classes.
+
+    Returns:
+      this ObjectDetectionEvaluation.
+    Raises:
+      ValueError: if other does not have the same number of classes, or only
+        one of the evaluations keeps the overlaps of its detections.
+    """
+    if other.num_class != self.num_class:
+      raise ValueError('Cannot merge evaluations of %d and %d classes' %
+                       (self.num_class, other.num_class))
+    if (self.iou_thresholds is None) != (other.iou_thresholds is None):
+      raise ValueError('Cannot merge evaluations with and without '
+                       'iou_thresholds')
+    # the ground truth ids of other continue after those of this evaluation
+    id_offset = self.num_groundtruth_boxes
+    for image_key, offset in other.groundtruth_id_offsets.items():
+      self.groundtruth_id_offsets[image_key] = offset + id_offset
+    self.num_groundtruth_boxes += other.num_groundtruth_boxes
+    self.groundtruth_boxes.update(other.groundtruth_boxes)
+    self.groundtruth_class_labels.update(other.groundtruth_class_labels)
+    self.groundtruth_is_difficult_list.update(
+        other.groundtruth_is_difficult_list)
+    self.num_gt_instances_per_class += other.num_gt_instances_per_class
+    self.num_gt_imgs_per_class += other.num_gt_imgs_per_class
+
+    self.detection_keys.update(other.detection_keys)
+    for i in range(self.num_class):
+      self.scores_per_class[i].extend(other.scores_per_class[i])
+      self.tp_fp_labels_per_class[i].extend(other.tp_fp_labels_per_class[i])
+      self.overlap_scores_per_class[i].extend(other.overlap_scores_per_class[i])
+      self.max_overlaps_per_class[i].extend(other.max_overlaps_per_class[i])
+      self.max_overlap_gt_ids_per_class[i].extend(
+          np.where(gt_ids >= 0, gt_ids + id_offset, -1)
+          for gt_ids in other.max_overlap_gt_ids_per_class[i])
+      self.is_gt_difficult_per_class[i].extend(
+          other.is_gt_difficult_per_class[i])
+    (self.num_images_correctly_detected_per_class
+    ) += other.num_images_correctly_detected_per_class
+    return self
+
   def _update_ground_truth_statistics(self, groundtruth_class_labels,
                                       groundtruth_is_difficult_list):
     """Update grouth truth statitistics.
@@ -218,12 +313,325 @@ class ObjectDetectionEvaluation(object):
             self.precisions_per_class, self.recalls_per_class,
             self.corloc_per_class, mean_corloc)
 
+  def evaluate_at_iou_thresholds(self):
+    """Compute the average precision at each of the iou_thresholds.
+
+    Detections are labeled as in evaluate(), at every threshold: a detection
+    matched to a difficult box is ignored, and only the first detection matched
+    to a box is a true positive.
+
+    Returns:
+      average_precision_per_class: float numpy array of shape [C, T], the
+          average precision of each class at each IOU threshold, NaN for
+          classes without ground truth.
+      mean_ap: float numpy array of shape [T], the mean average precision of
+          all classes at each IOU threshold.
+    Raises:
+      ValueError: if the evaluation was constructed without iou_thresholds.
+    """
+    if self.iou_thresholds is None:
+      raise ValueError('evaluate_at_iou_thresholds needs an evaluation '
+                       'constructed with iou_thresholds')
+    average_precision_per_class = np.full(
+        [self.num_class, np.size(self.iou_thresholds)], np.nan)
+    for class_index in range(self.num_class):
+      if self.num_gt_instances_per_class[class_index] == 0:
+        continue
+      average_precision_per_class[class_index] = (
+          metrics.compute_average_precision_at_iou_thresholds(
+              np.concatenate(self.overlap_scores_per_class[class_index]),
+              np.concatenate(self.max_overlaps_per_class[class_index]),
+              np.concatenate(self.max_overlap_gt_ids_per_class[class_index]),
+              self.num_gt_instances_per_class[class_index],
+              iou_thresholds=self.iou_thresholds,
+              is_gt_ignored=np.concatenate(
+                  self.is_gt_difficult_per_class[class_index])))
+    mean_ap = np.nanmean(average_precision_per_class, axis=0)
+    return average_precision_per_class, mean_ap
+
   def get_eval_result(self):
     return EvalResult(self.average_precision_per_class,
                       self.precisions_per_class, self.recalls_per_class,
                       self.corloc_per_class)
 
 
+class StreamingObjectDetectionEvaluation(object):
+  """Evaluate Object Detection Result in constant memory.
+
+  Has the same interface as ObjectDetectionEvaluation, but instead of keeping
+  the score and true/false positive label of every detection until evaluate()
+  is called, the detections of each class are counted into a fixed number of
+  score bins. Ground truth is only held until the detections of its image are
+  added, so the ground truth of an image must be added before its detections
+  (images whose detections come first are treated as having no ground truth).
+  At most max_pending_images images wait for their detections: past that the
+  oldest is dropped and its objects are counted as misses. Detections added
+  twice for an image are ignored if the image is one of the last
+  num_recent_keys images with detections, older repeats are the caller's to
+  avoid.
+
+  Ground truth, CorLoc and per bin true/false positive counts are exact. The
+  precision recall curve is sampled at the score bin edges, so the average
+  precision is exact up to the ordering of detections that fall into the same
+  bin. evaluate() can be called at any time to get the results so far.
+  """
+
+  def __init__(self,
+               num_groundtruth_classes,
+               matching_iou_threshold=0.5,
+               nms_iou_threshold=1.0,
+               nms_max_output_boxes=10000,
+               num_score_bins=1000,
+               score_range=(0.0, 1.0),
+               max_pending_images=1000,
+               num_recent_keys=1000):
+    """Constructor.
+
+    Args:
+      num_groundtruth_classes: Number of ground truth object classes
+      matching_iou_threshold: IOU threshold for a detection to be a true
+          positive.
+      nms_iou_threshold: IOU threshold used in Non Maximum Suppression.
+      nms_max_output_boxes: Number of maximum output boxes in NMS.
+      num_score_bins: Number of equal width score bins per class.
+      score_range: (min, max) of the detection scores. Scores outside the range
+          are counted in the first or last bin.
+      max_pending_images: Number of images whose ground truth is held until
+          their detections are added.
+      num_recent_keys: Number of image keys remembered to ignore repeated
+          detections.
+    """
+    self.per_image_eval = per_image_evaluation.PerImageEvaluation(
+        num_groundtruth_classes, matching_iou_threshold, nms_iou_threshold,
+        nms_max_output_boxes)
+    self.num_class = num_groundtruth_classes
+    self.num_score_bins = num_score_bins
+    self.score_range = score_range
+    self.max_pending_images = max_pending_images
+    self.num_recent_keys = num_recent_keys
+
+    # both are used as bounded sets, oldest key first
+    self._pending_groundtruth = collections.OrderedDict()
+    self._recent_detection_keys = collections.OrderedDict()
+    # images dropped from _pending_groundtruth before their detections came
+    self.num_flushed_images = 0
+    self.num_gt_instances_per_class = np.zeros(self.num_class, dtype=int)
+    self.num_gt_imgs_per_class = np.zeros(self.num_class, dtype=int)
+    self.clear_detections()
+
+  def clear_detections(self):
+    self._recent_detection_keys.clear()
+    self.tp_counts_per_class = np.zeros(
+        [self.num_class, self.num_score_bins], dtype=np.int64)
+    self.fp_counts_per_class = np.zeros(
+        [self.num_class, self.num_score_bins], dtype=np.int64)
+    self.num_images_correctly_detected_per_class = np.zeros(self.num_class)
+
+  def add_single_ground_truth_image_info(self,
+                                         image_key,
+                                         groundtruth_boxes,
+                                         groundtruth_class_labels,
+                                         groundtruth_is_difficult_list=None):
+    """Add ground truth info of a single image into the evaluation database.
+
+    Args:
+      image_key: sha256 key of image content
+      groundtruth_boxes: A numpy array of shape [M, 4] representing object box
+          coordinates[y_min, x_min, y_max, x_max]
+      groundtruth_class_labels: A 1-d numpy array of length M representing class
+          labels
+      groundtruth_is_difficult_list: A length M numpy boolean array denoting
+          whether a ground truth box is a difficult instance or not. To support
+          the case that no boxes are difficult, it is by default set as None.
+    """
+    if image_key in self._pending_groundtruth:
+      logging.warn(
+          'image %s has already been added to the ground truth database.',
+          image_key)
+      return
+
+    if groundtruth_is_difficult_list is None:
+      num_boxes = groundtruth_boxes.shape[0]
+      groundtruth_is_difficult_list = np.zeros(num_boxes, dtype=bool)
+    groundtruth_is_difficult_list = groundtruth_is_difficult_list.astype(
+        dtype=bool)
+    self._pending_groundtruth[image_key] = (groundtruth_boxes,
+                                            groundtruth_class_labels,
+                                            groundtruth_is_difficult_list)
+    self._flush_pending_groundtruth()
+    is_known_class = ((groundtruth_class_labels >= 0) &
+                      (groundtruth_class_labels < self.num_class))
+    self.num_gt_instances_per_class += np.bincount(
+        groundtruth_class_labels[is_known_class &
+                                 ~groundtruth_is_difficult_list],
+        minlength=self.num_class)
+    self.num_gt_imgs_per_class[np.unique(
+        groundtruth_class_labels[is_known_class])] += 1
+
+  def add_single_detected_image_info(self, image_key, detected_boxes,
+                                     detected_scores, detected_class_labels):
+    """Add detected result of a single image into the evaluation database.
+
+    Args:
+      image_key: sha256 key of image content
+      detected_boxes: A numpy array of shape [N, 4] representing detected box
+          coordinates[y_min, x_min, y_max, x_max]
+      detected_scores: A 1-d numpy array of length N representing classification
+          score
+      detected_class_labels: A 1-d numpy array of length N representing class
+          labels
+    Raises:
+      ValueError: if detected_boxes, detected_scores and detected_class_labels
+                  do not have the same length.
+    """
+    if (len(detected_boxes) != len(detected_scores) or
+        len(detected_boxes) != len(detected_class_labels)):
+      raise ValueError('detected_boxes, detected_scores and '
+                       'detected_class_labels should all have same lengths. Got'
+                       '[%d, %d, %d]' % (len(detected_boxes),
+                                         len(detected_scores),
+                                         len(detected_class_labels)))
+
+    if image_key in self._recent_detection_keys:
+      logging.warn(
+          'image %s has already been added to the detection result database',
+          image_key)
+      return
+
+    self._add_recent_detection_key(image_key)
+    groundtruth = self._pending_groundtruth.pop(image_key, None)
+    if groundtruth is None:
+      groundtruth = (np.empty(shape=[0, 4], dtype=float),
+                     np.array([], dtype=int), np.array([], dtype=bool))
+    scores, tp_fp_labels, is_class_correctly_detected_in_image = (
+        self.per_image_eval.compute_object_detection_metrics(
+            detected_boxes, detected_scores, detected_class_labels,
+            *groundtruth))
+    class_indices = np.repeat(np.arange(self.num_class),
+                              [len(class_scores) for class_scores in scores])
+    if class_indices.size:
+      score_bins = self._score_bins(np.concatenate(scores))
+      tp_fp_labels = np.concatenate(tp_fp_labels).astype(bool)
+      np.add.at(self.tp_counts_per_class,
+                (class_indices[tp_fp_labels], score_bins[tp_fp_labels]), 1)
+      np.add.at(self.fp_counts_per_class,
+                (class_indices[~tp_fp_labels], score_bins[~tp_fp_labels]), 1)
+    (self.num_images_correctly_detected_per_class
+    ) += is_class_correctly_detected_in_image
+
+  def merge(self, other):
+    """Add the counts of another streaming evaluation to this one.
+
+    Merging is associative and commutative, so shards of a dataset (disjoint
+    sets of images) can be evaluated in separate processes and merged in any
+    order. Ground truth of either that is still waiting for its detections
+    is kept, up to max_pending_images.
+
+    Args:
+      other: StreamingObjectDetectionEvaluation with the same number of
+          classes and the same score bins.
+
+    Returns:
+      this StreamingObjectDetectionEvaluation.
+    Raises:
+      ValueError: if other has a different number of classes or score bins.
+    """
+    if (other.num_class != self.num_class or
+        other.num_score_bins != self.num_score_bins or
+        tuple(other.score_range) != tuple(self.score_range)):
+      raise ValueError('Cannot merge evaluations with different classes or '
+                       'score bins')
+    self._pending_groundtruth.update(other._pending_groundtruth)
+    self._flush_pending_groundtruth()
+    self.num_flushed_images += other.num_flushed_images
+    for image_key in other._recent_detection_keys:
+      self._add_recent_detection_key(image_key)
+    self.num_gt_instances_per_class += other.num_gt_instances_per_class
+    self.num_gt_imgs_per_class += other.num_gt_imgs_per_class
+    self.tp_counts_per_class += other.tp_counts_per_class
+    self.fp_counts_per_class += other.fp_counts_per_class
+    (self.num_images_correctly_detected_per_class
+    ) += other.num_images_correctly_detected_per_class
+    return self
+
+  def _flush_pending_groundtruth(self):
+    """Drops the oldest pending ground truth past max_pending_images.
+
+    Its objects were counted when it was added, so with no detections they
+    are misses.
+    """
+    while len(self._pending_groundtruth) > self.max_pending_images:
+      self._pending_groundtruth.popitem(last=False)
+      self.num_flushed_images += 1
+
+  def _add_recent_detection_key(self, image_key):
+    self._recent_detection_keys[image_key] = None
+    while len(self._recent_detection_keys) > self.num_recent_keys:
+      self._recent_detection_keys.popitem(last=False)
+
+  def _score_bins(self, scores):
+    """Index of the score bin of each score, clipped to the first/last bin."""
+    score_min, score_max = self.score_range
+    bins = np.floor((np.asarray(scores, dtype=float) - score_min) *
+                    (self.num_score_bins / float(score_max - score_min)))
+    return np.clip(bins, 0, self.num_score_bins - 1).astype(int)
+
+  def evaluate(self):
+    """Compute evaluation result.
+
+    Returns:
+      average_precision_per_class: float numpy array of average precision for
+          each class.
+      mean_ap: mean average precision of all classes, float scalar
+      precisions_per_class: List of precisions, each precision is a float numpy
+          array of the precision at the lower edge of every non-empty score bin,
+          in decreasing score order
+      recalls_per_class: List of recalls, each recall is a float numpy array
+      corloc_per_class: numpy float array
+      mean_corloc: Mean CorLoc score for each class, float scalar
+    """
+    if (self.num_gt_instances_per_class == 0).any():
+      logging.warn(
+          'The following classes have no ground truth examples: %s',
+          np.squeeze(np.argwhere(self.num_gt_instances_per_class == 0)))
+    average_precision_per_class = np.empty(self.num_class, dtype=float)
+    average_precision_per_class.fill(np.nan)
+    precisions_per_class = []
+    recalls_per_class = []
+    # highest scores first
+    cum_tp_counts = np.cumsum(self.tp_counts_per_class[:, ::-1], axis=1)
+    cum_fp_counts = np.cumsum(self.fp_counts_per_class[:, ::-1], axis=1)
+    for class_index in range(self.num_class):
+      num_gt_instances = self.num_gt_instances_per_class[class_index]
+      if num_gt_instances == 0:
+        continue
+      is_bin_used = (self.tp_counts_per_class[class_index, ::-1] +
+                     self.fp_counts_per_class[class_index, ::-1]) > 0
+      cum_tp = cum_tp_counts[class_index, is_bin_used].astype(float)
+      cum_fp = cum_fp_counts[class_index, is_bin_used]
+      precision = cum_tp / (cum_tp + cum_fp)
+      recall = cum_tp / num_gt_instances
+      precisions_per_class.append(precision)
+      recalls_per_class.append(recall)
+      average_precision_per_class[class_index] = (
+          metrics.compute_average_precision(precision, recall))
+
+    corloc_per_class = metrics.compute_cor_loc(
+        self.num_gt_imgs_per_class,
+        self.num_images_correctly_detected_per_class)
+
+    mean_ap = np.nanmean(average_precision_per_class)
+    mean_corloc = np.nanmean(corloc_per_class)
+    return (average_precision_per_class, mean_ap, precisions_per_class,
+            recalls_per_class, corloc_per_class, mean_corloc)
+
+  def get_eval_result(self):
+    (average_precision_per_class, _, precisions_per_class, recalls_per_class,
+     corloc_per_class, _) = self.evaluate()
+    return EvalResult(average_precision_per_class, precisions_per_class,
+                      recalls_per_class, corloc_per_class)
+
+
 class EvalResult(object):
 
   def __init__(self, average_precisions, precisions, recalls, all_corloc):
@@ -15,12 +15,48 @@
 
 """Tests for object_detection.utils.object_detection_evaluation."""
 
+import tracemalloc
+
 import numpy as np
 import tensorflow as tf
 
+from object_detection.utils import metrics
 from object_detection.utils import object_detection_evaluation
 
 
+def _make_images(num_images, seed=0):
+  np.random.seed(seed)
+  # distinct scores, each in the middle of one of 1000 score bins
+  all_scores = (np.random.permutation(1000)[:10 * num_images] + 0.5) / 1000
+  images = []
+  for image_key in range(num_images):
+    corners = np.random.uniform(0, 50, size=(5, 2))
+    groundtruth_boxes = np.hstack([corners, corners + 10])
+    groundtruth_class_labels = np.random.randint(0, 3, size=5)
+    groundtruth_is_difficult_list = np.random.uniform(size=5) < 0.1
+    detected_boxes = np.vstack([
+        groundtruth_boxes + np.random.uniform(-3, 3, size=(5, 4)),
+        np.hstack([corners[::-1], corners[::-1] + 8])])
+    detected_scores = all_scores[10 * image_key:10 * (image_key + 1)]
+    detected_class_labels = np.concatenate(
+        [groundtruth_class_labels, np.random.randint(0, 3, size=5)])
+    images.append((image_key, groundtruth_boxes, groundtruth_class_labels,
+                   groundtruth_is_difficult_list, detected_boxes,
+                   detected_scores, detected_class_labels))
+  return images
+
+
+def _add_images(od_eval, images):
+  for (image_key, groundtruth_boxes, groundtruth_class_labels,
+       groundtruth_is_difficult_list, detected_boxes, detected_scores,
+       detected_class_labels) in images:
+    od_eval.add_single_ground_truth_image_info(
+        image_key, groundtruth_boxes, groundtruth_class_labels,
+        groundtruth_is_difficult_list)
+    od_eval.add_single_detected_image_info(
+        image_key, detected_boxes, detected_scores, detected_class_labels)
+
+
 class ObjectDetectionEvaluationTest(tf.test.TestCase):
 
   def setUp(self):
@@ -121,5 +157,212 @@ class ObjectDetectionEvaluationTest(tf.test.TestCase):
     self.assertAlmostEqual(expected_mean_corloc, mean_corloc)
 
 
+class StreamingObjectDetectionEvaluationTest(tf.test.TestCase):
+
+  def test_evaluate_matches_exact_evaluation(self):
+    od_eval = object_detection_evaluation.ObjectDetectionEvaluation(3)
+    streaming_od_eval = (
+        object_detection_evaluation.StreamingObjectDetectionEvaluation(3))
+    _add_images(od_eval, _make_images(50))
+    _add_images(streaming_od_eval, _make_images(50))
+
+    (average_precision_per_class, mean_ap, _, _, corloc_per_class,
+     mean_corloc) = od_eval.evaluate()
+    (streaming_average_precision_per_class, streaming_mean_ap,
+     precisions_per_class, recalls_per_class, streaming_corloc_per_class,
+     streaming_mean_corloc) = streaming_od_eval.evaluate()
+    self.assertAllEqual(od_eval.num_gt_instances_per_class,
+                        streaming_od_eval.num_gt_instances_per_class)
+    self.assertAllEqual(od_eval.num_gt_imgs_per_class,
+                        streaming_od_eval.num_gt_imgs_per_class)
+    # every score bin holds at most one score
+    self.assertAllClose(average_precision_per_class,
+                        streaming_average_precision_per_class)
+    self.assertAlmostEqual(mean_ap, streaming_mean_ap)
+    self.assertAllClose(corloc_per_class, streaming_corloc_per_class)
+    self.assertAlmostEqual(mean_corloc, streaming_mean_corloc)
+    self.assertEqual(len(precisions_per_class), 3)
+    self.assertEqual(len(recalls_per_class), 3)
+
+  def test_coarse_score_bins_approximate_average_precision(self):
+    od_eval = object_detection_evaluation.ObjectDetectionEvaluation(3)
+    streaming_od_eval = (
+        object_detection_evaluation.StreamingObjectDetectionEvaluation(
+            3, num_score_bins=50))
+    _add_images(od_eval, _make_images(50))
+    _add_images(streaming_od_eval, _make_images(50))
+    self.assertAllClose(od_eval.evaluate()[0],
+                        streaming_od_eval.evaluate()[0], atol=0.02)
+
+  def test_ground_truth_is_released_once_detections_are_added(self):
+    od_eval = object_detection_evaluation.ObjectDetectionEvaluation(3)
+    streaming_od_eval = (
+        object_detection_evaluation.StreamingObjectDetectionEvaluation(3))
+    _add_images(od_eval, _make_images(10))
+    _add_images(streaming_od_eval, _make_images(10))
+    self.assertEqual(streaming_od_eval._pending_groundtruth, {})
+    self.assertEqual(streaming_od_eval.tp_counts_per_class.shape, (3, 1000))
+    for class_index in range(3):
+      tp_fp_labels = np.concatenate(
+          od_eval.tp_fp_labels_per_class[class_index])
+      self.assertEqual(
+          streaming_od_eval.tp_counts_per_class[class_index].sum(),
+          tp_fp_labels.sum())
+      self.assertEqual(
+          streaming_od_eval.fp_counts_per_class[class_index].sum(),
+          (~tp_fp_labels).sum())
+
+  def test_repeated_detections_are_ignored(self):
+    images = _make_images(10)
+    streaming_od_eval = (
+        object_detection_evaluation.StreamingObjectDetectionEvaluation(3))
+    _add_images(streaming_od_eval, images[:5])
+    shard = object_detection_evaluation.StreamingObjectDetectionEvaluation(3)
+    _add_images(shard, images[5:])
+    streaming_od_eval.merge(shard)
+    tp_counts = streaming_od_eval.tp_counts_per_class.copy()
+    fp_counts = streaming_od_eval.fp_counts_per_class.copy()
+
+    # the detections of images of either shard are not counted twice
+    for (image_key, _, _, _, detected_boxes, detected_scores,
+         detected_class_labels) in images:
+      streaming_od_eval.add_single_detected_image_info(
+          image_key, detected_boxes, detected_scores, detected_class_labels)
+    self.assertAllEqual(streaming_od_eval.tp_counts_per_class, tp_counts)
+    self.assertAllEqual(streaming_od_eval.fp_counts_per_class, fp_counts)
+
+  def test_ground_truth_without_detections_is_flushed_as_misses(self):
+    images = _make_images(10)
+    streaming_od_eval = (
+        object_detection_evaluation.StreamingObjectDetectionEvaluation(
+            3, max_pending_images=4))
+    for (image_key, groundtruth_boxes, groundtruth_class_labels,
+         groundtruth_is_difficult_list, _, _, _) in images:
+      streaming_od_eval.add_single_ground_truth_image_info(
+          image_key, groundtruth_boxes, groundtruth_class_labels,
+          groundtruth_is_difficult_list)
+    self.assertEqual(list(streaming_od_eval._pending_groundtruth), [6, 7, 8, 9])
+    self.assertEqual(streaming_od_eval.num_flushed_images, 6)
+    self.assertEqual(streaming_od_eval.num_gt_instances_per_class.sum(),
+                     sum((~difficult).sum() for _, _, _, difficult, _, _, _
+                         in images))
+
+    # only the detections of images still pending can match
+    od_eval = object_detection_evaluation.ObjectDetectionEvaluation(3)
+    _add_images(od_eval, images[6:])
+    for image in images[:6]:
+      od_eval.add_single_ground_truth_image_info(*image[:4])
+    for (image_key, _, _, _, detected_boxes, detected_scores,
+         detected_class_labels) in images[6:]:
+      streaming_od_eval.add_single_detected_image_info(
+          image_key, detected_boxes, detected_scores, detected_class_labels)
+    self.assertEqual(streaming_od_eval._pending_groundtruth, {})
+    self.assertAllClose(od_eval.evaluate()[0], streaming_od_eval.evaluate()[0])
+
+  def test_memory_stays_flat_over_many_images(self):
+    images = _make_images(50)
+    streaming_od_eval = (
+        object_detection_evaluation.StreamingObjectDetectionEvaluation(
+            3, max_pending_images=20, num_recent_keys=20))
+
+    def add_images(start, stop):
+      for image_key in range(start, stop):
+        image = images[image_key % len(images)]
+        streaming_od_eval.add_single_ground_truth_image_info(
+            image_key, *image[1:4])
+        # every other image never gets its detections
+        if image_key % 2:
+          streaming_od_eval.add_single_detected_image_info(
+              image_key, *image[4:])
+
+    add_images(0, 200)
+    tracemalloc.start()
+    try:
+      before = tracemalloc.get_traced_memory()[0]
+      add_images(200, 2200)
+      growth = tracemalloc.get_traced_memory()[0] - before
+    finally:
+      tracemalloc.stop()
+    self.assertLessEqual(len(streaming_od_eval._pending_groundtruth), 20)
+    self.assertLessEqual(len(streaming_od_eval._recent_detection_keys), 20)
+    # 2000 more images, a few KB at most for interpreter noise
+    self.assertLess(growth, 16 * 1024)
+
+  def test_merged_shards_match_single_evaluation(self):
+    images = _make_images(30)
+    for evaluation_class in [
+        object_detection_evaluation.ObjectDetectionEvaluation,
+        object_detection_evaluation.StreamingObjectDetectionEvaluation]:
+      od_eval = evaluation_class(3)
+      _add_images(od_eval, images)
+      shards = [evaluation_class(3) for _ in range(3)]
+      for shard_index, shard in enumerate(shards):
+        _add_images(shard, images[shard_index::3])
+      merged_od_eval = shards[0].merge(shards[1].merge(shards[2]))
+      self.assertIs(merged_od_eval, shards[0])
+
+      (average_precision_per_class, mean_ap, _, _, corloc_per_class,
+       mean_corloc) = od_eval.evaluate()
+      (merged_average_precision_per_class, merged_mean_ap, _, _,
+       merged_corloc_per_class, merged_mean_corloc) = merged_od_eval.evaluate()
+      self.assertAllClose(average_precision_per_class,
+                          merged_average_precision_per_class)
+      self.assertAlmostEqual(mean_ap, merged_mean_ap)
+      self.assertAllClose(corloc_per_class, merged_corloc_per_class)
+      self.assertAlmostEqual(mean_corloc, merged_mean_corloc)
+      self.assertAllEqual(od_eval.num_gt_instances_per_class,
+                          merged_od_eval.num_gt_instances_per_class)
+
+  def test_merge_with_different_score_bins(self):
+    streaming_od_eval = (
+        object_detection_evaluation.StreamingObjectDetectionEvaluation(3))
+    with self.assertRaises(ValueError):
+      streaming_od_eval.merge(
+          object_detection_evaluation.StreamingObjectDetectionEvaluation(
+              3, num_score_bins=10))
+
+
+class ObjectDetectionEvaluationAtIouThresholdsTest(tf.test.TestCase):
+
+  def test_matches_evaluate_at_each_matching_iou_threshold(self):
+    images = _make_images(50)
+    iou_thresholds = np.array([0.3, 0.5, 0.75])
+    for index, matching_iou_threshold in enumerate(iou_thresholds):
+      od_eval = object_detection_evaluation.ObjectDetectionEvaluation(
+          3, matching_iou_threshold=matching_iou_threshold,
+          iou_thresholds=iou_thresholds)
+      _add_images(od_eval, images)
+      average_precision_per_class, mean_ap = (
+          od_eval.evaluate_at_iou_thresholds())
+      self.assertEqual(average_precision_per_class.shape, (3, 3))
+      expected_average_precision_per_class, expected_mean_ap = (
+          od_eval.evaluate()[:2])
+      self.assertAllClose(expected_average_precision_per_class,
+                          average_precision_per_class[:, index])
+      self.assertAlmostEqual(expected_mean_ap, mean_ap[index])
+
+  def test_merged_shards_match_single_evaluation(self):
+    images = _make_images(30)
+    od_eval = object_detection_evaluation.ObjectDetectionEvaluation(
+        3, iou_thresholds=metrics.COCO_IOU_THRESHOLDS)
+    _add_images(od_eval, images)
+    shards = [object_detection_evaluation.ObjectDetectionEvaluation(
+        3, iou_thresholds=metrics.COCO_IOU_THRESHOLDS) for _ in range(3)]
+    for shard_index, shard in enumerate(shards):
+      _add_images(shard, images[shard_index::3])
+    merged_od_eval = shards[0].merge(shards[1].merge(shards[2]))
+    self.assertAllClose(od_eval.evaluate_at_iou_thresholds()[0],
+                        merged_od_eval.evaluate_at_iou_thresholds()[0])
+
+  def test_needs_iou_thresholds(self):
+    od_eval = object_detection_evaluation.ObjectDetectionEvaluation(3)
+    _add_images(od_eval, _make_images(2))
+    with self.assertRaises(ValueError):
+      od_eval.evaluate_at_iou_thresholds()
+    with self.assertRaises(ValueError):
+      od_eval.merge(object_detection_evaluation.ObjectDetectionEvaluation(
+          3, iou_thresholds=metrics.COCO_IOU_THRESHOLDS))
+
+
 if __name__ == "__main__":
   tf.test.main()
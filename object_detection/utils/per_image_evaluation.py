@@ -91,6 +91,83 @@ class PerImageEvaluation(object):
         groundtruth_boxes, groundtruth_class_labels)
     return scores, tp_fp_labels, is_class_correctly_detected_in_image
 
+  def compute_max_overlaps(self, detected_boxes, detected_scores,
+                           detected_class_labels, groundtruth_boxes,
+                           groundtruth_class_labels,
+                           groundtruth_is_difficult_lists):
+    """Compute the best ground truth overlap of each detection of an image.
+
+    Unlike the true/false positive labels, these do not depend on the matching
+    IOU threshold, so metrics.compute_average_precision_at_iou_thresholds can
+    label the detections at any number of thresholds from them.
+
+    Args:
+      detected_boxes: A float numpy array of shape [N, 4], representing N
+          regions of detected object regions.
+          Each row is of the format [y_min, x_min, y_max, x_max]
+      detected_scores: A float numpy array of shape [N, 1], representing
+          the confidence scores of the detected N object instances.
+      detected_class_labels: A integer numpy array of shape [N, 1], repreneting
+          the class labels of the detected N object instances.
+      groundtruth_boxes: A float numpy array of shape [M, 4], representing M
+          regions of object instances in ground truth
+      groundtruth_class_labels: An integer numpy array of shape [M, 1],
+          representing M class labels of object instances in ground truth
+      groundtruth_is_difficult_lists: A boolean numpy array of length M denoting
+          whether a ground truth box is a difficult instance or not
+
+    Returns:
+      scores: A list of C float numpy arrays. Each numpy array is of
+          shape [K], representing K scores detected with object class label c,
+          after non maximum suppression
+      max_overlaps: A list of C float numpy arrays of shape [K], the IOU of
+          each detection with the ground truth box of class c it overlaps
+          most, 0 if there is none
+      max_overlap_gt_ids: A list of C integer numpy arrays of shape [K], the
+          index of that ground truth box in groundtruth_boxes, -1 if there is
+          none
+      is_gt_difficult: A list of C boolean numpy arrays of shape [K], whether
+          that ground truth box is a difficult instance
+    """
+    detected_boxes, detected_scores, detected_class_labels = (
+        self._remove_invalid_boxes(detected_boxes, detected_scores,
+                                   detected_class_labels))
+    result_scores = [np.array([], dtype=float)] * self.num_groundtruth_classes
+    result_max_overlaps = [np.array([], dtype=float)
+                          ] * self.num_groundtruth_classes
+    result_gt_ids = [np.array([], dtype=int)] * self.num_groundtruth_classes
+    result_is_gt_difficult = [np.array([], dtype=bool)
+                             ] * self.num_groundtruth_classes
+    if detected_class_labels.size == 0:
+      return (result_scores, result_max_overlaps, result_gt_ids,
+              result_is_gt_difficult)
+    detected_order, detected_starts, detected_ends = _group_by_class(
+        detected_class_labels)
+    gt_order, gt_starts, gt_ends = _group_by_class(groundtruth_class_labels)
+    for i in np.unique(detected_class_labels).astype(int):
+      if not 0 <= i < self.num_groundtruth_classes:
+        continue
+      detected_indices = detected_order[detected_starts[i]:detected_ends[i]]
+      if i < len(gt_starts):
+        gt_indices = gt_order[gt_starts[i]:gt_ends[i]]
+      else:
+        gt_indices = gt_order[:0]
+      scores, max_overlaps, class_gt_ids = (
+          self._compute_max_overlaps_for_single_class(
+              detected_boxes[detected_indices],
+              detected_scores[detected_indices], groundtruth_boxes[gt_indices]))
+      result_scores[i] = scores
+      result_max_overlaps[i] = max_overlaps
+      if gt_indices.size:
+        result_gt_ids[i] = gt_indices[class_gt_ids]
+        result_is_gt_difficult[i] = groundtruth_is_difficult_lists[
+            gt_indices[class_gt_ids]]
+      else:
+        result_gt_ids[i] = class_gt_ids
+        result_is_gt_difficult[i] = np.zeros(scores.size, dtype=bool)
+    return (result_scores, result_max_overlaps, result_gt_ids,
+            result_is_gt_difficult)
+
   def _compute_cor_loc(self, detected_boxes, detected_scores,
                        detected_class_labels, groundtruth_boxes,
                        groundtruth_class_labels):
@@ -115,7 +192,12 @@ class PerImageEvaluation(object):
     """
     is_class_correctly_detected_in_image = np.zeros(
         self.num_groundtruth_classes, dtype=int)
-    for i in range(self.num_groundtruth_classes):
+    # a class can only be correctly detected if it has both detections and
+    # ground truth in the image
+    for i in np.intersect1d(detected_class_labels,
+                            groundtruth_class_labels).astype(int):
+      if not 0 <= i < self.num_groundtruth_classes:
+        continue
       gt_boxes_at_ith_class = groundtruth_boxes[
           groundtruth_class_labels == i, :]
       detected_boxes_at_ith_class = detected_boxes[
@@ -183,21 +265,30 @@ class PerImageEvaluation(object):
           shape [K, 1], representing K True/False positive label of object
           instances detected with class label c
     """
-    result_scores = []
-    result_tp_fp_labels = []
-    for i in range(self.num_groundtruth_classes):
-      gt_boxes_at_ith_class = groundtruth_boxes[(groundtruth_class_labels == i
-                                                ), :]
-      groundtruth_is_difficult_list_at_ith_class = (
-          groundtruth_is_difficult_lists[groundtruth_class_labels == i])
-      detected_boxes_at_ith_class = detected_boxes[(detected_class_labels == i
-                                                   ), :]
-      detected_scores_at_ith_class = detected_scores[detected_class_labels == i]
+    result_scores = [np.array([], dtype=float)] * self.num_groundtruth_classes
+    result_tp_fp_labels = [np.array([], dtype=bool)
+                          ] * self.num_groundtruth_classes
+    if detected_class_labels.size == 0:
+      return result_scores, result_tp_fp_labels
+    # Group detections and ground truth by class once, and only visit the
+    # classes that have detections: every other class has no scores.
+    detected_order, detected_starts, detected_ends = _group_by_class(
+        detected_class_labels)
+    gt_order, gt_starts, gt_ends = _group_by_class(groundtruth_class_labels)
+    for i in np.unique(detected_class_labels).astype(int):
+      if not 0 <= i < self.num_groundtruth_classes:
+        continue
+      detected_indices = detected_order[detected_starts[i]:detected_ends[i]]
+      if i < len(gt_starts):
+        gt_indices = gt_order[gt_starts[i]:gt_ends[i]]
+      else:
+        gt_indices = gt_order[:0]
       scores, tp_fp_labels = self._compute_tp_fp_for_single_class(
-          detected_boxes_at_ith_class, detected_scores_at_ith_class,
-          gt_boxes_at_ith_class, groundtruth_is_difficult_list_at_ith_class)
-      result_scores.append(scores)
-      result_tp_fp_labels.append(tp_fp_labels)
+          detected_boxes[detected_indices], detected_scores[detected_indices],
+          groundtruth_boxes[gt_indices],
+          groundtruth_is_difficult_lists[gt_indices])
+      result_scores[i] = scores
+      result_tp_fp_labels[i] = tp_fp_labels
     return result_scores, result_tp_fp_labels
 
   def _remove_invalid_boxes(self, detected_boxes, detected_scores,
@@ -230,31 +321,85 @@ class PerImageEvaluation(object):
     """
     if detected_boxes.size == 0:
       return np.array([], dtype=float), np.array([], dtype=bool)
+    scores, max_overlaps, max_overlap_gt_ids = (
+        self._compute_max_overlaps_for_single_class(
+            detected_boxes, detected_scores, groundtruth_boxes))
+    if groundtruth_boxes.size == 0:
+      return scores, np.zeros(scores.size, dtype=bool)
+
+    is_matched = max_overlaps >= self.matching_iou_threshold
+    is_matched_to_difficult_box = np.logical_and(
+        is_matched, groundtruth_is_difficult_list[max_overlap_gt_ids])
+    # Detections are in decreasing score order, so a ground truth box is
+    # detected by the first detection matched to it; later ones are false
+    # positives.
+    matched_indices = np.flatnonzero(
+        np.logical_and(is_matched, ~is_matched_to_difficult_box))
+    _, first_matches = np.unique(max_overlap_gt_ids[matched_indices],
+                                 return_index=True)
+    tp_fp_labels = np.zeros(scores.size, dtype=bool)
+    tp_fp_labels[matched_indices[first_matches]] = True
+    return scores[~is_matched_to_difficult_box], tp_fp_labels[
+        ~is_matched_to_difficult_box]
+
+  def _compute_max_overlaps_for_single_class(self, detected_boxes,
+                                             detected_scores,
+                                             groundtruth_boxes):
+    """Finds the ground truth box each detection of a class overlaps most.
+
+    Args:
+      detected_boxes: A numpy array of shape [N, 4] representing detected box
+          coordinates
+      detected_scores: A 1-d numpy array of length N representing classification
+          score
+      groundtruth_boxes: A numpy array of shape [M, 4] representing ground truth
+          box coordinates
+
+    Returns:
+      scores: A numpy array representing the detection scores after non
+      maximum suppression, in decreasing order.
+      max_overlaps: A float numpy array of the same length, the IOU of each
+      detection with the ground truth box it overlaps most, 0 if M is 0.
+      max_overlap_gt_ids: An integer numpy array of the same length, the index
+      of that ground truth box, -1 if M is 0.
+    """
+    if detected_boxes.size == 0:
+      return (np.array([], dtype=float), np.array([], dtype=float),
+              np.array([], dtype=int))
     detected_boxlist = np_box_list.BoxList(detected_boxes)
     detected_boxlist.add_field('scores', detected_scores)
     detected_boxlist = np_box_list_ops.non_max_suppression(
         detected_boxlist, self.nms_max_output_boxes, self.nms_iou_threshold)
 
     scores = detected_boxlist.get_field('scores')
+    num_boxes = detected_boxlist.num_boxes()
 
     if groundtruth_boxes.size == 0:
-      return scores, np.zeros(detected_boxlist.num_boxes(), dtype=bool)
+      return scores, np.zeros(num_boxes), -np.ones(num_boxes, dtype=int)
     gt_boxlist = np_box_list.BoxList(groundtruth_boxes)
 
     iou = np_box_list_ops.iou(detected_boxlist, gt_boxlist)
     max_overlap_gt_ids = np.argmax(iou, axis=1)
-    is_gt_box_detected = np.zeros(gt_boxlist.num_boxes(), dtype=bool)
-    tp_fp_labels = np.zeros(detected_boxlist.num_boxes(), dtype=bool)
-    is_matched_to_difficult_box = np.zeros(
-        detected_boxlist.num_boxes(), dtype=bool)
-    for i in range(detected_boxlist.num_boxes()):
-      gt_id = max_overlap_gt_ids[i]
-      if iou[i, gt_id] >= self.matching_iou_threshold:
-        if not groundtruth_is_difficult_list[gt_id]:
-          if not is_gt_box_detected[gt_id]:
-            tp_fp_labels[i] = True
-            is_gt_box_detected[gt_id] = True
-        else:
-          is_matched_to_difficult_box[i] = True
-    return scores[~is_matched_to_difficult_box], tp_fp_labels[
-        ~is_matched_to_difficult_box]
+    max_overlaps = iou[np.arange(num_boxes), max_overlap_gt_ids]
+    return scores, max_overlaps, max_overlap_gt_ids
+
+def _group_by_class(class_labels):
+  """Groups the indices of class_labels by class with a single stable sort.
+
+  Args:
+    class_labels: a non-negative integer numpy array of length N.
+
+  Returns:
+    order: indices that sort class_labels, so that
+      order[starts[c]:ends[c]] are the indices of the labels equal to c, in
+      their original order.
+    starts: an integer numpy array of length max(class_labels) + 1.
+    ends: an integer numpy array of length max(class_labels) + 1.
+  """
+  class_labels = np.asarray(class_labels, dtype=int)
+  order = np.argsort(class_labels, kind='mergesort')
+  classes = np.arange(class_labels.max() + 1 if class_labels.size else 0)
+  sorted_labels = class_labels[order]
+  starts = np.searchsorted(sorted_labels, classes, side='left')
+  ends = np.searchsorted(sorted_labels, classes, side='right')
+  return order, starts, ends
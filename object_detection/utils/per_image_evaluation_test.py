@@ -157,6 +157,80 @@ class MultiClassesTpFpTest(tf.test.TestCase):
       self.assertTrue(np.array_equal(expected_tp_fp_labels[i], tp_fp_labels[i]))
 
 
+  def test_tp_fp_matches_per_class_evaluation(self):
+    num_groundtruth_classes = 10
+    eval1 = per_image_evaluation.PerImageEvaluation(num_groundtruth_classes,
+                                                    0.5, 1.0, 10000)
+    np.random.seed(0)
+    corners = np.random.uniform(0, 20, size=(40, 2))
+    detected_boxes = np.hstack([corners, corners + 5])
+    detected_scores = np.random.uniform(size=40)
+    # classes 4 and 7 have no detections
+    detected_class_labels = np.random.choice([0, 1, 2, 3, 5, 6, 8, 9], size=40)
+    groundtruth_boxes = detected_boxes[:20] + np.random.uniform(
+        -1, 1, size=(20, 4))
+    groundtruth_class_labels = np.random.randint(0, 8, size=20)
+    groundtruth_is_difficult_list = np.random.uniform(size=20) < 0.2
+
+    scores, tp_fp_labels = eval1._compute_tp_fp(
+        detected_boxes, detected_scores, detected_class_labels,
+        groundtruth_boxes, groundtruth_class_labels,
+        groundtruth_is_difficult_list)
+    self.assertEqual(len(scores), num_groundtruth_classes)
+    self.assertEqual(len(tp_fp_labels), num_groundtruth_classes)
+    for i in range(num_groundtruth_classes):
+      expected_scores, expected_tp_fp_labels = (
+          eval1._compute_tp_fp_for_single_class(
+              detected_boxes[detected_class_labels == i],
+              detected_scores[detected_class_labels == i],
+              groundtruth_boxes[groundtruth_class_labels == i],
+              groundtruth_is_difficult_list[groundtruth_class_labels == i]))
+      self.assertAllClose(expected_scores, scores[i])
+      self.assertAllEqual(expected_tp_fp_labels, tp_fp_labels[i])
+    self.assertEqual(scores[4].size, 0)
+    self.assertEqual(tp_fp_labels[7].size, 0)
+
+  def test_later_detections_of_a_detected_box_are_false_positives(self):
+    eval1 = per_image_evaluation.PerImageEvaluation(2, 0.5, 1.0, 10000)
+    detected_boxes = np.array([[0, 0, 1, 1], [0, 0, 1.1, 1], [0, 0, 0.9, 1],
+                               [5, 5, 6, 6]], dtype=float)
+    detected_scores = np.array([0.6, 0.9, 0.8, 0.7], dtype=float)
+    detected_class_labels = np.array([1, 1, 1, 1], dtype=int)
+    groundtruth_boxes = np.array([[0, 0, 1, 1], [5, 5, 6, 6]], dtype=float)
+    groundtruth_class_labels = np.array([1, 1], dtype=int)
+    scores, tp_fp_labels = eval1._compute_tp_fp(
+        detected_boxes, detected_scores, detected_class_labels,
+        groundtruth_boxes, groundtruth_class_labels, np.zeros(2, dtype=bool))
+    self.assertAllClose(scores[1], [0.9, 0.8, 0.7, 0.6])
+    self.assertAllEqual(tp_fp_labels[1], [True, False, True, False])
+    self.assertEqual(scores[0].size, 0)
+
+  def test_max_overlaps_point_at_image_ground_truth(self):
+    eval1 = per_image_evaluation.PerImageEvaluation(3, 0.5, 1.0, 10000)
+    detected_boxes = np.array([[0, 0, 1, 1], [0, 0, 2, 1], [5, 5, 6, 6],
+                               [0, 0, 1, 1]], dtype=float)
+    detected_scores = np.array([0.6, 0.9, 0.7, 0.8], dtype=float)
+    detected_class_labels = np.array([1, 1, 1, 2], dtype=int)
+    groundtruth_boxes = np.array([[0, 0, 1, 1], [9, 9, 10, 10], [5, 5, 6, 6]],
+                                 dtype=float)
+    groundtruth_class_labels = np.array([1, 0, 1], dtype=int)
+    groundtruth_is_difficult_list = np.array([False, False, True])
+    scores, max_overlaps, max_overlap_gt_ids, is_gt_difficult = (
+        eval1.compute_max_overlaps(
+            detected_boxes, detected_scores, detected_class_labels,
+            groundtruth_boxes, groundtruth_class_labels,
+            groundtruth_is_difficult_list))
+    self.assertAllClose(scores[1], [0.9, 0.7, 0.6])
+    self.assertAllClose(max_overlaps[1], [0.5, 1.0, 1.0])
+    self.assertAllEqual(max_overlap_gt_ids[1], [0, 2, 0])
+    self.assertAllEqual(is_gt_difficult[1], [False, True, False])
+    # class 2 has no ground truth in the image
+    self.assertAllClose(max_overlaps[2], [0.0])
+    self.assertAllEqual(max_overlap_gt_ids[2], [-1])
+    self.assertAllEqual(is_gt_difficult[2], [False])
+    self.assertEqual(scores[0].size, 0)
+
+
 class CorLocTest(tf.test.TestCase):
 
   def test_compute_corloc_with_normal_iou_threshold(self):
@@ -1,98 +1,180 @@
 """ State vector registration (consolidation/filtering over time in an intertial frame) and buffering """
-import collections
+import time
 
-import pandas as pd
+import numpy as np
 
-from object_detection.constants import CATEGORY_INDEX
+from object_detection.constants import BB_KEYS, COLOR_KEYS, OBJECT_VECTOR_DTYPE
 
 
 class SensorBuffer:
-    """ Container for list lists of pairs containing information about images for past W frames (W = window width)
+    """ Object vectors of the last W frames (W = window width) in a preallocated NumPy ring buffer
 
     Each object (vector) represents an instance ("the first person I saw today" not "person") in that video frame.
-    zero or more vectors may be present for each video frame (image)
-    [
-      ['category', 'person'],
-      ['instance', 1234567],  # this will be the same value across consecutive frames once object tracking is implemented
-      ['x', .5], ['y', .25], ['z', 0.0],
-      ['width', .12], ['height', .34], ['depth', 0],
-      ['black', 7], ['white', 2],
-      ['red', 5], ['blue', 10], ['yellow', 2],
-      ['purple', 6], ['orange', 1], ['green', 1],
-    ]
+    zero or more vectors may be present for each video frame (image), as a row of a structured array of dtype
+    `constants.OBJECT_VECTOR_DTYPE` (see `nlp.core.update_state`):
+        ('person',  # category
+         1234567,  # instance, the same value across consecutive frames when the objects are tracked
+         .9,  # confidence
+         .5, .25, 0.0,  # x, y, z
+         .12, .34, 0,  # width, height, depth
+         7, 2, 5, 1, 2, 1, 0, 10, 6, 0)  # black white red orange yellow green cyan blue purple pink
     -1 < x < 1 where 0 is the center of the frame, + 1 is far right
     -1 < y < 1 where 0 is center and +1 is the top of the frame
     z is TBD
     width and height are in the same scale as x, y, e.g. width = 2.0 / pixel_width
     depth units is TBD
     colors are pixel counts within a portion of the bounding box near the center
+
+    The buffer is a (window, max_objects) structured array allocated once: appending a frame overwrites the oldest
+    one in place, and the window queries mask the whole buffer at once rather than looping over frames.
+
+    >>> buf = SensorBuffer(window=3, max_objects=4)
+    >>> for categories in (['cup'], ['cup', 'ski'], ['cup', 'cup'], ['ski']):
+    ...     _ = buf.append(np.array([(c, 0, .9) + (0,) * 16 for c in categories], dtype=OBJECT_VECTOR_DTYPE))
+    >>> len(buf), buf.now
+    (3, 4)
+    >>> sorted(buf.count_per_class().items())
+    [('cup', 1.0), ('ski', 0.6666666666666666)]
+    >>> buf.count_per_class(frames=1)
+    {'ski': 1.0}
     """
 
-    def __init__(self, samples=10, category_index=CATEGORY_INDEX):
-        self.category_index = category_index
-
-        # TODO: samples is actually 10 DataFrames each with up to N rows, where N is the maximum number of rows to be tracked
-        if isinstance(samples, int):
-            for i in range(samples):
-                self.samples.append(pd.DataFrame())
-        else:
-            for i, row in enumerate(samples):
-                # list of lists of dicts, lists, Series where each element is the "state" of a detected object
-                self.samples += [pd.DataFrame()]
-                for j, obj in enumerate(row):
-                    self.samples[-1][j] = pd.Series(list(zip(*row))[1], index=list(zip(*row))[0], name=i)
-                self.samples[-1].transpose(inplace=True)
-        self.now = 0
-
-    def update_state(self, boxes, classes, scores, category_index=None, window=10, max_boxes_to_draw=None, min_score_thresh=.4):
-        """ Revise state based on latest frame of information (object boxes)
+    def __init__(self, window=10, max_objects=32):
+        """
+        Args:
+            window (int): number of frames held, the oldest one is overwritten by every new frame once it's full
+            max_objects (int): objects kept per frame, the first `max_objects` object vectors of a frame are kept
+        """
+        self.window = window
+        self.max_objects = max_objects
+        self.samples = np.zeros((window, max_objects), dtype=OBJECT_VECTOR_DTYPE)
+        self.num_objects = np.zeros(window, dtype=np.int32)  # objects in each slot
+        self.frame_indices = np.full(window, -1, dtype=np.int64)  # frame index held by each slot, -1 if empty
+        self.timestamps = np.zeros(window)
+        self.now = 0  # index of the next frame, i.e. number of frames appended so far
+
+    def __len__(self):
+        return min(self.now, self.window)
+
+    def append(self, object_vectors, timestamp=None):
+        """ Store the object vectors of the newest frame in place of the oldest one
 
         Args:
-            boxes (list): 2D numpy array of shape (N, 4): (ymin, xmin, ymax, xmax), in normalized format between [0, 1].
-            classes,
-        Args (thats hould be class attributes):
-            category_index (dict of dicts): {1: {'id': 1, 'name': 'person'}, 2: {'id': 2, 'name': 'bicycle'},...}
+            object_vectors (np.array): structured array of dtype `constants.OBJECT_VECTOR_DTYPE`, one row per object
+            timestamp (float): capture time of the frame, in seconds
 
+        Returns:
+            int: index of the frame
+        """
+        slot = self.now % self.window
+        num_objects = min(len(object_vectors), self.max_objects)
+        self.samples[slot, :num_objects] = object_vectors[:num_objects]
+        self.num_objects[slot] = num_objects
+        self.frame_indices[slot] = self.now
+        self.timestamps[slot] = time.time() if timestamp is None else timestamp
+        self.now += 1
+        return self.now - 1
+
+    def _slots(self, frames=None):
+        """ Boolean mask of the slots holding the last `frames` frames (all the buffered ones if None) """
+        frames = self.window if frames is None else min(frames, self.window)
+        return (self.frame_indices >= 0) & (self.frame_indices >= self.now - frames)
+
+    def objects(self, frames=None, category=None):
+        """ The object vectors of the last `frames` frames, optionally only those of one category
+
+        Returns:
+            tuple: (structured array of object vectors, frame index of each of them), oldest frames first
         """
-        category_index = self.category_index if category_index is None else category_index
-        num_boxes = min([boxes.shape[0] if max_boxes_to_draw is None else max_boxes_to_draw,
-                         boxes.shape[0], len(classes)])
-
-        # FIXME: unify self.update_state.states with self.samples
-        if self.update_state.states is None:
-            # Initialize a matrix of state vectors for the past 20 frames
-            self.update_state.row = 0
-            self.update_state.window = 20
-            self.update_state.columns = pd.DataFrame(
-                list(self.category_index.values())).set_index('id', drop=True)['name']
-            self.update_state.states = pd.DataFrame(pd.np.zeros((20, len(self.category_index)),
-                                                                dtype=int), columns=self.update_state.columns)
-            self.update_state.state0 = pd.Series(index=self.update_state.columns)
-
-        state = []  # if state is None else state
-        for i in range(num_boxes):
-            if scores is None or scores[i] > min_score_thresh:
-                # box = tuple(boxes[i].tolist())
-                class_name = self.category_index.get(classes[i], {'name': 'unknown object'})['name']
-                display_str = '{}: {} {}%'.format(classes[i], class_name, int(100 * scores[i]))
-                print(display_str)
-                state += [class_name]
-        state = collections.Counter(state)
-        # state = sorted(list(state.items()))
-
-        # FIXME: not used
-        self.update_state.states.iloc[self.update_state.row, :] = pd.Series(state)
-        self.update_state.row = (self.update_state.row + 1) % len(self.update_state.states)  # update_state.window
-        return state
-    update_state.states = None
+        slots = self._slots(frames)
+        mask = slots[:, np.newaxis] & (np.arange(self.max_objects)[np.newaxis, :] < self.num_objects[:, np.newaxis])
+        order = np.argsort(self.frame_indices, kind='mergesort')
+        mask = mask[order]
+        objects = self.samples[order][mask]
+        frame_indices = np.broadcast_to(self.frame_indices[order][:, np.newaxis], mask.shape)[mask]
+        if category is not None:
+            is_category = objects['category'] == category
+            objects, frame_indices = objects[is_category], frame_indices[is_category]
+        return objects, frame_indices
+
+    def latest(self):
+        """ The object vectors of the newest frame """
+        return self.objects(frames=1)[0]
+
+    def count_per_class(self, frames=None):
+        """ Average number of objects of each category per frame over the last `frames` frames
+
+        Returns:
+            dict: {category name: mean count per frame}, only for the categories seen in the window
+        """
+        num_frames = int(self._slots(frames).sum())
+        categories, counts = np.unique(self.objects(frames)[0]['category'], return_counts=True)
+        return {str(c): int(n) / float(num_frames) for c, n in zip(categories, counts)}
+
+    def mean_position(self, category=None, frames=None):
+        """ Mean (x, y, z) of the objects (of `category`) over the last `frames` frames
+
+        Returns:
+            np.array: (x, y, z), NaN if no such object was seen in the window
+        """
+        objects = self.objects(frames, category=category)[0]
+        if not len(objects):
+            return np.full(3, np.nan)
+        return np.array([objects[key].mean() for key in BB_KEYS[:3]])
+
+    def dominant_color(self, category=None, frames=None):
+        """ The color with the most pixels summed over the objects (of `category`) in the last `frames` frames
+
+        Returns:
+            str: one of `constants.COLOR_KEYS`, or None if no such object was seen in the window
+        """
+        objects = self.objects(frames, category=category)[0]
+        if not len(objects):
+            return None
+        return COLOR_KEYS[int(np.argmax([objects[key].sum() for key in COLOR_KEYS]))]
 
 
 class Radar:
-    """ Inertial 3D position of all objects detected over the course of a session """
+    """ Inertial 3D position of all objects detected over the course of a session
+
+    Keeps the most recent object vector of every tracked instance (instance ids > 0, see `utils.tracking.Tracker`),
+    sorted by instance id so a frame's objects are merged in with one `np.searchsorted`.
+
+    >>> radar = Radar()
+    >>> frame = np.zeros(2, dtype=OBJECT_VECTOR_DTYPE)
+    >>> frame['category'], frame['instance'], frame['x'] = ['cup', 'ski'], [2, 1], [.1, .2]
+    >>> radar.update(frame)
+    >>> frame = np.zeros(2, dtype=OBJECT_VECTOR_DTYPE)
+    >>> frame['category'], frame['instance'], frame['x'] = ['cup', 'dog'], [2, 3], [.5, .3]
+    >>> radar.update(frame)
+    >>> radar.objects[['instance', 'category']].tolist(), radar.objects['x'].astype(float).round(2).tolist()
+    ([(1, 'ski'), (2, 'cup'), (3, 'dog')], [0.2, 0.5, 0.3])
+    """
 
-    def __init__(self, category_index=CATEGORY_INDEX, category_names=10):
-        pass
+    def __init__(self):
+        self.objects = np.zeros(0, dtype=OBJECT_VECTOR_DTYPE)
+        self.last_seen = np.zeros(0)
 
-    def update(self, sensor_frame):
-        """ Add or update all the objects listed in a sensor_frame vector to the radar map (inertial tracking of all objects). """
-        pass
+    def update(self, sensor_frame, timestamp=None):
+        """ Add or update all the tracked objects of a frame (rows of `constants.OBJECT_VECTOR_DTYPE`) in the radar map
+
+        Objects with no instance id (0, untracked) can't be told apart from one frame to the next and are ignored.
+        """
+        timestamp = time.time() if timestamp is None else timestamp
+        sensor_frame = sensor_frame[sensor_frame['instance'] > 0]
+        if not len(sensor_frame):
+            return
+        # if an instance appears more than once in the frame, the last one wins
+        _, last = np.unique(sensor_frame['instance'][::-1], return_index=True)
+        sensor_frame = sensor_frame[::-1][last]
+
+        positions = np.searchsorted(self.objects['instance'], sensor_frame['instance'])
+        known = positions < len(self.objects)
+        known[known] = self.objects['instance'][positions[known]] == sensor_frame['instance'][known]
+        self.objects[positions[known]] = sensor_frame[known]
+        self.last_seen[positions[known]] = timestamp
+
+        objects = np.concatenate([self.objects, sensor_frame[~known]])
+        last_seen = np.concatenate([self.last_seen, np.full(int((~known).sum()), timestamp)])
+        order = np.argsort(objects['instance'], kind='mergesort')
+        self.objects, self.last_seen = objects[order], last_seen[order]
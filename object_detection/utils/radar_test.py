@@ -0,0 +1,90 @@
+# Copyright 2017 The TensorFlow Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+
+"""Tests for object_detection.utils.radar."""
+import numpy as np
+import tensorflow as tf
+
+from object_detection.constants import OBJECT_VECTOR_DTYPE
+from object_detection.utils import radar
+
+
+def _frame(categories, x=0., instances=None, color=None):
+  frame = np.zeros(len(categories), dtype=OBJECT_VECTOR_DTYPE)
+  frame['category'] = categories
+  frame['x'] = x
+  if instances is not None:
+    frame['instance'] = instances
+  if color is not None:
+    frame[color] = 10
+  return frame
+
+
+class SensorBufferTest(tf.test.TestCase):
+
+  def test_window_wraps_around(self):
+    buf = radar.SensorBuffer(window=2, max_objects=3)
+    for i, categories in enumerate([['cup'], ['ski'], ['dog', 'dog']]):
+      self.assertEqual(buf.append(_frame(categories), timestamp=float(i)), i)
+    self.assertEqual(len(buf), 2)
+    objects, frame_indices = buf.objects()
+    self.assertEqual(objects['category'].tolist(), ['ski', 'dog', 'dog'])
+    self.assertEqual(frame_indices.tolist(), [1, 2, 2])
+    self.assertEqual(buf.latest()['category'].tolist(), ['dog', 'dog'])
+    self.assertEqual(buf.count_per_class(), {'ski': .5, 'dog': 1.})
+
+  def test_frames_beyond_max_objects_are_dropped(self):
+    buf = radar.SensorBuffer(window=2, max_objects=2)
+    buf.append(_frame(['cup', 'ski', 'dog']))
+    self.assertEqual(buf.latest()['category'].tolist(), ['cup', 'ski'])
+
+  def test_empty_frames_count(self):
+    buf = radar.SensorBuffer(window=4)
+    buf.append(_frame(['cup']))
+    buf.append(_frame([]))
+    self.assertEqual(buf.count_per_class(), {'cup': .5})
+    self.assertEqual(buf.count_per_class(frames=1), {})
+
+  def test_mean_position(self):
+    buf = radar.SensorBuffer(window=3)
+    buf.append(_frame(['cup', 'ski'], x=[.2, -.5]))
+    buf.append(_frame(['cup'], x=.4))
+    self.assertAllClose(buf.mean_position('cup'), [.3, 0., 0.])
+    self.assertAllClose(buf.mean_position('cup', frames=1), [.4, 0., 0.])
+    self.assertTrue(np.all(np.isnan(buf.mean_position('dog'))))
+
+  def test_dominant_color(self):
+    buf = radar.SensorBuffer(window=3)
+    buf.append(_frame(['cup'], color='red'))
+    buf.append(_frame(['cup', 'ski'], color='blue'))
+    self.assertEqual(buf.dominant_color('cup'), 'red')
+    self.assertEqual(buf.dominant_color('cup', frames=1), 'blue')
+    self.assertEqual(buf.dominant_color('ski'), 'blue')
+    self.assertIsNone(buf.dominant_color('dog'))
+
+
+class RadarTest(tf.test.TestCase):
+
+  def test_update_keeps_latest_vector_per_instance(self):
+    r = radar.Radar()
+    r.update(_frame(['cup', 'ski', 'dog'], x=[.1, .2, .3], instances=[3, 1, 0]), timestamp=1.)
+    r.update(_frame(['cup', 'cat'], x=[.4, .5], instances=[3, 2]), timestamp=2.)
+    self.assertEqual(r.objects['instance'].tolist(), [1, 2, 3])
+    self.assertAllClose(r.objects['x'], [.2, .5, .4])
+    self.assertAllClose(r.last_seen, [1., 2., 2.])
+
+
+if __name__ == '__main__':
+  tf.test.main()
@@ -0,0 +1,359 @@
+# Copyright 2017 The TensorFlow Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+
+"""Sharded TFRecord files with an index sidecar per shard.
+
+The index of a TFRecord file is a JSON lines file next to it (with INDEX_SUFFIX
+appended to its name) holding one line per record:
+  {"offset": byte offset of the record, "length": length of the serialized
+   example, "source_id": source id of the image, "classes": {class label: number
+   of boxes of the class}}
+
+Indexes are written along with the shards by ShardedTFRecordWriter, or built
+once for an existing TFRecord file with build_index. IndexedTFRecordReader
+then reads arbitrary records without scanning the files, e.g. to evaluate a
+small class balanced subset of a dataset, and can resume from a checkpointed
+position. subset_input_config points an input reader config at such a subset.
+"""
+
+import collections
+import copy
+import json
+import os
+import struct
+
+import numpy as np
+import tensorflow as tf
+
+from object_detection.utils import eval_input_cache
+
+INDEX_SUFFIX = '.index'
+
+# Every record is framed by its length (8 bytes) and CRCs of the length and of
+# the data (4 bytes each).
+RECORD_OVERHEAD = 16
+
+
+def index_path(record_path):
+  """Returns the path of the index of the TFRecord file at record_path."""
+  return record_path + INDEX_SUFFIX
+
+
+def _index_line(offset, length, source_id, class_labels):
+  entry = collections.OrderedDict([
+      ('offset', offset),
+      ('length', length),
+      ('source_id', source_id),
+      ('classes', {str(label): count for label, count
+                   in collections.Counter(class_labels).items()}),
+  ])
+  return json.dumps(entry) + '\n'
+
+
+def sharded_record_paths(output_path, num_shards):
+  """Returns the paths of the shards of a sharded TFRecord file.
+
+  Args:
+    output_path: path of the unsharded file, e.g. /data/train.record
+    num_shards: number of shards.
+
+  Returns:
+    a list of num_shards paths, e.g. /data/train.record-00000-of-00010
+  """
+  return ['%s-%05d-of-%05d' % (output_path, shard, num_shards)
+          for shard in range(num_shards)]
+
+
+class ShardedTFRecordWriter(object):
+  """Writes examples round robin to sharded TFRecord files and their indexes."""
+
+  def __init__(self, output_path, num_shards=1):
+    """Constructor.
+
+    Args:
+      output_path: path of the unsharded file, see sharded_record_paths.
+      num_shards: number of shards.
+    """
+    self.record_paths = sharded_record_paths(output_path, num_shards)
+    self._writers = [tf.python_io.TFRecordWriter(path)
+                     for path in self.record_paths]
+    self._index_files = [tf.gfile.GFile(index_path(path), 'w')
+                         for path in self.record_paths]
+    self._offsets = [0] * num_shards
+    self.num_records = 0
+
+  def write(self, serialized_example, source_id, class_labels):
+    """Writes a serialized tf.Example to the next shard and indexes it.
+
+    Args:
+      serialized_example: the serialized tf.Example.
+      source_id: source id of the image of the example.
+      class_labels: the class label of every box of the example.
+    """
+    shard = self.num_records % len(self._writers)
+    self._writers[shard].write(serialized_example)
+    self._index_files[shard].write(_index_line(
+        self._offsets[shard], len(serialized_example), source_id,
+        class_labels))
+    self._offsets[shard] += len(serialized_example) + RECORD_OVERHEAD
+    self.num_records += 1
+
+  def close(self):
+    for writer in self._writers:
+      writer.close()
+    for index_file in self._index_files:
+      index_file.close()
+
+  def __enter__(self):
+    return self
+
+  def __exit__(self, *args):
+    self.close()
+
+
+def _read_record(fid, offset):
+  """Reads the serialized example of the record at offset of an open file."""
+  fid.seek(offset)
+  header = fid.read(12)
+  if len(header) < 12:
+    raise ValueError('No record at offset %d' % offset)
+  length, = struct.unpack('<Q', header[:8])
+  return fid.read(length)
+
+
+def _example_summary(serialized_example):
+  """Returns the source id and the class labels of a serialized tf.Example."""
+  feature = tf.train.Example.FromString(serialized_example).features.feature
+  source_id = feature['image/source_id'].bytes_list.value
+  return (source_id[0].decode('utf8') if source_id else '',
+          list(feature['image/object/class/label'].int64_list.value))
+
+
+def build_index(record_path):
+  """Scans an (uncompressed) TFRecord file once and writes its index.
+
+  Args:
+    record_path: path of the TFRecord file.
+
+  Returns:
+    the number of indexed records.
+  """
+  offset = 0
+  num_records = 0
+  with tf.gfile.GFile(record_path, 'rb') as fid, tf.gfile.GFile(
+      index_path(record_path), 'w') as index_file:
+    while True:
+      header = fid.read(12)
+      if len(header) < 12:
+        break
+      length, = struct.unpack('<Q', header[:8])
+      serialized_example = fid.read(length)
+      if len(serialized_example) < length:
+        raise ValueError('%s is truncated or not a TFRecord file' %
+                         record_path)
+      fid.read(4)
+      source_id, class_labels = _example_summary(serialized_example)
+      index_file.write(_index_line(offset, length, source_id, class_labels))
+      offset += length + RECORD_OVERHEAD
+      num_records += 1
+  return num_records
+
+
+def read_index(record_path):
+  """Returns the index entries of the TFRecord file at record_path."""
+  with tf.gfile.GFile(index_path(record_path), 'r') as index_file:
+    return [json.loads(line) for line in index_file if line.strip()]
+
+
+def write_checkpoint(path, record_ids, position):
+  """Saves which records are being read and how many of them have been.
+
+  Args:
+    path: path of the checkpoint file.
+    record_ids: ids of the records being read, in reading order.
+    position: number of those records already processed.
+  """
+  with tf.gfile.GFile(path, 'w') as fid:
+    json.dump({'record_ids': [int(i) for i in record_ids],
+               'position': int(position)}, fid)
+
+
+def read_checkpoint(path):
+  """Returns the (record ids, position) saved by write_checkpoint."""
+  with tf.gfile.GFile(path, 'r') as fid:
+    checkpoint = json.load(fid)
+  return checkpoint['record_ids'], checkpoint['position']
+
+
+class IndexedTFRecordReader(object):
+  """Random access to the records of indexed TFRecord files.
+
+  The records of all the files are numbered consecutively in the order of
+  record_paths, and record i can be read without reading records 0 to i-1.
+  """
+
+  def __init__(self, record_paths, build_missing_indexes=True):
+    """Constructor.
+
+    Args:
+      record_paths: list of TFRecord file paths, or a glob pattern (matching
+        index files is fine, they are skipped).
+      build_missing_indexes: whether to build the index of files without one
+        instead of failing.
+
+    Raises:
+      ValueError: if no file matches record_paths.
+      NotFoundError: if a file has no index and build_missing_indexes is
+        False.
+    """
+    if isinstance(record_paths, str):
+      record_paths = sorted(path for path in tf.gfile.Glob(record_paths)
+                            if not path.endswith(INDEX_SUFFIX))
+    if not record_paths:
+      raise ValueError('No TFRecord files to read.')
+    self.record_paths = list(record_paths)
+    shards, offsets, source_ids, class_counts = [], [], [], []
+    for shard, path in enumerate(self.record_paths):
+      if build_missing_indexes and not tf.gfile.Exists(index_path(path)):
+        build_index(path)
+      for entry in read_index(path):
+        shards.append(shard)
+        offsets.append(entry['offset'])
+        source_ids.append(entry['source_id'])
+        class_counts.append({int(label): count for label, count
+                             in entry['classes'].items()})
+    self.shards = np.array(shards, dtype=np.int32)
+    self.offsets = np.array(offsets, dtype=np.int64)
+    self.source_ids = source_ids
+    self.class_counts = class_counts
+    self._files = {}
+
+  def __len__(self):
+    return len(self.offsets)
+
+  def _file(self, shard):
+    if shard not in self._files:
+      self._files[shard] = tf.gfile.GFile(self.record_paths[shard], 'rb')
+    return self._files[shard]
+
+  def read(self, record_id):
+    """Returns the serialized tf.Example of record record_id."""
+    return _read_record(self._file(self.shards[record_id]),
+                        self.offsets[record_id])
+
+  def records(self, record_ids=None, position=0):
+    """Reads records in the given order, starting at position.
+
+    Args:
+      record_ids: ids of the records to read, all of them if None.
+      position: number of record_ids to skip, e.g. the position of a
+        checkpoint to resume from.
+
+    Yields:
+      (position, serialized tf.Example) tuples. Checkpointing position + 1
+      after processing a record resumes after it.
+    """
+    if record_ids is None:
+      record_ids = range(len(self))
+    for idx in range(position, len(record_ids)):
+      yield idx, self.read(record_ids[idx])
+
+  def random_subset(self, fraction, seed=None):
+    """Returns the sorted ids of a random fraction of the records."""
+    num_records = int(round(fraction * len(self)))
+    random_state = np.random.RandomState(seed)
+    return np.sort(random_state.choice(len(self), num_records, replace=False))
+
+  def class_balanced_subset(self, num_per_class, seed=None):
+    """Samples records such that every class appears in about as many.
+
+    Args:
+      num_per_class: number of records sampled among those with boxes of each
+        class, all of them for classes in fewer records.
+      seed: seed of the sampling.
+
+    Returns:
+      the sorted ids of the union of the records sampled for each class.
+    """
+    records_per_class = collections.defaultdict(list)
+    for record_id, counts in enumerate(self.class_counts):
+      for label in counts:
+        records_per_class[label].append(record_id)
+    random_state = np.random.RandomState(seed)
+    sampled = set()
+    for label in sorted(records_per_class):
+      record_ids = records_per_class[label]
+      if len(record_ids) > num_per_class:
+        record_ids = random_state.choice(record_ids, num_per_class,
+                                         replace=False)
+      sampled.update(int(record_id) for record_id in record_ids)
+    return np.array(sorted(sampled), dtype=np.int64)
+
+  def close(self):
+    for fid in self._files.values():
+      fid.close()
+    self._files = {}
+
+  def __enter__(self):
+    return self
+
+  def __exit__(self, *args):
+    self.close()
+
+
+def subset_input_config(input_config, output_dir, fraction=1., num_per_class=0,
+                        seed=0):
+  """Points a copy of an input reader config at a subset of its records.
+
+  The subset, a random fraction of the records or num_per_class records of
+  each class, is copied to a TFRecord file in output_dir and its record ids
+  are saved next to it with write_checkpoint. The file names are derived from
+  the config and the subset parameters, so every checkpoint evaluated with the
+  same parameters, and a restarted job, reads the same records.
+
+  Args:
+    input_config: input_reader_pb2.InputReader with a tf_record_input_reader.
+    output_dir: directory to write the subset to.
+    fraction: fraction of the records in a random subset.
+    num_per_class: if set, sample a class balanced subset with this many
+      records per class instead (see IndexedTFRecordReader).
+    seed: seed of the sampling.
+
+  Returns:
+    a copy of input_config reading the subset, and the number of records in it.
+  """
+  key = eval_input_cache.config_hash(input_config, fraction, num_per_class,
+                                     seed)
+  record_path = os.path.join(output_dir, 'subset-%s.record' % key)
+  ids_path = record_path + '.ids'
+  if tf.gfile.Exists(ids_path):
+    record_ids, _ = read_checkpoint(ids_path)
+  else:
+    tf.gfile.MakeDirs(output_dir)
+    with IndexedTFRecordReader(
+        input_config.tf_record_input_reader.input_path) as reader:
+      if num_per_class:
+        record_ids = reader.class_balanced_subset(num_per_class, seed=seed)
+      else:
+        record_ids = reader.random_subset(fraction, seed=seed)
+      writer = tf.python_io.TFRecordWriter(record_path)
+      for _, record in reader.records(record_ids):
+        writer.write(record)
+      writer.close()
+    # Written once the copy is complete, with every record processed.
+    write_checkpoint(ids_path, record_ids, len(record_ids))
+  subset_config = copy.deepcopy(input_config)
+  subset_config.tf_record_input_reader.input_path = record_path
+  return subset_config, len(record_ids)
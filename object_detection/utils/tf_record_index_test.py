@@ -0,0 +1,141 @@
+# Copyright 2017 The TensorFlow Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+
+"""Tests for object_detection.utils.tf_record_index."""
+import os
+
+import tensorflow as tf
+
+from object_detection.protos import input_reader_pb2
+from object_detection.utils import dataset_util
+from object_detection.utils import tf_record_index
+
+
+def _make_example(idx, class_labels):
+  return tf.train.Example(features=tf.train.Features(feature={
+      'image/source_id': dataset_util.bytes_feature(
+          ('image_%d' % idx).encode('utf8')),
+      'image/encoded': dataset_util.bytes_feature(b'x' * (idx * 7 % 23)),
+      'image/object/class/label': dataset_util.int64_list_feature(
+          class_labels),
+  })).SerializeToString()
+
+
+class TfRecordIndexTest(tf.test.TestCase):
+
+  def setUp(self):
+    # Class 1 is in every image, class 2 in every third and class 3 in one.
+    self.examples = []
+    for idx in range(30):
+      class_labels = [1, 1] if idx % 3 else [1, 2]
+      if idx == 17:
+        class_labels.append(3)
+      self.examples.append((_make_example(idx, class_labels), 'image_%d' % idx,
+                            class_labels))
+    self.output_path = os.path.join(self.get_temp_dir(), 'data.record')
+    with tf_record_index.ShardedTFRecordWriter(self.output_path,
+                                               num_shards=3) as writer:
+      for example in self.examples:
+        writer.write(*example)
+    self.record_paths = writer.record_paths
+
+  def test_build_index_matches_writer_index(self):
+    for path in self.record_paths:
+      written_index = tf_record_index.read_index(path)
+      tf.gfile.Remove(tf_record_index.index_path(path))
+      self.assertEqual(tf_record_index.build_index(path), 10)
+      self.assertEqual(tf_record_index.read_index(path), written_index)
+
+  def test_missing_index_is_built(self):
+    tf.gfile.Remove(tf_record_index.index_path(self.record_paths[1]))
+    with tf_record_index.IndexedTFRecordReader(self.output_path + '-*') as reader:
+      self.assertEqual(len(reader), 30)
+      self.assertTrue(tf.gfile.Exists(
+          tf_record_index.index_path(self.record_paths[1])))
+
+  def test_read_arbitrary_records(self):
+    with tf_record_index.IndexedTFRecordReader(self.record_paths) as reader:
+      # Shard s holds examples s, s + 3, s + 6, ...
+      expected = [self.examples[(i % 10) * 3 + i // 10][0] for i in range(30)]
+      for record_id in [29, 0, 13, 13, 5, 20]:
+        self.assertEqual(reader.read(record_id), expected[record_id])
+      self.assertEqual(reader.source_ids[11], 'image_4')
+      self.assertEqual(reader.class_counts[11], {1: 2})
+
+  def test_class_balanced_subset(self):
+    with tf_record_index.IndexedTFRecordReader(self.record_paths) as reader:
+      record_ids = reader.class_balanced_subset(num_per_class=2, seed=1)
+      self.assertAllEqual(record_ids, sorted(record_ids))
+      classes = [label for record_id in record_ids
+                 for label in reader.class_counts[record_id]]
+      self.assertIn(3, classes)
+      self.assertGreaterEqual(classes.count(1), 2)
+      self.assertGreaterEqual(classes.count(2), 2)
+      self.assertLessEqual(len(record_ids), 6)
+
+  def test_random_subset(self):
+    with tf_record_index.IndexedTFRecordReader(self.record_paths) as reader:
+      record_ids = reader.random_subset(0.1, seed=3)
+      self.assertEqual(len(record_ids), 3)
+      self.assertEqual(len(set(record_ids)), 3)
+
+  def test_resume_from_checkpoint(self):
+    checkpoint_path = os.path.join(self.get_temp_dir(), 'checkpoint.json')
+    record_ids = [7, 3, 25, 11, 0]
+    with tf_record_index.IndexedTFRecordReader(self.record_paths) as reader:
+      read = []
+      for position, record in reader.records(record_ids):
+        read.append(record)
+        tf_record_index.write_checkpoint(checkpoint_path, record_ids,
+                                         position + 1)
+        if position == 1:
+          break
+      restored_ids, position = tf_record_index.read_checkpoint(
+          checkpoint_path)
+      self.assertEqual(restored_ids, record_ids)
+      self.assertEqual(position, 2)
+      read.extend(record for _, record in reader.records(restored_ids,
+                                                         position))
+      self.assertEqual(read, [reader.read(i) for i in record_ids])
+
+  def test_subset_input_config(self):
+    input_config = input_reader_pb2.InputReader()
+    input_config.tf_record_input_reader.input_path = self.output_path + '-*'
+    output_dir = os.path.join(self.get_temp_dir(), 'eval')
+    subset_config, num_records = tf_record_index.subset_input_config(
+        input_config, output_dir, num_per_class=2, seed=1)
+    subset_path = subset_config.tf_record_input_reader.input_path
+    self.assertEqual(os.path.dirname(subset_path), output_dir)
+    self.assertEqual(input_config.tf_record_input_reader.input_path,
+                     self.output_path + '-*')
+    with tf_record_index.IndexedTFRecordReader([subset_path]) as reader:
+      self.assertEqual(len(reader), num_records)
+      classes = set(label for counts in reader.class_counts for label in counts)
+      self.assertEqual(classes, {1, 2, 3})
+      subset = [record for _, record in reader.records()]
+
+    # the same parameters reuse the subset, other ones sample a new one
+    self.assertEqual(tf_record_index.subset_input_config(
+        input_config, output_dir, num_per_class=2, seed=1)[0], subset_config)
+    fraction_config, num_records = tf_record_index.subset_input_config(
+        input_config, output_dir, fraction=.5)
+    self.assertEqual(num_records, 15)
+    self.assertNotEqual(fraction_config, subset_config)
+    self.assertTrue(all(record in [e[0] for e in self.examples]
+                        for record in subset))
+
+
+if __name__ == '__main__':
+  tf.test.main()
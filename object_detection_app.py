@@ -1,12 +1,18 @@
 import time
 import argparse
+import functools
+import collections
 import multiprocessing
 
 import numpy as np
 import cv2
 import tensorflow as tf
 
-from utils.app_utils import FPS, WebcamVideoStream
+from utils.app_utils import FPS, CaptureStats, ReorderBuffer, WebcamVideoStream, get_batch
+from utils.model_utils import load_graph_def, load_frozen_graph, run_inference, run_tiled_inference
+from utils.shm_utils import SharedFrameRing, SharedStateStore
+from utils.motion import MotionGate
+from utils.tracking import Tracker
 from multiprocessing import Queue, Pool
 from object_detection.utils import visualization_utils as vis_util
 from nlp import describe_scene, say, update_state
@@ -17,42 +23,71 @@ from nlp.command import DescribeScene, DescribeObjectColor
 from object_detection.constants import CATEGORY_INDEX, PATH_TO_CKPT
 
 
-def detect_objects(image_np, sess, detection_graph, _state_q, voice_on=False):
-    # Expand dimensions since the model expects images to have shape: [1, None, None, 3]
-    image_np_expanded = np.expand_dims(image_np, axis=0)
-    image_tensor = detection_graph.get_tensor_by_name('image_tensor:0')
-
-    # Each box represents a part of the image where a particular object was detected.
-    boxes = detection_graph.get_tensor_by_name('detection_boxes:0')
-
-    # Each score represent how level of confidence for each of the objects.
-    # Score is shown on the result image, together with the class label.
-    scores = detection_graph.get_tensor_by_name('detection_scores:0')
-    classes = detection_graph.get_tensor_by_name('detection_classes:0')
-    num_detections = detection_graph.get_tensor_by_name('num_detections:0')
-
-    # Actual detection.
-    (boxes, scores, classes, num_detections) = sess.run(
-        [boxes, scores, classes, num_detections],
-        feed_dict={image_tensor: image_np_expanded})
-
+def detect_frames(images_np, detect, sess, detection_graph, inference=run_inference):
+    """ Run the detector once on the frames flagged in `detect`, sharing a single `sess.run` call between them
+
+    Args:
+        images_np (list of np.array): same-sized RGB frames
+        detect (list of bool): whether each frame goes through the detector
+        inference (callable): `run_inference`, or `run_tiled_inference` with its tiling options bound
+
+    Returns:
+        list: (boxes, classes, scores) of each frame, None for the frames that weren't flagged
+    """
+    detections = [None] * len(images_np)
+    indices = [i for i, d in enumerate(detect) if d]
+    if indices:
+        (boxes, scores, classes, num_detections) = inference([images_np[i] for i in indices], sess, detection_graph)
+        for j, i in enumerate(indices):
+            detections[i] = (boxes[j], classes[j], scores[j])
+    return detections
+
+
+def track_frame(image_np, timestamp, tracker, state_store, detections=None, moving=True, voice_on=False):
+    """ Update the tracks with a frame's detections, or predict them if it has none, and annotate the frame with them
+
+    Tracks only make sense over consecutive frames, so this must see every frame in capture order: with several
+    workers it runs in the process that puts their outputs back in order, never in the workers themselves.
+
+    Args:
+        image_np (np.array): RGB frame, annotated in place
+        timestamp (float): capture time of the frame, in seconds
+        tracker (Tracker): tracks of the previous frames, updated in place
+        detections (tuple): (boxes, classes, scores) of the frame, None if the detector didn't run on it
+        moving (bool): False if nothing moved in the frame (see `MotionGate`), so the tracks are held where they are
+
+    Returns:
+        np.array: the annotated frame
+    """
+    if detections is not None:
+        tracks = tracker.update(*detections, now=timestamp)
+    elif moving:
+        tracks = tracker.predict(now=timestamp)
+    else:
+        tracks = tracker.hold(now=timestamp)
+    tracked_boxes, tracked_classes, tracked_scores, instances = tracks
+    return annotate_frame(image_np, tracked_boxes, tracked_scores, tracked_classes, state_store, voice_on=voice_on,
+                          instances=instances, timestamp=timestamp)
+
+
+def annotate_frame(image_np, boxes, scores, classes, state_store, voice_on=False, instances=None, timestamp=None):
     # Visualization of the results of a detection.
     vis_util.visualize_boxes_and_labels_on_image_array(
         image_np,
-        np.squeeze(boxes),
-        np.squeeze(classes).astype(np.int32),
-        np.squeeze(scores),
+        boxes,
+        classes,
+        scores,
         CATEGORY_INDEX,
         use_normalized_coordinates=True,
         line_thickness=8)
 
     # Describe the image
-    object_vectors = update_state(image=image_np, boxes=np.squeeze(boxes),
-                                  classes=np.squeeze(classes).astype(np.int32),
-                                  scores=np.squeeze(scores), category_index=CATEGORY_INDEX)
+    object_vectors = update_state(image=image_np, boxes=boxes, classes=classes,
+                                  scores=scores, category_index=CATEGORY_INDEX, instances=instances)
 
-    # Persists image state (list of object vectors for that image) in a queue
-    _state_q.put(object_vectors)
+    # Publishes the image state (object vectors of that image) as the latest snapshot for the voice commands to read.
+    # Only the capture process annotates frames, in capture order, so it is the store's only writer.
+    state_store.publish(object_vectors, timestamp=timestamp)
 
     # FIXME: this should not be happening here, but should be happening in the commands.py executive logic
     description = describe_scene(object_vectors)
@@ -61,33 +96,48 @@ def detect_objects(image_np, sess, detection_graph, _state_q, voice_on=False):
     return image_np
 
 
-detect_objects.state = []  # poor man's class/object
-
+def worker(frame_ring, input_q, output_q, batch_size=1, max_batch_wait_ms=0, max_frame_age_ms=0, tiles=None,
+           tile_overlap=.2):
+    """ Run the detector on the frames the capture process flagged with meta['detect']
 
-def worker(input_q, output_q, state_q, voice_on=False):
-    # Load a (frozen) Tensorflow model into memory.
-    detection_graph = tf.Graph()
-    with detection_graph.as_default():
-        od_graph_def = tf.GraphDef()
-        with tf.gfile.GFile(PATH_TO_CKPT, 'rb') as fid:
-            serialized_graph = fid.read()
-            od_graph_def.ParseFromString(serialized_graph)
-            tf.import_graph_def(od_graph_def, name='')
-
-        sess = tf.Session(graph=detection_graph)
+    Each worker only sees its share of the frames, so the motion gating, the tracking and the annotation are left to
+    the capture process: the detections travel back in meta['detections'] (see `detect_frames`).
+    """
+    detection_graph = load_frozen_graph(PATH_TO_CKPT)
+    sess = tf.Session(graph=detection_graph)
+    # High resolution frames go through the detector as a batch of overlapping tiles, so small objects aren't lost
+    inference = run_inference
+    if tiles is not None:
+        inference = functools.partial(run_tiled_inference, grid=tiles, overlap=tile_overlap)
 
     fps = FPS().start()
 
     while True:
-        fps.update()
-        frame = input_q.get()
-        frame_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-
-        if state_q.full():
-            state_q.get()
-            state_q.get()
-
-        output_q.put(detect_objects(frame_rgb, sess, detection_graph, state_q, voice_on=voice_on))
+        # Drain up to batch_size frames so they share a single sess.run call
+        # Only (slot, metadata) pairs travel through the queues, the frames themselves stay in shared memory
+        messages = get_batch(input_q, batch_size=batch_size, max_wait=max_batch_wait_ms / 1000.)
+
+        # When the workers fall behind, frames that sat in input_q too long are handed back unprocessed,
+        # so latency stays bounded instead of growing with the queue size
+        fresh_messages = []
+        for slot, meta in messages:
+            meta['stale'] = max_frame_age_ms > 0 and (time.time() - meta['captured']) * 1000. > max_frame_age_ms
+            if meta['stale']:
+                output_q.put((slot, meta))
+            else:
+                fresh_messages.append((slot, meta))
+        if not fresh_messages:
+            continue
+
+        frames_rgb = [cv2.cvtColor(frame_ring[slot], cv2.COLOR_BGR2RGB, dst=frame_ring[slot])
+                      for slot, meta in fresh_messages]
+
+        detections = detect_frames(frames_rgb, [meta['detect'] for slot, meta in fresh_messages], sess,
+                                   detection_graph, inference=inference)
+        for (slot, meta), d in zip(fresh_messages, detections):
+            meta['detections'] = d
+            fps.update()
+            output_q.put((slot, meta))
 
     fps.stop()
     sess.close()
@@ -106,13 +156,33 @@ if __name__ == '__main__':
     parser.add_argument('-num-w', '--num-workers', dest='num_workers', type=int,
                         default=2, help='Number of workers.')
     parser.add_argument('-q-size', '--queue-size', dest='queue_size', type=int,
-                        default=5, help='Size of the queue.')
+                        default=5, help='Size of the queue (also the number of shared memory frame slots).')
     parser.add_argument('-g', '--gui', action='store_true', default=False, dest='gui',
                         help='Show a GUI/Graphics, or run headless.')
     parser.add_argument('-s', '--say', action='store_true', default=False, dest='voice_on',
                         help='Say commands on local computer (for debugging)')
-    parser.add_argument('-sq-size', '--state-queue-size', dest='state_queue_size', type=int,
-                        default=5, help='Size of the object detection state queue size.')
+    parser.add_argument('-so', '--max-state-objects', dest='max_state_objects', type=int,
+                        default=32, help='Maximum number of objects kept in the latest detection state.')
+    parser.add_argument('-b', '--batch-size', dest='batch_size', type=int,
+                        default=1, help='Maximum number of frames each worker runs through the detector at once.')
+    parser.add_argument('-bw', '--max-batch-wait-ms', dest='max_batch_wait_ms', type=float,
+                        default=0, help='Milliseconds a worker waits for a batch to fill before running it.')
+    parser.add_argument('-rw', '--max-reorder-wait-ms', dest='max_reorder_wait_ms', type=float,
+                        default=500, help='Milliseconds to hold finished frames while waiting for an earlier one.')
+    parser.add_argument('-k', '--detect-every', dest='detect_every', type=int,
+                        default=1, help='Run the detector on every k-th frame and track the objects in between.')
+    parser.add_argument('-m', '--motion-thresh', dest='motion_thresh', type=float,
+                        default=0, help='Skip the detector on frames in which less than this fraction of the pixels '
+                                        'changed, reusing the previous detections (0 to detect on every frame).')
+    parser.add_argument('-ms', '--max-static-frames', dest='max_static_frames', type=int,
+                        default=0, help='Run the detector after this many static frames in a row anyway (0 for never).')
+    parser.add_argument('-tiles', '--tiles', dest='tiles', type=int, nargs=2, metavar=('ROWS', 'COLUMNS'),
+                        default=None, help='Detect on a grid of overlapping tiles of each frame, for small objects in '
+                                           'high resolution streams (costs one detector input per tile).')
+    parser.add_argument('-to', '--tile-overlap', dest='tile_overlap', type=float,
+                        default=.2, help='Fraction of each tile shared with its neighbors.')
+    parser.add_argument('-age', '--max-frame-age-ms', dest='max_frame_age_ms', type=float,
+                        default=0, help='Drop frames that waited longer than this for a worker (0 to never drop).')
     args = parser.parse_args()
 
     logger = multiprocessing.log_to_stderr()
@@ -120,12 +190,12 @@ if __name__ == '__main__':
 
     input_q = Queue(maxsize=args.queue_size)
     output_q = Queue(maxsize=args.queue_size)
-    state_q = Queue(maxsize=args.state_queue_size)
-
-    dispatcher['color'] = DescribeObjectColor(state_q)
-    dispatcher['describe'] = DescribeScene(state_q)
+    # The capture process publishes the object vectors of every frame it annotates here (see `annotate_frame`), the
+    # voice commands read them without waiting or consuming them
+    state_store = SharedStateStore(max_objects=args.max_state_objects)
 
-    pool = Pool(args.num_workers, worker, (input_q, output_q, state_q, args.voice_on))
+    dispatcher['color'] = DescribeObjectColor(state_store)
+    dispatcher['describe'] = DescribeScene(state_store)
 
     disp_graphics = args.gui
     source = args.video_stream_source
@@ -136,6 +206,37 @@ if __name__ == '__main__':
     video_capture = WebcamVideoStream(src=source,
                                       width=args.width,
                                       height=args.height).start()
+
+    # The camera may not honor the requested size, so size the slots from the first frame it actually returned.
+    # One slot per queue entry bounds the frames in flight, so neither queue can fill up and block.
+    height, width = (args.height, args.width) if video_capture.frame is None else video_capture.frame.shape[:2]
+    frame_ring = SharedFrameRing(num_slots=args.queue_size, height=height, width=width)
+
+    # Parse the model once here so the forked workers inherit it rather than each re-reading and re-parsing it
+    load_graph_def(PATH_TO_CKPT)
+    pool = Pool(args.num_workers, worker, (frame_ring, input_q, output_q, args.batch_size, args.max_batch_wait_ms,
+                                           args.max_frame_age_ms, args.tiles, args.tile_overlap))
+
+    # Frames of a static scene skip the detector and keep the previous tracks. The gate has to see every frame in
+    # order for its background model and its count of static frames in a row, so it runs here rather than in the
+    # workers, on a small grayscale copy of the frame (the channel order doesn't matter, it's the same every frame).
+    gate = MotionGate(threshold=args.motion_thresh, max_skip=args.max_static_frames) if args.motion_thresh > 0 else None
+
+    # A single tracker sees every frame in capture order, whichever worker detected it, so the instance ids it
+    # assigns are unique and persist across workers. Which frames are detected is decided here as they're submitted:
+    # every detect_every-th frame whatever the number of workers, or sooner once the tracks' confidence decays.
+    tracker = Tracker(detect_every=args.detect_every)
+    # detect flag of each moving frame submitted but not tracked yet, by seq, so the tracker can count them in its
+    # decision (static frames hold the tracks as they are, so they don't count)
+    in_flight = collections.OrderedDict()
+
+    # Workers finish frames out of order, so outputs are put back into capture order before they're shown
+    reorder_buffer = ReorderBuffer(max_wait=args.max_reorder_wait_ms / 1000.)
+    seq = 0
+
+    capture_stats = CaptureStats()
+    last_frame_id = 0
+
     fps = FPS().start()
 
     rc = 0  # mqtt client status. Error if not zero
@@ -144,17 +245,62 @@ if __name__ == '__main__':
         t = time.time()
 
         if video_capture.stream.isOpened():
-            frame = video_capture.read()
+            # blocks until the camera has a new frame, but not for so long that finished frames aren't shown
+            frame_id, frame = video_capture.read_latest(timeout=.1, last_id=last_frame_id)
 
             if frame is None:
                 continue
 
-            input_q.put(frame)
-
-            output_rgb = cv2.cvtColor(output_q.get(), cv2.COLOR_RGB2BGR)
-            if disp_graphics:
-                cv2.imshow('Video', output_rgb)
-            fps.update()
+            # Latest frame wins: only the newest camera frame is ever submitted, and never twice
+            if frame_id == last_frame_id:
+                capture_stats.duplicated += 1  # timed out waiting for a new frame
+            else:
+                capture_stats.captured += frame_id - last_frame_id
+                capture_stats.dropped += frame_id - last_frame_id - 1  # overwritten before we got to them
+                last_frame_id = frame_id
+
+                slot = frame_ring.acquire()
+                if slot is None:  # workers are behind and every slot is still in flight
+                    capture_stats.dropped += 1
+                else:
+                    if frame.shape != frame_ring[slot].shape:
+                        frame = cv2.resize(frame, (width, height))
+                    frame_ring.write(slot, frame)
+                    static = gate is not None and not gate.is_moving(frame)
+                    detect = False
+                    if not static:
+                        detect = in_flight[seq] = tracker.should_detect(pending=list(in_flight.values()))
+                    input_q.put((slot, {'seq': seq, 'frame_id': frame_id, 'captured': time.time(),
+                                        'detect': detect, 'static': static}))
+                    capture_stats.submitted += 1
+                    seq += 1
+
+            # Don't wait on each frame in lockstep, otherwise the workers never see more than one frame to batch
+            while not output_q.empty():
+                slot, meta = output_q.get()
+                if not reorder_buffer.push(meta['seq'], (slot, meta)):
+                    in_flight.pop(meta['seq'], None)
+                    frame_ring.release(slot)  # too late, a newer frame has already been shown
+                    capture_stats.dropped += 1
+
+            for _, (slot, meta) in reorder_buffer.pop_ready():
+                in_flight.pop(meta['seq'], None)
+                if meta['stale']:
+                    frame_ring.release(slot)
+                    capture_stats.dropped += 1
+                    continue
+                if meta['static']:
+                    capture_stats.static += 1
+                # annotates the frame in place, in its slot
+                track_frame(frame_ring[slot], meta['captured'], tracker, state_store, detections=meta['detections'],
+                            moving=not meta['static'], voice_on=args.voice_on)
+                output_rgb = cv2.cvtColor(frame_ring[slot], cv2.COLOR_RGB2BGR)
+                frame_ring.release(slot)
+                if disp_graphics:
+                    cv2.imshow('Video', output_rgb)
+                fps.update()
+
+            capture_stats.update_queue_depth(len(frame_ring) - frame_ring.num_free)
         else:
             video_capture.stream.open(source)
 
@@ -171,6 +317,10 @@ if __name__ == '__main__':
     fps.stop()
     print('[INFO] elapsed time (total): {:.2f}'.format(fps.elapsed()))
     print('[INFO] approx. FPS: {:.2f}'.format(fps.fps()))
+    print('[INFO] frames skipped/dropped to keep order: {}/{}'.format(reorder_buffer.skipped, reorder_buffer.dropped))
+    print('[INFO] capture: {}'.format(capture_stats))
+    if gate is not None:
+        print('[INFO] motion gate: {}'.format(gate))
 
     pool.terminate()
     video_capture.stop()
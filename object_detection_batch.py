@@ -0,0 +1,199 @@
+""" Run the detector over recorded video files and image directories as fast as the hardware allows
+
+Examples:
+    $ python object_detection_batch.py footage/*.mp4 -o detections.jsonl
+    $ python object_detection_batch.py 'snapshots/**/*.jpg' -o detections.parquet --num-workers 4 --batch-size 8
+"""
+import os
+import glob
+import json
+import argparse
+import collections
+from multiprocessing import Pool
+
+import cv2
+import tensorflow as tf
+
+from utils.app_utils import FPS, prefetch
+from utils.model_utils import load_graph_def, load_frozen_graph, run_inference
+from object_detection.constants import CATEGORY_INDEX, PATH_TO_CKPT
+
+IMAGE_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.bmp', '.tif', '.tiff'}
+VIDEO_EXTENSIONS = {'.mp4', '.avi', '.mov', '.mkv', '.m4v', '.mpg', '.mpeg', '.webm'}
+
+# detection graph and session of each pool worker, see `_init_worker`
+_worker = {}
+
+
+def _walk_media_files(directory):
+    """ Sorted paths of the image and video files anywhere under `directory` """
+    paths = []
+    for root, _, filenames in os.walk(directory):
+        paths.extend(os.path.join(root, filename) for filename in filenames
+                     if os.path.splitext(filename)[1].lower() in IMAGE_EXTENSIONS | VIDEO_EXTENSIONS)
+    return sorted(paths)
+
+
+def expand_sources(patterns):
+    """ Expand file paths, directories and (recursive) glob patterns into a sorted, de-duplicated list of files
+
+    A directory, named directly or matched by a pattern, stands for the image and video files anywhere under it.
+    Paths that match nothing are dropped.
+    """
+    sources = []
+    for pattern in patterns:
+        for path in sorted(glob.glob(pattern, recursive=True)) or [pattern]:
+            sources.extend(_walk_media_files(path) if os.path.isdir(path) else [path])
+    return list(collections.OrderedDict.fromkeys(p for p in sources if os.path.isfile(p)))
+
+
+def read_frames(sources):
+    """ Decode every frame of every video and image in `sources`
+
+    Yields:
+        tuple: (source path, frame index within the source, RGB frame)
+    """
+    for source in sources:
+        if os.path.splitext(source)[1].lower() in IMAGE_EXTENSIONS:
+            frame = cv2.imread(source)
+            if frame is not None:
+                yield source, 0, cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+            continue
+
+        stream = cv2.VideoCapture(source)
+        frame_index = 0
+        while True:
+            (grabbed, frame) = stream.read()
+            if not grabbed:
+                break
+            yield source, frame_index, cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+            frame_index += 1
+        stream.release()
+
+
+def batch_frames(frames, batch_size):
+    """ Group consecutive frames of the same shape into batches of up to `batch_size`
+
+    Yields:
+        list: (source, frame index, frame) tuples that can be stacked into one tensor
+    """
+    batch = []
+    for item in frames:
+        if batch and (len(batch) == batch_size or item[2].shape != batch[0][2].shape):
+            yield batch
+            batch = []
+        batch.append(item)
+    if batch:
+        yield batch
+
+
+def _init_worker(path_to_ckpt):
+    _worker['graph'] = load_frozen_graph(path_to_ckpt)
+    _worker['sess'] = tf.Session(graph=_worker['graph'])
+
+
+def _detect_batch(batch, min_score_thresh=.5):
+    (boxes, scores, classes, num_detections) = run_inference([frame for _, _, frame in batch],
+                                                             _worker['sess'], _worker['graph'])
+    records = []
+    for i, (source, frame_index, frame) in enumerate(batch):
+        keep = scores[i] > min_score_thresh
+        records.append({
+            'source': source,
+            'frame': frame_index,
+            'height': frame.shape[0],
+            'width': frame.shape[1],
+            'boxes': boxes[i][keep].tolist(),
+            'scores': scores[i][keep].tolist(),
+            'classes': classes[i][keep].tolist(),
+            'names': [CATEGORY_INDEX.get(c, {'name': 'unknown object'})['name'] for c in classes[i][keep]],
+        })
+    return records
+
+
+def detect_all(batches, num_workers=2, max_pending=None, min_score_thresh=.5):
+    """ Run detection on `batches` across a process pool, keeping at most `max_pending` batches in flight
+
+    Unlike `Pool.imap`, which consumes its whole input up front, only `max_pending` decoded batches are held in
+    memory at a time, however long the footage is.
+
+    Yields:
+        dict: one record per frame, in input order
+    """
+    max_pending = max_pending or 2 * num_workers
+    # Parse the model once here so the forked workers inherit it rather than each re-reading and re-parsing it
+    load_graph_def(PATH_TO_CKPT)
+    pool = Pool(num_workers, _init_worker, (PATH_TO_CKPT,))
+    pending = collections.deque()
+    try:
+        for batch in batches:
+            pending.append(pool.apply_async(_detect_batch, (batch, min_score_thresh)))
+            if len(pending) >= max_pending:
+                yield from pending.popleft().get()
+        while pending:
+            yield from pending.popleft().get()
+    finally:
+        pool.terminate()
+
+
+def write_records(records, output_path):
+    """ Write per-frame detection records to JSON lines, or to Parquet (one row per detection, needs pyarrow)
+
+    Returns:
+        tuple: (number of frames, number of detections) written
+    """
+    num_frames, num_detections = 0, 0
+    if output_path.endswith('.parquet'):
+        import pandas as pd
+        rows = []
+        for record in records:
+            num_frames += 1
+            for box, score, class_id, name in zip(record['boxes'], record['scores'], record['classes'],
+                                                   record['names']):
+                rows.append([record['source'], record['frame'], class_id, name, score] + box)
+        num_detections = len(rows)
+        pd.DataFrame(rows, columns=['source', 'frame', 'class_id', 'name', 'score',
+                                    'ymin', 'xmin', 'ymax', 'xmax']).to_parquet(output_path)
+    else:
+        with open(output_path, 'w') as fout:
+            for record in records:
+                num_frames += 1
+                num_detections += len(record['scores'])
+                fout.write(json.dumps(record) + '\n')
+    return num_frames, num_detections
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('sources', nargs='+',
+                        help='Video files, image files, directories of either and/or glob patterns '
+                             '(quote patterns with ** in them).')
+    parser.add_argument('-o', '--output', dest='output', type=str, default='detections.jsonl',
+                        help='Output path, .jsonl (one line per frame) or .parquet (one row per detection, '
+                             'needs pyarrow).')
+    parser.add_argument('-num-w', '--num-workers', dest='num_workers', type=int,
+                        default=os.cpu_count(), help='Number of worker processes.')
+    parser.add_argument('-b', '--batch-size', dest='batch_size', type=int,
+                        default=4, help='Number of frames each worker runs through the detector at once.')
+    parser.add_argument('-p', '--prefetch', dest='prefetch', type=int,
+                        default=64, help='Number of decoded frames to buffer ahead of the workers.')
+    parser.add_argument('-t', '--min-score', dest='min_score_thresh', type=float,
+                        default=.5, help='Minimum detection score to keep.')
+    args = parser.parse_args()
+
+    sources = expand_sources(args.sources)
+    if not sources:
+        parser.error('no video or image files match {}'.format(' '.join(args.sources)))
+    print('[INFO] {} source files'.format(len(sources)))
+
+    fps = FPS().start()
+    # decoding runs in a background thread so it overlaps with the main process shipping batches to the pool
+    frames = prefetch(read_frames(sources), maxsize=args.prefetch)
+    records = detect_all(batch_frames(frames, args.batch_size), num_workers=args.num_workers,
+                         min_score_thresh=args.min_score_thresh)
+    num_frames, num_detections = write_records(records, args.output)
+    fps.stop()
+
+    print('[INFO] wrote {} detections for {} frames to {}'.format(num_detections, num_frames, args.output))
+    print('[INFO] elapsed time (total): {:.2f}'.format(fps.elapsed()))
+    print('[INFO] approx. FPS: {:.2f}'.format(num_frames / fps.elapsed()))
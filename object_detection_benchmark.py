@@ -0,0 +1,144 @@
+""" Micro-benchmarks for the detection pipeline
+
+Examples:
+    $ python object_detection_benchmark.py batch --batch-sizes 1 2 4 8
+    $ python object_detection_benchmark.py transport --width 1920 --height 1080
+"""
+import argparse
+from multiprocessing import Process, Queue
+
+import numpy as np
+import tensorflow as tf
+
+from utils.app_utils import FPS
+from utils.model_utils import load_frozen_graph, run_inference
+from utils.shm_utils import SharedFrameRing
+from object_detection.constants import PATH_TO_CKPT
+
+
+def benchmark_batch_size(sess, detection_graph, batch_size, width=480, height=360, num_frames=120, warmup=2):
+    """ Measure detector throughput (frames/sec) when frames are run `batch_size` at a time
+
+    Args:
+        sess (tf.Session): session bound to `detection_graph`
+        detection_graph (tf.Graph): graph returned by `load_frozen_graph`
+        batch_size (int): number of frames per `sess.run` call
+        width (int): frame width in pixels
+        height (int): frame height in pixels
+        num_frames (int): approximate number of frames to time (rounded up to a whole number of batches)
+        warmup (int): number of untimed batches run first so graph initialization isn't counted
+
+    Returns:
+        float: frames per second
+    """
+    frames = np.random.randint(0, 256, size=(batch_size, height, width, 3), dtype=np.uint8)
+    for _ in range(warmup):
+        run_inference(frames, sess, detection_graph)
+
+    fps = FPS().start()
+    for _ in range(max(1, int(np.ceil(num_frames / batch_size)))):
+        run_inference(frames, sess, detection_graph)
+        for _ in range(batch_size):
+            fps.update()
+    fps.stop()
+    return fps.fps()
+
+
+def main_batch(args):
+    detection_graph = load_frozen_graph(PATH_TO_CKPT)
+    with tf.Session(graph=detection_graph) as sess:
+        print('{:>10} {:>10}'.format('batch_size', 'fps'))
+        for batch_size in args.batch_sizes:
+            fps = benchmark_batch_size(sess, detection_graph, batch_size,
+                                       width=args.width, height=args.height, num_frames=args.num_frames)
+            print('{:>10} {:>10.2f}'.format(batch_size, fps))
+
+
+def _echo(input_q, output_q):
+    # stand-in for a worker that does no work, so only the transport cost is measured
+    while True:
+        item = input_q.get()
+        if item is None:
+            return
+        output_q.put(item)
+
+
+def benchmark_transport(shared_memory, width=480, height=360, num_frames=200, queue_size=5):
+    """ Measure round trip frames/sec from the capture process to a worker process and back
+
+    Args:
+        shared_memory (bool): pass slot indices into a `SharedFrameRing` rather than pickled frames
+        width (int): frame width in pixels
+        height (int): frame height in pixels
+        num_frames (int): number of frames to send
+        queue_size (int): size of both queues (and number of slots)
+
+    Returns:
+        float: frames per second
+    """
+    frame = np.random.randint(0, 256, size=(height, width, 3), dtype=np.uint8)
+    input_q, output_q = Queue(maxsize=queue_size), Queue(maxsize=queue_size)
+    frame_ring = SharedFrameRing(num_slots=queue_size, height=height, width=width) if shared_memory else None
+    proc = Process(target=_echo, args=(input_q, output_q))
+    proc.start()
+
+    fps = FPS().start()
+    sent = 0
+    while fps._numFrames < num_frames:
+        if sent < num_frames and (frame_ring is None or frame_ring.num_free) and not input_q.full():
+            if frame_ring is None:
+                input_q.put(frame)
+            else:
+                slot = frame_ring.acquire()
+                frame_ring.write(slot, frame)
+                input_q.put((slot, {}))
+            sent += 1
+        elif not output_q.empty() or sent == num_frames:
+            item = output_q.get()
+            if frame_ring is not None:
+                frame_ring.release(item[0])
+            fps.update()
+    fps.stop()
+
+    input_q.put(None)
+    proc.join()
+    return fps.fps()
+
+
+def main_transport(args):
+    print('{:>16} {:>10}'.format('transport', 'fps'))
+    for name, shared_memory in [('pickled queue', False), ('shared memory', True)]:
+        fps = benchmark_transport(shared_memory, width=args.width, height=args.height,
+                                  num_frames=args.num_frames, queue_size=args.queue_size)
+        print('{:>16} {:>10.2f}'.format(name, fps))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    subparsers = parser.add_subparsers(dest='benchmark')
+    subparsers.required = True
+
+    batch_parser = subparsers.add_parser('batch', help='Detector frames/sec vs batch size.')
+    batch_parser.add_argument('-bs', '--batch-sizes', dest='batch_sizes', type=int, nargs='+',
+                              default=[1, 2, 4, 8], help='Batch sizes to compare.')
+    batch_parser.add_argument('-wd', '--width', dest='width', type=int,
+                              default=480, help='Width of the synthetic frames.')
+    batch_parser.add_argument('-ht', '--height', dest='height', type=int,
+                              default=360, help='Height of the synthetic frames.')
+    batch_parser.add_argument('-n', '--num-frames', dest='num_frames', type=int,
+                              default=120, help='Number of frames to time for each batch size.')
+    batch_parser.set_defaults(func=main_batch)
+
+    transport_parser = subparsers.add_parser('transport', help='Frame round trip frames/sec, pickled vs shared memory.')
+    transport_parser.add_argument('-wd', '--width', dest='width', type=int,
+                                  default=480, help='Width of the synthetic frames.')
+    transport_parser.add_argument('-ht', '--height', dest='height', type=int,
+                                  default=360, help='Height of the synthetic frames.')
+    transport_parser.add_argument('-n', '--num-frames', dest='num_frames', type=int,
+                                  default=200, help='Number of frames to send through the queues.')
+    transport_parser.add_argument('-q-size', '--queue-size', dest='queue_size', type=int,
+                                  default=5, help='Size of the queues.')
+    transport_parser.set_defaults(func=main_transport)
+
+    args = parser.parse_args()
+    args.func(args)
@@ -0,0 +1,158 @@
+""" Evaluate detections against ground truth across all cores
+
+Both directories hold JSON lines files in the format written by `object_detection_batch.py` (one record per frame with
+'source', 'frame', 'boxes', 'classes' and, for detections, 'scores'; ground truth records may also have a boolean
+'difficult' list). Files are matched by their path relative to each directory, and every pair of files is evaluated
+in its own worker process. The per-file results are then merged. Frames (and whole files) with ground truth but no
+detections count as misses, detections without ground truth as false positives.
+
+Examples:
+    $ python object_detection_evaluate.py detections/ groundtruth/
+    $ python object_detection_evaluate.py detections/ groundtruth/ --iou 0.75 -o metrics.json
+"""
+import os
+import json
+import argparse
+import functools
+from multiprocessing import Pool
+
+import numpy as np
+
+from utils.app_utils import FPS
+from object_detection.constants import CATEGORY_INDEX
+from object_detection.utils import object_detection_evaluation
+
+# class ids in the records start at 1, the evaluation's at 0
+LABEL_ID_OFFSET = 1
+
+
+def find_file_pairs(detections_dir, groundtruth_dir, extension='.jsonl'):
+    """ Pair up the files of the two directories by their relative path
+
+    Returns:
+        list: (detections path or None, ground truth path or None) tuples, sorted by relative path. Detections
+            without ground truth are all counted as false positives, ground truth without detections as misses.
+    """
+    pairs = {}
+    for i, directory in enumerate((detections_dir, groundtruth_dir)):
+        for root, _, files in os.walk(directory):
+            for name in files:
+                if name.endswith(extension):
+                    path = os.path.join(root, name)
+                    pairs.setdefault(os.path.relpath(path, directory), [None, None])[i] = path
+    return [tuple(pairs[relpath]) for relpath in sorted(pairs)]
+
+
+def read_records(path):
+    with open(path) as fin:
+        for line in fin:
+            if line.strip():
+                yield json.loads(line)
+
+
+def _boxes(record):
+    return np.array(record['boxes'], dtype=float).reshape(-1, 4)
+
+
+def _evaluate_files(pair, num_classes, iou_thres=.5, num_score_bins=None):
+    detections_path, groundtruth_path = pair
+    if num_score_bins:
+        evaluator = object_detection_evaluation.StreamingObjectDetectionEvaluation(
+            num_classes, matching_iou_threshold=iou_thres, num_score_bins=num_score_bins)
+    else:
+        evaluator = object_detection_evaluation.ObjectDetectionEvaluation(num_classes, matching_iou_threshold=iou_thres)
+
+    groundtruth_keys = []
+    if groundtruth_path is not None:
+        for record in read_records(groundtruth_path):
+            difficult = record.get('difficult')
+            groundtruth_keys.append((record['source'], record['frame']))
+            evaluator.add_single_ground_truth_image_info(
+                groundtruth_keys[-1], _boxes(record), np.array(record['classes'], dtype=int) - LABEL_ID_OFFSET,
+                None if difficult is None else np.array(difficult, dtype=bool))
+    detected_keys = set()
+    if detections_path is not None:
+        for record in read_records(detections_path):
+            detected_keys.add((record['source'], record['frame']))
+            evaluator.add_single_detected_image_info(
+                (record['source'], record['frame']), _boxes(record), np.array(record['scores'], dtype=float),
+                np.array(record['classes'], dtype=int) - LABEL_ID_OFFSET)
+    # nothing was detected in the frames missing from the detections, so all their objects are misses
+    for key in groundtruth_keys:
+        if key not in detected_keys:
+            evaluator.add_single_detected_image_info(key, np.zeros((0, 4)), np.zeros(0), np.zeros(0, dtype=int))
+    return evaluator
+
+
+def evaluate_dir(detections_dir, groundtruth_dir, num_classes=None, iou_thres=.5, num_score_bins=None,
+                 num_workers=None):
+    """ Evaluate every detections file against its ground truth file in a process pool and merge the results
+
+    Args:
+        detections_dir (str): directory of detections .jsonl files
+        groundtruth_dir (str): directory of ground truth .jsonl files with the same relative paths
+        num_classes (int): number of classes, by default the largest class id in `CATEGORY_INDEX`
+        iou_thres (float): IoU at which a detection matches a ground truth box
+        num_score_bins (int): evaluate in constant memory with this many score bins per class instead of exactly
+        num_workers (int): number of worker processes, by default one per core
+
+    Returns:
+        ObjectDetectionEvaluation or StreamingObjectDetectionEvaluation: merged evaluation of all the files, or None
+            if there are no .jsonl files in either directory
+    """
+    num_classes = num_classes or max(CATEGORY_INDEX)
+    pairs = find_file_pairs(detections_dir, groundtruth_dir)
+    if not pairs:
+        return None
+    evaluate_files = functools.partial(_evaluate_files, num_classes=num_classes, iou_thres=iou_thres,
+                                       num_score_bins=num_score_bins)
+    pool = Pool(min(num_workers or os.cpu_count(), len(pairs)))
+    try:
+        # merging is associative so the shards can be merged in whatever order they finish
+        return functools.reduce(lambda a, b: a.merge(b), pool.imap_unordered(evaluate_files, pairs))
+    finally:
+        pool.terminate()
+
+
+def summarize(evaluator, iou_thres=.5):
+    """ Metric names to values, named like `eval_util.evaluate_detection_results_pascal_voc` names them """
+    per_class_ap, mean_ap, _, _, per_class_corloc, mean_corloc = evaluator.evaluate()
+    metrics = {'Precision/mAP@{}IOU'.format(iou_thres): float(mean_ap),
+               'CorLoc/CorLoc@{}IOU'.format(iou_thres): float(mean_corloc)}
+    for idx, average_precision in enumerate(per_class_ap):
+        category = CATEGORY_INDEX.get(idx + LABEL_ID_OFFSET)
+        if category is not None and not np.isnan(average_precision):
+            metrics['PerformanceByCategory/mAP@{}IOU/{}'.format(iou_thres, category['name'])] = float(
+                average_precision)
+    return metrics
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('detections_dir', help='Directory of detections .jsonl files.')
+    parser.add_argument('groundtruth_dir', help='Directory of ground truth .jsonl files with the same relative paths.')
+    parser.add_argument('-iou', '--iou', dest='iou_thres', type=float,
+                        default=.5, help='IoU at which a detection matches a ground truth box.')
+    parser.add_argument('-bins', '--num-score-bins', dest='num_score_bins', type=int,
+                        default=0, help='Evaluate in constant memory with this many score bins per class, which '
+                                        'approximates the mAP (0 for the exact evaluation).')
+    parser.add_argument('-num-w', '--num-workers', dest='num_workers', type=int,
+                        default=os.cpu_count(), help='Number of worker processes.')
+    parser.add_argument('-o', '--output', dest='output', type=str,
+                        default=None, help='Also write the metrics to this JSON file.')
+    args = parser.parse_args()
+
+    fps = FPS().start()
+    evaluator = evaluate_dir(args.detections_dir, args.groundtruth_dir, iou_thres=args.iou_thres,
+                             num_score_bins=args.num_score_bins, num_workers=args.num_workers)
+    if evaluator is None:
+        parser.error('no .jsonl files in {} or {}'.format(args.detections_dir, args.groundtruth_dir))
+    metrics = summarize(evaluator, iou_thres=args.iou_thres)
+    fps.stop()
+
+    for name in sorted(metrics):
+        print('{:<60} {:.4f}'.format(name, metrics[name]))
+    print('[INFO] elapsed time (total): {:.2f}'.format(fps.elapsed()))
+    if args.output:
+        with open(args.output, 'w') as fout:
+            json.dump(metrics, fout, indent=2, sort_keys=True)
@@ -8,6 +8,7 @@ import tensorflow as tf
 from queue import Queue
 from threading import Thread
 from utils.app_utils import FPS, WebcamVideoStream, draw_boxes_and_labels
+from utils.model_utils import load_frozen_graph
 from object_detection.utils import label_map_util
 
 CWD_PATH = os.getcwd()
@@ -59,16 +60,8 @@ def detect_objects(image_np, sess, detection_graph):
 
 
 def worker(input_q, output_q):
-    # Load a (frozen) Tensorflow model into memory.
-    detection_graph = tf.Graph()
-    with detection_graph.as_default():
-        od_graph_def = tf.GraphDef()
-        with tf.gfile.GFile(PATH_TO_CKPT, 'rb') as fid:
-            serialized_graph = fid.read()
-            od_graph_def.ParseFromString(serialized_graph)
-            tf.import_graph_def(od_graph_def, name='')
-
-        sess = tf.Session(graph=detection_graph)
+    detection_graph = load_frozen_graph(PATH_TO_CKPT)
+    sess = tf.Session(graph=detection_graph)
 
     fps = FPS().start()
     while True:
@@ -89,6 +82,8 @@ if __name__ == '__main__':
                         default=480, help='Width of the frames in the video stream.')
     parser.add_argument('-ht', '--height', dest='height', type=int,
                         default=360, help='Height of the frames in the video stream.')
+    parser.add_argument('-rt', '--read-timeout', dest='read_timeout', type=float,
+                        default=1., help='Seconds to wait for a frame before giving up on the video source.')
     args = parser.parse_args()
 
     input_q = Queue(5)  # fps is better if queue is higher but then more lags
@@ -104,7 +99,15 @@ if __name__ == '__main__':
     fps = FPS().start()
 
     while True:
-        frame = video_capture.read()
+        # don't block forever on a source that died: give up once it is closed or stopped returning frames
+        frame = video_capture.read(timeout=args.read_timeout)
+        if frame is None:
+            if not video_capture.stream.isOpened() or not video_capture.grabbed:
+                print('[INFO] no frame from the video source in {:.2f} s, stopping'.format(args.read_timeout))
+                break
+            if cv2.waitKey(1) & 0xFF == ord('q'):
+                break
+            continue
         input_q.put(frame)
 
         t = time.time()
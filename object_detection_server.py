@@ -0,0 +1,205 @@
+""" Serve the detector to many local clients from one process, batching concurrent requests
+
+Every camera producer on a host POSTs its frames here instead of running its own pool of workers that each hold the
+model. Requests that arrive within `--max-batch-wait-ms` of each other are run through the frozen graph in one
+`sess.run` call.
+
+Frames are POSTed to /detect either encoded (Content-Type image/jpeg or image/png) or raw (Content-Type
+application/octet-stream, RGB uint8 with the size in the query string, e.g. /detect?width=480&height=360). The
+response is a JSON object with the frame 'height' and 'width' and the 'boxes' ((ymin, xmin, ymax, xmax) normalized to
+[0, 1]), 'scores', 'classes' and 'names' of the detections. GET /stats returns the request and batch counters.
+
+Examples:
+    $ python object_detection_server.py --port 8000 --batch-size 8
+    $ curl --data-binary @frame.jpg -H 'Content-Type: image/jpeg' localhost:8000/detect
+    $ python object_detection_server.py --unix-socket /tmp/detector.sock
+"""
+import os
+import json
+import argparse
+import socketserver
+from urllib.parse import urlparse, parse_qs
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+import cv2
+import numpy as np
+import tensorflow as tf
+
+from utils.app_utils import FPS, MicroBatcher
+from utils.model_utils import load_frozen_graph, run_inference
+from object_detection.constants import CATEGORY_INDEX, PATH_TO_CKPT
+
+
+class Detector:
+    """ The frozen graph and its session, run on batches of frames from the `MicroBatcher` thread only """
+
+    def __init__(self, path_to_ckpt=PATH_TO_CKPT, min_score_thresh=.5):
+        self.detection_graph = load_frozen_graph(path_to_ckpt)
+        self.sess = tf.Session(graph=self.detection_graph)
+        self.min_score_thresh = min_score_thresh
+
+    def detect_batch(self, frames):
+        """ Run the detector on RGB frames of any sizes, one `sess.run` per distinct frame shape
+
+        Returns:
+            list: one detections dict per frame, in the same order as `frames`
+        """
+        indices_by_shape = {}
+        for i, frame in enumerate(frames):
+            indices_by_shape.setdefault(frame.shape, []).append(i)
+
+        results = [None] * len(frames)
+        for (height, width, _), indices in indices_by_shape.items():
+            (boxes, scores, classes, _) = run_inference([frames[i] for i in indices], self.sess,
+                                                        self.detection_graph)
+            for j, i in enumerate(indices):
+                keep = scores[j] > self.min_score_thresh
+                results[i] = {
+                    'height': height,
+                    'width': width,
+                    'boxes': boxes[j][keep].tolist(),
+                    'scores': scores[j][keep].tolist(),
+                    'classes': classes[j][keep].tolist(),
+                    'names': [CATEGORY_INDEX.get(c, {'name': 'unknown object'})['name'] for c in classes[j][keep]],
+                }
+        return results
+
+    def close(self):
+        self.sess.close()
+
+
+def decode_frame(body, content_type, query=None):
+    """ Decode a request body into an RGB frame
+
+    Args:
+        body (bytes): JPEG or PNG encoded frame, or the raw RGB uint8 pixels
+        content_type (str): 'image/jpeg', 'image/png' or 'application/octet-stream' for raw pixels
+        query (dict): parsed query string, with 'width' and 'height' for raw pixels
+
+    Returns:
+        np.array: (H, W, 3) uint8 RGB frame
+
+    Raises:
+        ValueError: if the body can't be decoded
+    """
+    if content_type == 'application/octet-stream':
+        query = query or {}
+        try:
+            height, width = int(query['height'][0]), int(query['width'][0])
+        except (KeyError, ValueError):
+            raise ValueError('raw frames need integer width and height query parameters')
+        if len(body) != height * width * 3:
+            raise ValueError('expected {} bytes for a {}x{} RGB frame, got {}'.format(
+                height * width * 3, width, height, len(body)))
+        return np.frombuffer(body, dtype=np.uint8).reshape(height, width, 3)
+
+    frame = cv2.imdecode(np.frombuffer(body, dtype=np.uint8), cv2.IMREAD_COLOR)
+    if frame is None:
+        raise ValueError('could not decode the {} frame'.format(content_type))
+    return cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+
+
+class DetectionRequestHandler(BaseHTTPRequestHandler):
+    # set on the server class by `make_server`
+    batcher = None
+
+    def _send_json(self, status, payload):
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if urlparse(self.path).path != '/stats':
+            self._send_json(404, {'error': 'not found'})
+            return
+        self._send_json(200, {'frames': self.batcher.num_items, 'batches': self.batcher.num_batches,
+                              'mean_batch_size': self.batcher.mean_batch_size()})
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        if url.path != '/detect':
+            self._send_json(404, {'error': 'not found'})
+            return
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        content_type = self.headers.get('Content-Type', 'image/jpeg').split(';')[0].strip()
+        try:
+            frame = decode_frame(body, content_type, parse_qs(url.query))
+        except ValueError as e:
+            self._send_json(400, {'error': str(e)})
+            return
+        try:
+            detections = self.batcher.submit(frame)
+        except Exception as e:  # re-raised from the detector thread, e.g. a TF error on this batch
+            self._send_json(500, {'error': '{}: {}'.format(type(e).__name__, e)})
+            return
+        self._send_json(200, detections)
+
+    def address_string(self):
+        # Unix socket clients have no (host, port) address
+        return self.client_address[0] if self.client_address else 'unix'
+
+    def log_message(self, format, *args):
+        pass
+
+
+class ThreadingHTTPServer(socketserver.ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+class ThreadingUnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+def make_server(batcher, host='127.0.0.1', port=8000, unix_socket=None):
+    """ An HTTP server, on TCP or on a Unix socket, that answers every request on its own thread via `batcher`
+
+    Returns:
+        socketserver.BaseServer: call its `serve_forever` to start serving
+    """
+    handler = type('Handler', (DetectionRequestHandler,), {'batcher': batcher})
+    if unix_socket:
+        if os.path.exists(unix_socket):
+            os.remove(unix_socket)
+        return ThreadingUnixHTTPServer(unix_socket, handler)
+    return ThreadingHTTPServer((host, port), handler)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-host', '--host', dest='host', type=str,
+                        default='127.0.0.1', help='Address to listen on.')
+    parser.add_argument('-p', '--port', dest='port', type=int,
+                        default=8000, help='Port to listen on.')
+    parser.add_argument('-sock', '--unix-socket', dest='unix_socket', type=str,
+                        default=None, help='Listen on this Unix socket instead of a TCP port.')
+    parser.add_argument('-b', '--batch-size', dest='batch_size', type=int,
+                        default=8, help='Maximum number of frames run through the detector at once.')
+    parser.add_argument('-bw', '--max-batch-wait-ms', dest='max_batch_wait_ms', type=float,
+                        default=5, help='Milliseconds to wait for a batch to fill before running it.')
+    parser.add_argument('-t', '--min-score', dest='min_score_thresh', type=float,
+                        default=.5, help='Minimum detection score to return.')
+    args = parser.parse_args()
+
+    detector = Detector(min_score_thresh=args.min_score_thresh)
+    batcher = MicroBatcher(detector.detect_batch, batch_size=args.batch_size,
+                           max_wait=args.max_batch_wait_ms / 1000.).start()
+    server = make_server(batcher, host=args.host, port=args.port, unix_socket=args.unix_socket)
+    print('[INFO] serving on {}'.format(args.unix_socket or '{}:{}'.format(args.host, args.port)))
+
+    fps = FPS().start()
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        batcher.stop()
+        detector.close()
+        fps.stop()
+
+    print('[INFO] elapsed time (total): {:.2f}'.format(fps.elapsed()))
+    print('[INFO] frames: {}, batches: {}, mean batch size: {:.2f}'.format(
+        batcher.num_items, batcher.num_batches, batcher.mean_batch_size()))
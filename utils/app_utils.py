@@ -2,9 +2,14 @@
 
 import struct
 import six
+import time
+import queue
+import heapq
 import collections
+import concurrent.futures
 import cv2
 import datetime
+import threading
 from threading import Thread
 from matplotlib import colors
 
@@ -42,6 +47,16 @@ class FPS:
 
 
 class WebcamVideoStream:
+    """ Reads frames from a camera or stream in a background thread
+
+    Consumers block (with an optional timeout) until the capture thread publishes a frame they haven't seen yet,
+    rather than polling. Every frame is a new array that the capture thread never writes to again, so a frame
+    returned by `read` stays valid while the next one is being captured.
+    """
+
+    # seconds to back off after a failed read, so a dead stream doesn't spin a core
+    retry_delay = .01
+
     def __init__(self, src, width, height):
         # initialize the video camera stream and read the first frame
         # from the stream
@@ -49,6 +64,10 @@ class WebcamVideoStream:
         self.stream.set(cv2.CAP_PROP_FRAME_WIDTH, width)
         self.stream.set(cv2.CAP_PROP_FRAME_HEIGHT, height)
         (self.grabbed, self.frame) = self.stream.read()
+        # sequence number of the frame most recently read, incremented for every new frame the camera returns
+        self.frame_id = 1 if self.grabbed else 0
+        self._last_read_id = 0
+        self._new_frame = threading.Condition()
 
         # initialize the variable used to indicate if the thread should
         # be stopped
@@ -64,20 +83,302 @@ class WebcamVideoStream:
         while True:
             # if the thread indicator variable is set, stop the thread
             if self.stopped:
+                with self._new_frame:
+                    self._new_frame.notify_all()
                 return
 
-            # otherwise, read the next frame from the stream
-            (self.grabbed, self.frame) = self.stream.read()
+            # otherwise, read the next frame from the stream (blocks until the camera has one)
+            (grabbed, frame) = self.stream.read()
+            if not grabbed:
+                self.grabbed = False
+                time.sleep(self.retry_delay)
+                continue
+
+            # publish the new frame and wake up anyone waiting in read()
+            with self._new_frame:
+                (self.grabbed, self.frame) = (grabbed, frame)
+                self.frame_id += 1
+                self._new_frame.notify_all()
+
+    def read(self, timeout=None):
+        """ Wait for a frame newer than the one returned by the previous read
+
+        Args:
+            timeout (float): maximum seconds to wait, or None to wait until a new frame arrives (or the stream stops)
+
+        Returns:
+            np.array: the newest frame, or None if no new frame arrived within `timeout`
+        """
+        with self._new_frame:
+            last_id = self._last_read_id
+            frame_id, frame = self.read_latest(timeout=timeout)
+            return frame if frame_id > last_id else None
 
-    def read(self):
-        # return the frame most recently read
-        return self.frame
+    def read_latest(self, timeout=None, last_id=None):
+        """ Wait for a frame newer than `last_id` and return it along with its sequence number
+
+        Args:
+            timeout (float): maximum seconds to wait, or None to wait until a new frame arrives (or the stream stops)
+            last_id (int): sequence number of the last frame the caller has seen (defaults to the last one returned)
+
+        Returns:
+            tuple: (frame_id, frame) for the newest frame. frame_id is not newer than `last_id` on timeout.
+        """
+        with self._new_frame:
+            last_id = self._last_read_id if last_id is None else last_id
+            self._new_frame.wait_for(lambda: self.frame_id > last_id or self.stopped, timeout=timeout)
+            self._last_read_id = self.frame_id
+            return self.frame_id, self.frame
 
     def stop(self):
         # indicate that the thread should be stopped
         self.stopped = True
 
 
+class CaptureStats:
+    """ Counters for the capture stage, to tune `--queue-size` against
+
+    >>> stats = CaptureStats()
+    >>> stats.captured, stats.dropped = 10, 3
+    >>> str(stats)
+    'captured: 10, submitted: 0, dropped: 3, duplicated: 0, static: 0, queue depth: 0 (max 0)'
+    """
+
+    def __init__(self):
+        self.captured = 0  # new frames returned by the camera
+        self.submitted = 0  # frames handed to the workers
+        self.dropped = 0  # new frames never shown: overwritten before they were read, no free slot, or stale
+        self.duplicated = 0  # reads that returned a frame that had already been submitted
+        self.static = 0  # frames shown with the previous detections because nothing moved
+        self.queue_depth = 0  # frames submitted but not shown yet
+        self.max_queue_depth = 0
+
+    def update_queue_depth(self, queue_depth):
+        self.queue_depth = queue_depth
+        self.max_queue_depth = max(self.max_queue_depth, queue_depth)
+
+    def __str__(self):
+        return 'captured: {}, submitted: {}, dropped: {}, duplicated: {}, static: {}, queue depth: {} (max {})'.format(
+            self.captured, self.submitted, self.dropped, self.duplicated, self.static, self.queue_depth,
+            self.max_queue_depth)
+
+
+class ReorderBuffer:
+    """ Puts worker outputs that complete out of order back into capture (sequence number) order
+
+    Outputs are held until every earlier sequence number has been emitted. If the missing frame still hasn't arrived
+    `max_wait` seconds after the output following it did, it is skipped so a slow or lost frame can't stall the
+    stream. Outputs that arrive after a later frame has already been emitted are dropped (`push` returns False).
+
+    >>> buf = ReorderBuffer(max_wait=10)
+    >>> buf.push(1, 'b', now=0.)
+    True
+    >>> buf.pop_ready(now=0.)
+    []
+    >>> buf.push(0, 'a', now=0.)
+    True
+    >>> buf.pop_ready(now=0.)
+    [(0, 'a'), (1, 'b')]
+    >>> buf.push(3, 'd', now=1.)
+    True
+    >>> buf.pop_ready(now=11.)
+    [(3, 'd')]
+    >>> buf.push(2, 'c', now=12.)
+    False
+    >>> buf.skipped, buf.dropped
+    (1, 1)
+    """
+
+    def __init__(self, max_wait=.5, start=0):
+        self.max_wait = max_wait
+        self.next_seq = start
+        self.skipped = 0  # sequence numbers given up on after waiting max_wait
+        self.dropped = 0  # outputs that arrived too late to be emitted in order
+        self._heap = []  # (seq, arrival time, item)
+
+    def __len__(self):
+        return len(self._heap)
+
+    def push(self, seq, item, now=None):
+        """ Hold `item` until it can be emitted in order
+
+        Returns:
+            bool: False if `item` arrived too late and was dropped, so the caller can free whatever it holds
+        """
+        if seq < self.next_seq:
+            self.dropped += 1
+            return False
+        heapq.heappush(self._heap, (seq, time.time() if now is None else now, item))
+        return True
+
+    def pop_ready(self, now=None):
+        """ Remove and return the held outputs that can now be emitted
+
+        Returns:
+            list: (seq, item) pairs in increasing sequence order
+        """
+        now = time.time() if now is None else now
+        ready = []
+        while self._heap:
+            seq, arrived, item = self._heap[0]
+            if seq != self.next_seq:
+                if now - arrived < self.max_wait:
+                    break
+                # waited long enough for the missing frame(s), give up on them
+                self.skipped += seq - self.next_seq
+                self.next_seq = seq
+            heapq.heappop(self._heap)
+            ready.append((seq, item))
+            self.next_seq += 1
+        return ready
+
+
+def prefetch(iterable, maxsize=64):
+    """ Iterate over `iterable` in a background thread, buffering up to `maxsize` items ahead of the consumer
+
+    Useful for overlapping slow I/O (like video decoding) with whatever is consuming it.
+    Exceptions raised by `iterable` are re-raised in the consumer.
+
+    >>> list(prefetch(range(5), maxsize=2))
+    [0, 1, 2, 3, 4]
+    """
+    q = queue.Queue(maxsize=maxsize)
+    done = object()
+    error = []
+
+    def fill():
+        try:
+            for item in iterable:
+                q.put(item)
+        except Exception as e:
+            error.append(e)
+        finally:
+            q.put(done)
+
+    thread = Thread(target=fill, args=())
+    thread.daemon = True
+    thread.start()
+    while True:
+        item = q.get()
+        if item is done:
+            break
+        yield item
+    if error:
+        raise error[0]
+
+
+def get_batch(q, batch_size=1, max_wait=0.):
+    """ Block until one item is available on `q`, then drain up to `batch_size` items in total
+
+    Waits at most `max_wait` seconds (after the first item arrives) for the batch to fill up,
+    so a partially filled batch is returned rather than stalling the pipeline.
+
+    Args:
+        q (Queue): a `queue.Queue` or `multiprocessing.Queue`
+        batch_size (int): maximum number of items to return
+        max_wait (float): seconds to wait for more items once the first one has been received
+
+    Returns:
+        list: between 1 and `batch_size` items, in the order they were taken off the queue
+
+    >>> q = queue.Queue()
+    >>> for i in range(5):
+    ...     q.put(i)
+    >>> get_batch(q, batch_size=3)
+    [0, 1, 2]
+    >>> get_batch(q, batch_size=3, max_wait=.01)
+    [3, 4]
+    """
+    items = [q.get()]
+    deadline = time.time() + max_wait
+    while len(items) < batch_size:
+        remaining = deadline - time.time()
+        try:
+            if remaining > 0:
+                items.append(q.get(timeout=remaining))
+            else:
+                items.append(q.get_nowait())
+        except queue.Empty:
+            break
+    return items
+
+
+class MicroBatcher:
+    """ Coalesces items submitted concurrently by many threads into batches for a single consumer
+
+    A background thread takes the first pending item, waits at most `max_wait` seconds for up to `batch_size` items
+    in total (see `get_batch`) and passes them to `process_batch` in one call, so concurrent clients share one run of
+    the model instead of queueing behind each other's.
+
+    >>> batcher = MicroBatcher(lambda items: [2 * x for x in items], batch_size=4).start()
+    >>> batcher.submit(21)
+    42
+    >>> batcher.stop()
+    """
+    _stop = object()
+
+    def __init__(self, process_batch, batch_size=8, max_wait=.005):
+        """
+        Args:
+            process_batch (callable): takes a list of items and returns a list of as many results, in the same order
+            batch_size (int): maximum number of items per call to `process_batch`
+            max_wait (float): seconds to wait for more items once the first one of a batch has been received
+        """
+        self.process_batch = process_batch
+        self.batch_size = batch_size
+        self.max_wait = max_wait
+        self.num_items = 0
+        self.num_batches = 0
+        self._q = queue.Queue()
+        self._thread = None
+
+    def start(self):
+        self._thread = Thread(target=self._run, args=())
+        self._thread.daemon = True
+        self._thread.start()
+        return self
+
+    def _run(self):
+        while True:
+            batch = get_batch(self._q, batch_size=self.batch_size, max_wait=self.max_wait)
+            stopping = any(item is self._stop for item in batch)
+            batch = [item for item in batch if item is not self._stop]
+            if batch:
+                self._process([item for item, _ in batch], [future for _, future in batch])
+            if stopping:
+                return
+
+    def _process(self, items, futures):
+        try:
+            results = self.process_batch(items)
+        except Exception as e:
+            for future in futures:
+                future.set_exception(e)
+            return
+        self.num_items += len(items)
+        self.num_batches += 1
+        for future, result in zip(futures, results):
+            future.set_result(result)
+
+    def submit(self, item, timeout=None):
+        """ Block until `item` has been processed as part of a batch
+
+        Returns:
+            the result `process_batch` returned for `item`. Exceptions raised by `process_batch` are re-raised.
+        """
+        future = concurrent.futures.Future()
+        self._q.put((item, future))
+        return future.result(timeout=timeout)
+
+    def mean_batch_size(self):
+        return self.num_items / max(self.num_batches, 1)
+
+    def stop(self):
+        """ Process the items already submitted, then stop the background thread """
+        self._q.put(self._stop)
+        self._thread.join()
+
+
 def standard_colors():
     colors = [
         'AliceBlue', 'Chartreuse', 'Aqua', 'Aquamarine', 'Azure', 'Beige', 'Bisque',
@@ -0,0 +1,197 @@
+""" Loading the frozen detection graph and running it on one or more frames """
+import os
+
+import cv2
+import numpy as np
+import tensorflow as tf
+
+from object_detection.utils import np_box_list, np_box_list_ops
+
+
+# parsed GraphDefs keyed by (absolute path, modification time), see `load_graph_def`
+_graph_defs = {}
+
+
+def load_graph_def(path_to_ckpt):
+    """ Read and parse a frozen GraphDef at most once per process
+
+    Call this in the parent process before the worker pool is started. Forked workers then inherit the parsed
+    protobuf copy-on-write (its tensor data lives in C++ memory that Python never touches, so the pages stay
+    shared) and `load_frozen_graph` only has to import it, instead of every worker re-reading and re-parsing
+    the file.
+
+    Args:
+        path_to_ckpt (str): path to a frozen_inference_graph.pb file
+
+    Returns:
+        tf.GraphDef: the parsed graph. Shared, so don't modify it.
+    """
+    path_to_ckpt = os.path.abspath(path_to_ckpt)
+    key = (path_to_ckpt, os.path.getmtime(path_to_ckpt))
+    od_graph_def = _graph_defs.get(key)
+    if od_graph_def is None:
+        od_graph_def = tf.GraphDef()
+        with tf.gfile.GFile(path_to_ckpt, 'rb') as fid:
+            serialized_graph = fid.read()
+            od_graph_def.ParseFromString(serialized_graph)
+        _graph_defs[key] = od_graph_def
+    return od_graph_def
+
+
+def load_frozen_graph(path_to_ckpt):
+    """ Load a (frozen) Tensorflow model into memory
+
+    Args:
+        path_to_ckpt (str): path to a frozen_inference_graph.pb file
+
+    Returns:
+        tf.Graph: graph with the detection ops imported under the root name scope
+    """
+    od_graph_def = load_graph_def(path_to_ckpt)
+    detection_graph = tf.Graph()
+    with detection_graph.as_default():
+        tf.import_graph_def(od_graph_def, name='')
+    return detection_graph
+
+
+def run_inference(images_np, sess, detection_graph):
+    """ Run the detector once on a batch of RGB frames
+
+    All the frames are fed through a single `sess.run` call so the per-call overhead is paid once per batch.
+
+    Args:
+        images_np (np.array or list of np.array): uint8 array of shape (N, H, W, 3), or a list of N (H, W, 3) frames
+            that all have the same shape
+        sess (tf.Session): session bound to `detection_graph`
+        detection_graph (tf.Graph): graph returned by `load_frozen_graph`
+
+    Returns:
+        tuple: (boxes, scores, classes, num_detections) with a leading batch dimension of N, in the same order as
+            `images_np`. boxes are (ymin, xmin, ymax, xmax) normalized to [0, 1] and classes are int32.
+    """
+    if isinstance(images_np, (list, tuple)):
+        images_np = np.stack(images_np)
+    image_tensor = detection_graph.get_tensor_by_name('image_tensor:0')
+
+    # Each box represents a part of the image where a particular object was detected.
+    boxes = detection_graph.get_tensor_by_name('detection_boxes:0')
+
+    # Each score represent how level of confidence for each of the objects.
+    # Score is shown on the result image, together with the class label.
+    scores = detection_graph.get_tensor_by_name('detection_scores:0')
+    classes = detection_graph.get_tensor_by_name('detection_classes:0')
+    num_detections = detection_graph.get_tensor_by_name('num_detections:0')
+
+    # Actual detection.
+    (boxes, scores, classes, num_detections) = sess.run(
+        [boxes, scores, classes, num_detections],
+        feed_dict={image_tensor: images_np})
+    return boxes, scores, classes.astype(np.int32), num_detections
+
+
+def tile_windows(height, width, grid=(2, 2), overlap=.2):
+    """ Equally sized, overlapping tiles covering a frame, so they can all be fed through the graph as one batch
+
+    Args:
+        height (int): frame height in pixels
+        width (int): frame width in pixels
+        grid (tuple): (rows, columns) of tiles
+        overlap (float): fraction of a tile's height (width) shared with the tile below (beside) it
+
+    Returns:
+        np.array: (rows * columns, 4) int (ymin, xmin, ymax, xmax) pixel windows, row by row
+
+    >>> tile_windows(100, 200, grid=(1, 2), overlap=.2).tolist()
+    [[0, 0, 100, 112], [0, 88, 100, 200]]
+    """
+    rows, columns = grid
+    tile_height = int(np.ceil(height / (rows - (rows - 1) * overlap)))
+    tile_width = int(np.ceil(width / (columns - (columns - 1) * overlap)))
+    ymins = np.linspace(0, height - tile_height, rows).round().astype(int)
+    xmins = np.linspace(0, width - tile_width, columns).round().astype(int)
+    ymins, xmins = [a.ravel() for a in np.meshgrid(ymins, xmins, indexing='ij')]
+    return np.stack([ymins, xmins, ymins + tile_height, xmins + tile_width], axis=1)
+
+
+def merge_tile_detections(windows, height, width, boxes, scores, classes, num_detections, iou_thres=.5,
+                          min_score_thresh=.05, max_detections=100):
+    """ Map the detections of each tile back to frame coordinates and suppress the duplicates of overlapping tiles
+
+    Args:
+        windows (np.array): (T, 4) (ymin, xmin, ymax, xmax) pixel windows the tiles were cropped from, a window of the
+            whole frame for a downscaled copy of it
+        height (int): frame height in pixels
+        width (int): frame width in pixels
+        boxes, scores, classes, num_detections: outputs of `run_inference` on the T tiles
+        iou_thres (float): boxes of the same class overlapping a higher scoring one by more than this are dropped
+        min_score_thresh (float): boxes scoring at or below this are dropped before the suppression
+        max_detections (int): number of detections returned, padded with zero scores like the graph's own outputs
+
+    Returns:
+        tuple: (boxes, scores, classes, num_detections) of the frame, without a batch dimension
+    """
+    windows = np.asarray(windows, dtype=np.float32) / np.array([height, width, height, width], dtype=np.float32)
+    valid = np.arange(boxes.shape[1])[np.newaxis, :] < np.asarray(num_detections)[:, np.newaxis]
+    valid &= scores > min_score_thresh
+    tile_indices = np.nonzero(valid)[0]
+    window_sizes = windows[:, 2:] - windows[:, :2]
+    origins = np.tile(windows[tile_indices, :2], 2)
+    frame_boxes = origins + boxes[valid] * np.tile(window_sizes[tile_indices], 2)
+
+    boxlist = np_box_list.BoxList(np.clip(frame_boxes, 0., 1.).astype(np.float32))
+    boxlist.add_field('scores', scores[valid].astype(np.float32))
+    boxlist.add_field('classes', classes[valid].astype(np.int32))
+    boxlist = np_box_list_ops.batched_non_max_suppression(boxlist, max_output_size=max_detections,
+                                                          iou_threshold=iou_thres)
+
+    num_merged = boxlist.num_boxes()
+    merged_boxes = np.zeros((max_detections, 4), dtype=np.float32)
+    merged_scores = np.zeros(max_detections, dtype=np.float32)
+    merged_classes = np.zeros(max_detections, dtype=np.int32)
+    merged_boxes[:num_merged] = boxlist.get()
+    merged_scores[:num_merged] = boxlist.get_field('scores')
+    merged_classes[:num_merged] = boxlist.get_field('classes')
+    return merged_boxes, merged_scores, merged_classes, np.float32(num_merged)
+
+
+def run_tiled_inference(images_np, sess, detection_graph, grid=(2, 2), overlap=.2, include_full_frame=True,
+                        iou_thres=.5, min_score_thresh=.05, max_detections=100):
+    """ Run the detector on overlapping tiles of frames, so small objects aren't lost when the graph downsamples them
+
+    The graph resizes whatever it's fed to its own input size, so a tile of a high resolution frame keeps the detail
+    that the whole frame loses. The tiles of all the frames go through a single `sess.run` call, then their boxes are
+    mapped back to frame coordinates and the duplicates in the overlaps merged with `np_box_list_ops` NMS. The cost
+    grows with the number of tiles, trading compute for recall.
+
+    Args:
+        images_np (np.array or list of np.array): N same-sized RGB frames, as for `run_inference`
+        grid (tuple): (rows, columns) of tiles per frame
+        overlap (float): fraction of a tile shared with its neighbors, objects this small cut by a tile edge are
+            still whole in the next tile
+        include_full_frame (bool): also run a copy of each frame downscaled to the tile size, for the objects too
+            large to fit in any tile
+
+    Returns:
+        tuple: (boxes, scores, classes, num_detections) with a leading batch dimension of N, like `run_inference`
+    """
+    if isinstance(images_np, (list, tuple)):
+        images_np = np.stack(images_np)
+    height, width = images_np.shape[1:3]
+    windows = tile_windows(height, width, grid=grid, overlap=overlap)
+    tile_height, tile_width = windows[0, 2] - windows[0, 0], windows[0, 3] - windows[0, 1]
+
+    tiles = []
+    for image_np in images_np:
+        tiles.extend(image_np[ymin:ymax, xmin:xmax] for ymin, xmin, ymax, xmax in windows)
+        if include_full_frame:
+            tiles.append(cv2.resize(image_np, (tile_width, tile_height), interpolation=cv2.INTER_AREA))
+    if include_full_frame:
+        windows = np.concatenate([windows, [[0, 0, height, width]]])
+
+    (boxes, scores, classes, num_detections) = run_inference(tiles, sess, detection_graph)
+    num_tiles = len(windows)
+    merged = [merge_tile_detections(windows, height, width, boxes[i:i + num_tiles], scores[i:i + num_tiles],
+                                    classes[i:i + num_tiles], num_detections[i:i + num_tiles], iou_thres=iou_thres,
+                                    min_score_thresh=min_score_thresh, max_detections=max_detections)
+              for i in range(0, len(tiles), num_tiles)]
+    return tuple(np.stack(outputs) for outputs in zip(*merged))
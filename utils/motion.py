@@ -0,0 +1,76 @@
+""" Motion gating: skip the detector on frames in which nothing moved """
+import cv2
+import numpy as np
+
+
+class MotionGate:
+    """ Decides whether anything moved in a camera's view, on small grayscale copies of its frames
+
+    Each frame is downscaled to `width` pixels wide, converted to grayscale and compared with a running average of
+    the previous frames (the background). The frame counts as moving if more than `threshold` of its pixels differ
+    from the background by more than `pixel_thres` grey levels. Slow changes like daylight fade into the background.
+
+    >>> gate = MotionGate(threshold=.01)
+    >>> still = np.zeros((120, 160, 3), np.uint8)
+    >>> gate.is_moving(still), gate.is_moving(still)
+    (True, False)
+    >>> moved = still.copy()
+    >>> moved[40:80, 60:100] = 255
+    >>> gate.is_moving(moved)
+    True
+    >>> gate.frames, gate.skipped
+    (3, 1)
+    """
+
+    def __init__(self, threshold=.005, pixel_thres=25, width=64, learning_rate=.05, max_skip=0):
+        """
+        Args:
+            threshold (float): fraction of changed pixels above which a frame counts as moving, the sensitivity
+            pixel_thres (int): grey level difference for a pixel to count as changed
+            width (int): width the frames are downscaled to before they're compared
+            learning_rate (float): weight of each new frame in the running background
+            max_skip (int): report motion after this many static frames in a row anyway (0 to never force it)
+        """
+        self.threshold = threshold
+        self.pixel_thres = pixel_thres
+        self.width = width
+        self.learning_rate = learning_rate
+        self.max_skip = max_skip
+        self.frames = 0  # frames gated
+        self.skipped = 0  # frames found static
+        self._background = None
+        self._static_run = 0
+
+    def _small_gray(self, frame):
+        height = max(1, int(round(frame.shape[0] * self.width / float(frame.shape[1]))))
+        small = cv2.resize(frame, (self.width, height), interpolation=cv2.INTER_AREA)
+        if small.ndim == 3:
+            small = cv2.cvtColor(small, cv2.COLOR_RGB2GRAY)
+        return small.astype(np.float32)
+
+    def motion(self, frame):
+        """ Fraction of the pixels of `frame` that changed, and fold `frame` into the background
+
+        Returns:
+            float: between 0 and 1, 1 for the first frame (or the first one after the frame size changed)
+        """
+        small = self._small_gray(frame)
+        if self._background is None or self._background.shape != small.shape:
+            self._background = small
+            return 1.
+        changed = np.count_nonzero(np.abs(small - self._background) > self.pixel_thres) / float(small.size)
+        cv2.accumulateWeighted(small, self._background, self.learning_rate)
+        return changed
+
+    def is_moving(self, frame):
+        """ Whether `frame` needs the detector, counting the frames that don't """
+        self.frames += 1
+        if self.motion(frame) > self.threshold or (self.max_skip and self._static_run >= self.max_skip):
+            self._static_run = 0
+            return True
+        self._static_run += 1
+        self.skipped += 1
+        return False
+
+    def __str__(self):
+        return 'frames: {}, skipped (static): {}'.format(self.frames, self.skipped)
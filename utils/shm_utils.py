@@ -0,0 +1,177 @@
+""" Shared memory containers for passing frames between the capture process and the workers without pickling them """
+import time
+import ctypes
+import collections
+from multiprocessing import Lock
+from multiprocessing.sharedctypes import RawArray, RawValue
+
+import numpy as np
+
+from object_detection.constants import OBJECT_VECTOR_DTYPE
+
+
+class SharedFrameRing:
+    """ Fixed number of preallocated uint8 frame slots backed by a single shared memory block
+
+    The capture (parent) process owns the slots: it `acquire`s a free slot, writes a frame into it and passes only
+    the slot index (plus any small metadata) through the queues. Workers convert the frame to RGB in place and run
+    the detector on it, then hand the slot index back. The parent annotates the frame in its slot and `release`s the
+    slot once it has displayed/streamed the output.
+
+    The ring must be created before the worker processes are started so they inherit the shared block.
+
+    >>> ring = SharedFrameRing(num_slots=2, height=4, width=6)
+    >>> ring.frames.shape
+    (2, 4, 6, 3)
+    >>> slot = ring.acquire()
+    >>> ring.write(slot, np.ones((4, 6, 3), dtype=np.uint8))
+    >>> int(ring[slot].sum())
+    72
+    >>> ring.num_free
+    1
+    >>> ring.release(slot)
+    >>> ring.num_free
+    2
+    """
+
+    def __init__(self, num_slots, height, width, channels=3):
+        self.shape = (num_slots, height, width, channels)
+        self._buffer = RawArray(ctypes.c_uint8, int(np.prod(self.shape)))
+        self._free = collections.deque(range(num_slots))
+        self.frames = self._frames_view()
+
+    def _frames_view(self):
+        return np.frombuffer(self._buffer, dtype=np.uint8).reshape(self.shape)
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state['frames']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.frames = self._frames_view()
+
+    def __len__(self):
+        return self.shape[0]
+
+    def __getitem__(self, slot):
+        """ Writable view of the frame in `slot` (no copy) """
+        return self.frames[slot]
+
+    @property
+    def num_free(self):
+        return len(self._free)
+
+    def acquire(self):
+        """ Reserve a free slot (only call from the process that created the ring)
+
+        Returns:
+            int: slot index, or None if every slot is still in flight
+        """
+        if not self._free:
+            return None
+        return self._free.popleft()
+
+    def release(self, slot):
+        """ Return a slot to the free list once its output has been consumed """
+        self._free.append(slot)
+
+    def write(self, slot, frame):
+        """ Copy `frame` into `slot`, the only copy a frame needs on its way to a worker """
+        np.copyto(self.frames[slot], frame)
+
+
+class SharedStateStore:
+    """ Latest object vectors of the video, as versioned snapshots that readers never block on or consume
+
+    In the app the capture process is the only writer: it publishes the object vectors of every frame it annotates
+    (see `annotate_frame` in object_detection_app.py), and the voice commands read them.
+
+    A seqlock over a shared memory block: `publish` bumps the sequence number to odd, copies the object vectors in
+    and bumps it back to even. `read` copies the snapshot out without taking any lock, and retries if the sequence
+    number was odd or changed while it copied, i.e. a publish was in progress. Publishes are serialized on a lock
+    that readers never touch, so any number of readers get the newest snapshot at once.
+
+    A snapshot of a frame captured before the current one is dropped, so frames published out of order never
+    overwrite a newer state.
+
+    Like `SharedFrameRing`, the store must be created before any other process that uses it is started.
+
+    >>> store = SharedStateStore(max_objects=2, dtype=[('category', 'U8'), ('confidence', np.float32)])
+    >>> version, state = store.read()
+    >>> version, len(state)
+    (0, 0)
+    >>> store.publish(np.array([('cup', .9), ('ski', .8), ('dog', .7)], dtype=store.dtype), timestamp=2.)
+    True
+    >>> store.publish(np.array([('cat', .9)], dtype=store.dtype), timestamp=1.)
+    False
+    >>> version, state = store.read()
+    >>> version, state['category'].tolist()
+    (1, ['cup', 'ski'])
+    """
+
+    def __init__(self, max_objects=32, dtype=OBJECT_VECTOR_DTYPE):
+        """
+        Args:
+            max_objects (int): objects kept per snapshot, the first `max_objects` object vectors are kept
+            dtype (np.dtype): structured dtype of the object vectors
+        """
+        self.dtype = np.dtype(dtype)
+        self.max_objects = max_objects
+        self._sequence = RawValue(ctypes.c_int64, 0)  # odd while a snapshot is being written
+        self._num_objects = RawValue(ctypes.c_int64, 0)
+        self._timestamp = RawValue(ctypes.c_double, float('-inf'))
+        self._buffer = RawArray(ctypes.c_uint8, max_objects * self.dtype.itemsize)
+        self._lock = Lock()
+        self.objects = self._objects_view()
+
+    def _objects_view(self):
+        return np.frombuffer(self._buffer, dtype=self.dtype)
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state['objects']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.objects = self._objects_view()
+
+    @property
+    def version(self):
+        """ Number of snapshots published so far, cheap to poll for a new one """
+        return self._sequence.value // 2
+
+    def publish(self, object_vectors, timestamp=None):
+        """ Replace the snapshot with the object vectors of a frame captured at `timestamp` (now by default)
+
+        Returns:
+            bool: False if the frame is older than the current snapshot's and was dropped
+        """
+        timestamp = time.time() if timestamp is None else timestamp
+        num_objects = min(len(object_vectors), self.max_objects)
+        with self._lock:
+            if timestamp < self._timestamp.value:
+                return False
+            self._sequence.value += 1
+            self.objects[:num_objects] = object_vectors[:num_objects]
+            self._num_objects.value = num_objects
+            self._timestamp.value = timestamp
+            self._sequence.value += 1
+        return True
+
+    def read(self):
+        """ Copy of the newest snapshot, without waiting for or consuming it
+
+        Returns:
+            tuple: (version, structured array of object vectors), version 0 and no objects until the first publish
+        """
+        while True:
+            sequence = self._sequence.value
+            if sequence % 2:
+                time.sleep(0)  # the writer is halfway through a publish
+                continue
+            objects = self.objects[:self._num_objects.value].copy()
+            if self._sequence.value == sequence:
+                return sequence // 2, objects
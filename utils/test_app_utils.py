@@ -1,5 +1,11 @@
+import queue
+import threading
 import unittest
-from object_detector_app.utils.app_utils import color_name_to_rgb, standard_colors
+
+import numpy as np
+
+from object_detector_app.utils.app_utils import (color_name_to_rgb, standard_colors, get_batch, prefetch, MicroBatcher,
+                                                 ReorderBuffer, WebcamVideoStream)
 
 
 class TestUtils(unittest.TestCase):
@@ -13,3 +19,132 @@ class TestUtils(unittest.TestCase):
         standard_color_list = set(sorted([color.lower() for color in self.standard_colors]))
         color_common = standard_color_list.intersection(color_list)
         self.assertEqual(len(color_common), len(standard_color_list))
+
+
+class TestGetBatch(unittest.TestCase):
+    def setUp(self):
+        self.q = queue.Queue()
+        for i in range(5):
+            self.q.put(i)
+
+    def test_batch_preserves_order(self):
+        self.assertEqual(get_batch(self.q, batch_size=2), [0, 1])
+        self.assertEqual(get_batch(self.q, batch_size=2), [2, 3])
+
+    def test_partial_batch_after_wait(self):
+        self.assertEqual(get_batch(self.q, batch_size=10, max_wait=.01), [0, 1, 2, 3, 4])
+        self.assertTrue(self.q.empty())
+
+
+class TestMicroBatcher(unittest.TestCase):
+    def setUp(self):
+        self.batches = []
+        self.release = threading.Event()
+
+        def process_batch(items):
+            self.release.wait(1)
+            self.batches.append(list(items))
+            return [item * 10 for item in items]
+
+        self.batcher = MicroBatcher(process_batch, batch_size=4, max_wait=.05).start()
+
+    def tearDown(self):
+        self.release.set()
+        self.batcher.stop()
+
+    def test_concurrent_submits_are_batched(self):
+        results = {}
+
+        def client(i):
+            results[i] = self.batcher.submit(i)
+        threads = [threading.Thread(target=client, args=(i,)) for i in range(8)]
+        for thread in threads:
+            thread.start()
+        self.release.set()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(results, {i: i * 10 for i in range(8)})
+        self.assertEqual(sorted(sum(self.batches, [])), list(range(8)))
+        self.assertLess(len(self.batches), 8)
+        self.assertTrue(all(len(batch) <= 4 for batch in self.batches))
+
+    def test_reraises_batch_error(self):
+        self.release.set()
+        with self.assertRaises(TypeError):
+            self.batcher.submit(None)
+
+
+class TestReorderBuffer(unittest.TestCase):
+    def setUp(self):
+        self.buf = ReorderBuffer(max_wait=1.)
+
+    def test_emits_in_capture_order(self):
+        for seq in [2, 0, 3, 1]:
+            self.buf.push(seq, 'frame{}'.format(seq), now=0.)
+        self.assertEqual([seq for seq, _ in self.buf.pop_ready(now=0.)], [0, 1, 2, 3])
+        self.assertEqual(len(self.buf), 0)
+
+    def test_skips_missing_frame_after_max_wait(self):
+        self.buf.push(1, 'frame1', now=0.)
+        self.assertEqual(self.buf.pop_ready(now=.5), [])
+        self.assertEqual(self.buf.pop_ready(now=1.), [(1, 'frame1')])
+        self.assertEqual(self.buf.skipped, 1)
+
+    def test_drops_late_frame(self):
+        self.buf.push(1, 'frame1', now=0.)
+        self.buf.pop_ready(now=2.)
+        self.assertFalse(self.buf.push(0, 'frame0', now=2.))
+        self.assertEqual(self.buf.dropped, 1)
+        self.assertEqual(self.buf.pop_ready(now=2.), [])
+
+
+class FakeStream:
+    """Stands in for cv2.VideoCapture, returning a new frame each time `release_frame` is set."""
+    def __init__(self):
+        self.release_frame = threading.Event()
+        self.count = 0
+
+    def read(self):
+        self.release_frame.wait(.01)
+        if not self.release_frame.is_set():
+            return False, None
+        self.release_frame.clear()
+        self.count += 1
+        return True, np.full((2, 2, 3), self.count, dtype=np.uint8)
+
+
+class TestWebcamVideoStream(unittest.TestCase):
+    def setUp(self):
+        self.video_capture = WebcamVideoStream(src='does-not-exist.avi', width=2, height=2)
+        self.video_capture.stream = FakeStream()
+        self.video_capture.start()
+
+    def tearDown(self):
+        self.video_capture.stop()
+
+    def test_read_times_out_without_new_frame(self):
+        self.assertIsNone(self.video_capture.read(timeout=.05))
+
+    def test_read_blocks_until_new_frame(self):
+        self.video_capture.stream.release_frame.set()
+        frame = self.video_capture.read(timeout=1.)
+        self.assertEqual(int(frame[0, 0, 0]), 1)
+        self.assertIsNone(self.video_capture.read(timeout=.05))
+
+    def test_read_latest_sequence_number(self):
+        self.video_capture.stream.release_frame.set()
+        frame_id, frame = self.video_capture.read_latest(timeout=1.)
+        self.assertEqual(frame_id, 1)
+        self.assertEqual(self.video_capture.read_latest(timeout=.05, last_id=frame_id)[0], frame_id)
+
+
+class TestPrefetch(unittest.TestCase):
+    def test_preserves_order(self):
+        self.assertEqual(list(prefetch(iter(range(100)), maxsize=3)), list(range(100)))
+
+    def test_reraises_producer_error(self):
+        def frames():
+            yield 1
+            raise IOError('corrupt video')
+        with self.assertRaises(IOError):
+            list(prefetch(frames()))
@@ -0,0 +1,79 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+import tensorflow as tf
+
+from object_detector_app.utils.model_utils import (load_graph_def, load_frozen_graph, merge_tile_detections,
+                                                   run_tiled_inference, tile_windows)
+
+
+def whole_image_detector():
+    """ Graph that detects a single class 1 object filling each image it's fed, with the image's mean as the score """
+    graph = tf.Graph()
+    with graph.as_default():
+        images = tf.placeholder(tf.uint8, [None, None, None, 3], name='image_tensor')
+        num_images = tf.shape(images)[0]
+        tf.tile(tf.constant([[[0., 0., 1., 1.]]]), [num_images, 1, 1], name='detection_boxes')
+        tf.reshape(tf.reduce_mean(tf.cast(images, tf.float32), axis=[1, 2, 3]) / 255., [-1, 1],
+                   name='detection_scores')
+        tf.ones([num_images, 1], name='detection_classes')
+        tf.ones([num_images], name='num_detections')
+    return graph
+
+
+class TestLoadGraph(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.path_to_ckpt = os.path.join(self.tmp_dir, 'frozen_inference_graph.pb')
+        graph = tf.Graph()
+        with graph.as_default():
+            tf.constant([1., 2.], name='detection_scores')
+        with open(self.path_to_ckpt, 'wb') as fid:
+            fid.write(graph.as_graph_def().SerializeToString())
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_graph_def_parsed_once(self):
+        self.assertIs(load_graph_def(self.path_to_ckpt), load_graph_def(self.path_to_ckpt))
+
+    def test_each_graph_imports_cached_graph_def(self):
+        graph1, graph2 = load_frozen_graph(self.path_to_ckpt), load_frozen_graph(self.path_to_ckpt)
+        self.assertIsNot(graph1, graph2)
+        self.assertEqual(graph1.get_tensor_by_name('detection_scores:0').name, 'detection_scores:0')
+
+
+class TestTiledInference(unittest.TestCase):
+    def test_tiles_cover_frame(self):
+        windows = tile_windows(360, 480, grid=(2, 3), overlap=.25)
+        self.assertEqual(len(windows), 6)
+        self.assertEqual(len(set(map(tuple, windows[:, 2:] - windows[:, :2]))), 1)
+        self.assertEqual((windows[:, :2].min(), windows[:, 2].max(), windows[:, 3].max()), (0, 360, 480))
+        self.assertTrue(np.all(windows[1:3, 1] < windows[0:2, 3]))
+
+    def test_duplicates_in_overlap_are_merged(self):
+        windows = np.array([[0, 0, 100, 60], [0, 40, 100, 100]])
+        # the same object, in the overlap of both tiles, plus an object of another class in the second tile only
+        boxes = np.array([[[.2, 45. / 60, .4, 55. / 60], [0., 0., 0., 0.]],
+                          [[.2, 5. / 60, .4, 15. / 60], [.5, .5, .6, .6]]])
+        boxes, scores, classes, num_detections = merge_tile_detections(
+            windows, 100, 100, boxes, np.array([[.9, 0.], [.8, .7]]), np.array([[1, 0], [1, 2]]), np.array([1, 2]),
+            max_detections=5)
+        self.assertEqual(num_detections, 2)
+        np.testing.assert_allclose(boxes[:2], [[.2, .45, .4, .55], [.5, .7, .6, .76]], atol=1e-6)
+        np.testing.assert_allclose(scores, [.9, .7, 0, 0, 0], atol=1e-6)
+        self.assertEqual(classes.tolist(), [1, 2, 0, 0, 0])
+
+    def test_tiles_of_all_frames_run_as_one_batch(self):
+        graph = whole_image_detector()
+        frames = np.zeros((2, 40, 60, 3), dtype=np.uint8)
+        frames[1, :, 30:] = 255
+        with tf.Session(graph=graph) as sess:
+            boxes, scores, classes, num_detections = run_tiled_inference(
+                frames, sess, graph, grid=(1, 2), overlap=0., include_full_frame=False, max_detections=3)
+        self.assertEqual(boxes.shape, (2, 3, 4))
+        self.assertEqual(num_detections.tolist(), [0, 1])
+        np.testing.assert_allclose(boxes[1, 0], [0, .5, 1, 1])
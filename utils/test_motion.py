@@ -0,0 +1,45 @@
+import unittest
+
+import numpy as np
+
+from object_detector_app.utils.motion import MotionGate
+
+
+class TestMotionGate(unittest.TestCase):
+    def setUp(self):
+        self.gate = MotionGate(threshold=.01)
+        self.scene = np.random.RandomState(0).randint(0, 200, size=(240, 320, 3)).astype(np.uint8)
+
+    def test_static_scene_is_skipped(self):
+        results = [self.gate.is_moving(self.scene) for _ in range(10)]
+        self.assertEqual(results, [True] + [False] * 9)
+        self.assertEqual((self.gate.frames, self.gate.skipped), (10, 9))
+
+    def test_moving_object_is_detected(self):
+        self.gate.is_moving(self.scene)
+        frame = self.scene.copy()
+        frame[100:160, 100:180] = 255
+        self.assertTrue(self.gate.is_moving(frame))
+
+    def test_sensitivity(self):
+        frame = self.scene.copy()
+        frame[:12, :16] = 255  # a quarter of a percent of the pixels
+        insensitive, sensitive = MotionGate(threshold=.01), MotionGate(threshold=.001)
+        for gate in (insensitive, sensitive):
+            gate.is_moving(self.scene)
+        self.assertFalse(insensitive.is_moving(frame))
+        self.assertTrue(sensitive.is_moving(frame))
+
+    def test_noise_is_ignored(self):
+        self.gate.is_moving(self.scene)
+        noisy = (self.scene + np.random.RandomState(1).randint(0, 10, size=self.scene.shape)).astype(np.uint8)
+        self.assertFalse(self.gate.is_moving(noisy))
+
+    def test_max_skip_forces_detection(self):
+        gate = MotionGate(max_skip=3)
+        self.assertEqual([gate.is_moving(self.scene) for _ in range(9)],
+                         [True, False, False, False, True, False, False, False, True])
+
+    def test_frame_size_change_counts_as_motion(self):
+        self.gate.is_moving(self.scene)
+        self.assertTrue(self.gate.is_moving(self.scene[:120, :160]))
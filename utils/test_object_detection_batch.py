@@ -0,0 +1,130 @@
+import os
+import json
+import importlib.util
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+import numpy as np
+
+from object_detector_app import object_detection_batch
+from object_detector_app.object_detection_batch import batch_frames, expand_sources, write_records
+
+
+class TestExpandSources(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        for relpath in ('b.jpg', 'a.jpg', 'clips/c.mp4', 'clips/day/d.jpg', 'notes.txt'):
+            path = os.path.join(self.tmp_dir, relpath)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            open(path, 'w').close()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def path(self, relpath):
+        return os.path.join(self.tmp_dir, relpath)
+
+    def test_glob_patterns_are_sorted(self):
+        self.assertEqual(expand_sources([self.path('*.jpg')]), [self.path('a.jpg'), self.path('b.jpg')])
+
+    def test_double_star_is_recursive(self):
+        self.assertEqual(expand_sources([self.path('**/*.jpg')]),
+                         [self.path('a.jpg'), self.path('b.jpg'), self.path('clips/day/d.jpg')])
+
+    def test_duplicates_are_dropped_in_first_seen_order(self):
+        self.assertEqual(expand_sources([self.path('clips/c.mp4'), self.path('*.jpg'), self.path('b.jpg')]),
+                         [self.path('clips/c.mp4'), self.path('a.jpg'), self.path('b.jpg')])
+
+    def test_directories_expand_to_the_media_files_under_them(self):
+        self.assertEqual(expand_sources([self.tmp_dir]),
+                         [self.path('a.jpg'), self.path('b.jpg'), self.path('clips/c.mp4'), self.path('clips/day/d.jpg')])
+
+    def test_patterns_matching_directories_expand_them(self):
+        self.assertEqual(expand_sources([self.path('cl*')]), [self.path('clips/c.mp4'), self.path('clips/day/d.jpg')])
+
+    def test_missing_files_and_empty_patterns_are_dropped(self):
+        self.assertEqual(expand_sources([self.path('missing.mp4'), self.path('*.png')]), [])
+
+
+class TestBatchFrames(unittest.TestCase):
+    def frames(self, shapes):
+        return [('cam.mp4', i, np.zeros(shape, dtype=np.uint8)) for i, shape in enumerate(shapes)]
+
+    def batch_indices(self, shapes, batch_size):
+        return [[frame_index for _, frame_index, _ in batch]
+                for batch in batch_frames(iter(self.frames(shapes)), batch_size)]
+
+    def test_batches_hold_up_to_batch_size_frames(self):
+        self.assertEqual(self.batch_indices([(4, 6, 3)] * 5, 2), [[0, 1], [2, 3], [4]])
+
+    def test_a_new_frame_size_starts_a_new_batch(self):
+        shapes = [(4, 6, 3), (4, 6, 3), (4, 6, 3), (8, 6, 3), (4, 6, 3), (4, 6, 1), (4, 6, 1)]
+        batches = list(batch_frames(iter(self.frames(shapes)), 4))
+        self.assertEqual([[i for _, i, _ in batch] for batch in batches], [[0, 1, 2], [3], [4], [5, 6]])
+        for batch in batches:
+            # every batch can be stacked into one input tensor
+            self.assertEqual(np.stack([frame for _, _, frame in batch]).shape[0], len(batch))
+
+    def test_no_frames_no_batches(self):
+        self.assertEqual(self.batch_indices([], 4), [])
+
+
+class TestWriteRecords(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_jsonl_has_one_line_per_frame(self):
+        batch = [('cam.mp4', 0, np.zeros((360, 480, 3), dtype=np.uint8)),
+                 ('cam.mp4', 1, np.zeros((360, 480, 3), dtype=np.uint8))]
+        boxes = np.array([[[.1, .2, .3, .4], [.5, .6, .7, .8], [0., 0., 1., 1.]]] * 2)
+        scores = np.array([[.9, .6, .2], [.3, .2, .1]])
+        classes = np.array([[1, 18, 3], [1, 18, 3]])
+        output_path = os.path.join(self.tmp_dir, 'detections.jsonl')
+
+        # stands in for a pool worker's session and graph, see `_init_worker`
+        with mock.patch.dict(object_detection_batch._worker, sess=None, graph=None), \
+                mock.patch.object(object_detection_batch, 'run_inference',
+                                  return_value=(boxes, scores, classes, np.array([3, 3]))):
+            records = object_detection_batch._detect_batch(batch, min_score_thresh=.5)
+        self.assertEqual(write_records(iter(records), output_path), (2, 2))
+
+        with open(output_path) as fin:
+            lines = [json.loads(line) for line in fin]
+        self.assertEqual(len(lines), 2)
+        for line in lines:
+            self.assertEqual(set(line), {'source', 'frame', 'height', 'width', 'boxes', 'scores', 'classes', 'names'})
+        self.assertEqual(lines[0], {'source': 'cam.mp4', 'frame': 0, 'height': 360, 'width': 480,
+                                    'boxes': [[.1, .2, .3, .4], [.5, .6, .7, .8]], 'scores': [.9, .6],
+                                    'classes': [1, 18], 'names': ['person', 'dog']})
+        self.assertEqual(lines[1], {'source': 'cam.mp4', 'frame': 1, 'height': 360, 'width': 480,
+                                    'boxes': [], 'scores': [], 'classes': [], 'names': []})
+
+    @unittest.skipUnless(importlib.util.find_spec('pyarrow'), 'Parquet output needs pyarrow')
+    def test_parquet_has_one_row_per_detection(self):
+        import pandas as pd
+        records = [{'source': 'cam.mp4', 'frame': 0, 'boxes': [[.1, .2, .3, .4], [.5, .6, .7, .8]],
+                    'scores': [.9, .6], 'classes': [1, 18], 'names': ['person', 'dog']},
+                   {'source': 'cam.mp4', 'frame': 1, 'boxes': [], 'scores': [], 'classes': [], 'names': []}]
+        output_path = os.path.join(self.tmp_dir, 'detections.parquet')
+        self.assertEqual(write_records(iter(records), output_path), (2, 2))
+
+        table = pd.read_parquet(output_path)
+        self.assertEqual(list(table.columns), ['source', 'frame', 'class_id', 'name', 'score',
+                                               'ymin', 'xmin', 'ymax', 'xmax'])
+        self.assertEqual(table['name'].tolist(), ['person', 'dog'])
+        self.assertEqual(table['xmax'].tolist(), [.4, .8])
+
+    def test_no_records_writes_an_empty_file(self):
+        output_path = os.path.join(self.tmp_dir, 'detections.jsonl')
+        self.assertEqual(write_records(iter([]), output_path), (0, 0))
+        with open(output_path) as fin:
+            self.assertEqual(fin.read(), '')
+
+
+if __name__ == '__main__':
+    unittest.main()
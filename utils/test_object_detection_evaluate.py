@@ -0,0 +1,60 @@
+import os
+import json
+import shutil
+import tempfile
+import unittest
+
+from object_detector_app.object_detection_evaluate import evaluate_dir, find_file_pairs, summarize
+
+
+def write_records(path, records):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w') as fout:
+        for record in records:
+            fout.write(json.dumps(record) + '\n')
+
+
+def record(frame, classes, scores=None, source='cam.mp4'):
+    record = {'source': source, 'frame': frame, 'boxes': [[.1, .1, .5, .5]] * len(classes), 'classes': classes}
+    if scores is not None:
+        record['scores'] = scores
+    return record
+
+
+class TestEvaluate(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.detections_dir = os.path.join(self.tmp_dir, 'detections')
+        self.groundtruth_dir = os.path.join(self.tmp_dir, 'groundtruth')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def _write(self, directory, relpath, records):
+        path = os.path.join(directory, relpath)
+        write_records(path, records)
+        return path
+
+    def test_pairs_files_of_both_directories(self):
+        both = self._write(self.detections_dir, 'a/both.jsonl', [])
+        both_groundtruth = self._write(self.groundtruth_dir, 'a/both.jsonl', [])
+        detections_only = self._write(self.detections_dir, 'detections_only.jsonl', [])
+        groundtruth_only = self._write(self.groundtruth_dir, 'b/groundtruth_only.jsonl', [])
+        self._write(self.groundtruth_dir, 'notes.txt', [])
+        self.assertEqual(find_file_pairs(self.detections_dir, self.groundtruth_dir),
+                         [(both, both_groundtruth), (None, groundtruth_only), (detections_only, None)])
+
+    def test_groundtruth_without_detections_counts_as_misses(self):
+        self._write(self.detections_dir, 'seen.jsonl', [record(0, [1], [.9])])
+        self._write(self.groundtruth_dir, 'seen.jsonl', [record(0, [1]), record(1, [1])])
+        self._write(self.groundtruth_dir, 'unseen.jsonl', [record(0, [1], source='other.mp4')])
+        for num_score_bins in (None, 100):
+            evaluator = evaluate_dir(self.detections_dir, self.groundtruth_dir, num_classes=1,
+                                     num_score_bins=num_score_bins, num_workers=2)
+            self.assertEqual(evaluator.num_gt_instances_per_class.tolist(), [3])
+            # one of the three objects was found, with a precision of 1
+            self.assertAlmostEqual(summarize(evaluator)['Precision/mAP@0.5IOU'], 1 / 3.)
+
+    def test_empty_directories(self):
+        os.makedirs(self.detections_dir)
+        self.assertIsNone(evaluate_dir(self.detections_dir, self.groundtruth_dir, num_classes=1))
@@ -0,0 +1,96 @@
+import json
+import threading
+import unittest
+import http.client
+
+import cv2
+import numpy as np
+
+from object_detector_app.object_detection_server import decode_frame, make_server
+
+
+class StubBatcher:
+    """ Answers every frame with its shape right away, or raises `error` like a failing detector would """
+    num_items, num_batches = 0, 0
+
+    def __init__(self, error=None):
+        self.error = error
+
+    def submit(self, frame):
+        if self.error is not None:
+            raise self.error
+        return {'height': frame.shape[0], 'width': frame.shape[1], 'mean': float(frame.mean())}
+
+    def mean_batch_size(self):
+        return 0.
+
+
+class TestDecodeFrame(unittest.TestCase):
+    def setUp(self):
+        self.frame = np.zeros((4, 6, 3), dtype=np.uint8)
+        self.frame[..., 0] = 255  # red
+
+    def test_raw(self):
+        frame = decode_frame(self.frame.tobytes(), 'application/octet-stream', {'width': ['6'], 'height': ['4']})
+        np.testing.assert_array_equal(frame, self.frame)
+
+    def test_raw_with_wrong_size(self):
+        with self.assertRaises(ValueError):
+            decode_frame(self.frame.tobytes(), 'application/octet-stream', {'width': ['5'], 'height': ['4']})
+        with self.assertRaises(ValueError):
+            decode_frame(self.frame.tobytes(), 'application/octet-stream', {'width': ['6']})
+
+    def test_jpeg_is_decoded_to_rgb(self):
+        _, body = cv2.imencode('.jpg', cv2.cvtColor(self.frame, cv2.COLOR_RGB2BGR))
+        frame = decode_frame(body.tobytes(), 'image/jpeg')
+        self.assertEqual(frame.shape, (4, 6, 3))
+        self.assertGreater(frame[..., 0].mean(), 200)
+        self.assertLess(frame[..., 2].mean(), 50)
+
+    def test_garbage(self):
+        with self.assertRaises(ValueError):
+            decode_frame(b'not an image', 'image/png')
+
+
+class TestDetectionRequestHandler(unittest.TestCase):
+    def serve(self, batcher):
+        server = make_server(batcher, port=0)
+        thread = threading.Thread(target=server.serve_forever)
+        thread.start()
+        self.addCleanup(thread.join)
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        return http.client.HTTPConnection(*server.server_address)
+
+    def post(self, connection, body, content_type, path='/detect'):
+        connection.request('POST', path, body=body, headers={'Content-Type': content_type})
+        response = connection.getresponse()
+        return response.status, json.loads(response.read().decode('utf-8'))
+
+    def test_raw_frame(self):
+        connection = self.serve(StubBatcher())
+        status, payload = self.post(connection, bytes(4 * 6 * 3), 'application/octet-stream',
+                                    path='/detect?width=6&height=4')
+        self.assertEqual((status, payload['height'], payload['width']), (200, 4, 6))
+
+    def test_jpeg_frame(self):
+        connection = self.serve(StubBatcher())
+        _, body = cv2.imencode('.jpg', np.full((8, 10, 3), 128, dtype=np.uint8))
+        status, payload = self.post(connection, body.tobytes(), 'image/jpeg')
+        self.assertEqual((status, payload['height'], payload['width']), (200, 8, 10))
+
+    def test_bad_size_is_a_client_error(self):
+        connection = self.serve(StubBatcher())
+        status, payload = self.post(connection, bytes(10), 'application/octet-stream', path='/detect?width=6&height=4')
+        self.assertEqual(status, 400)
+        self.assertIn('expected 72 bytes', payload['error'])
+
+    def test_detector_error_is_a_server_error(self):
+        connection = self.serve(StubBatcher(error=RuntimeError('out of memory')))
+        status, payload = self.post(connection, bytes(4 * 6 * 3), 'application/octet-stream',
+                                    path='/detect?width=6&height=4')
+        self.assertEqual((status, payload['error']), (500, 'RuntimeError: out of memory'))
+
+    def test_unknown_path(self):
+        connection = self.serve(StubBatcher())
+        self.assertEqual(self.post(connection, b'', 'image/jpeg', path='/nope')[0], 404)
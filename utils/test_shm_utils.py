@@ -0,0 +1,68 @@
+import unittest
+from multiprocessing import Process
+
+import numpy as np
+
+from object_detector_app.utils.shm_utils import SharedFrameRing, SharedStateStore
+
+DTYPE = [('category', 'U8'), ('confidence', np.float32)]
+
+
+def _invert_slot(frame_ring, slot):
+    frame_ring[slot][...] = 255 - frame_ring[slot]
+
+
+def _publish(store, category, timestamp):
+    store.publish(np.array([(category, .9)], dtype=store.dtype), timestamp=timestamp)
+
+
+class TestSharedFrameRing(unittest.TestCase):
+    def setUp(self):
+        self.ring = SharedFrameRing(num_slots=3, height=4, width=5)
+
+    def test_acquire_until_exhausted(self):
+        slots = [self.ring.acquire() for _ in range(3)]
+        self.assertEqual(sorted(slots), [0, 1, 2])
+        self.assertIsNone(self.ring.acquire())
+        self.ring.release(slots[1])
+        self.assertEqual(self.ring.acquire(), slots[1])
+
+    def test_child_process_writes_in_place(self):
+        """Test that a worker process writes its output back into the parent's slot."""
+        slot = self.ring.acquire()
+        self.ring.write(slot, np.full((4, 5, 3), 5, dtype=np.uint8))
+        proc = Process(target=_invert_slot, args=(self.ring, slot))
+        proc.start()
+        proc.join()
+        self.assertTrue((self.ring[slot] == 250).all())
+
+
+class TestSharedStateStore(unittest.TestCase):
+    def setUp(self):
+        self.store = SharedStateStore(max_objects=3, dtype=DTYPE)
+
+    def test_reads_do_not_consume(self):
+        _publish(self.store, 'cup', 1.)
+        self.assertEqual(self.store.read()[1]['category'].tolist(), ['cup'])
+        self.assertEqual(self.store.read()[1]['category'].tolist(), ['cup'])
+        self.assertEqual(self.store.version, 1)
+
+    def test_newest_snapshot_wins(self):
+        _publish(self.store, 'cup', 1.)
+        _publish(self.store, 'ski', 3.)
+        _publish(self.store, 'dog', 2.)  # an older frame finished late
+        version, state = self.store.read()
+        self.assertEqual((version, state['category'].tolist()), (2, ['ski']))
+
+    def test_snapshot_is_a_copy(self):
+        _publish(self.store, 'cup', 1.)
+        state = self.store.read()[1]
+        _publish(self.store, 'ski', 2.)
+        self.assertEqual(state['category'].tolist(), ['cup'])
+
+    def test_child_process_publishes(self):
+        proc = Process(target=_publish, args=(self.store, 'cat', 1.))
+        proc.start()
+        proc.join()
+        version, state = self.store.read()
+        self.assertEqual((version, state['category'].tolist()), (1, ['cat']))
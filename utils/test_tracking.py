@@ -0,0 +1,107 @@
+import time
+import unittest
+from multiprocessing import Pool
+
+import numpy as np
+
+from object_detector_app.utils.app_utils import ReorderBuffer
+from object_detector_app.utils.tracking import Tracker
+
+
+def moving_box(t, speed=.05):
+    return np.array([[.2 + speed * t, .1, .4 + speed * t, .3]])
+
+
+def _detect(seq, detect_every=2):
+    """ Stand-in for a worker: detects a moving person (class 1) and a still dog (class 18) on the flagged frames """
+    time.sleep(.01 * (seq % 3))  # so the workers finish out of order
+    if seq % detect_every:
+        return seq, None
+    return seq, (np.concatenate([moving_box(seq), [[.6, .6, .9, .9]]]), np.array([1, 18]), np.array([.9, .8]))
+
+
+class TestTracker(unittest.TestCase):
+    def setUp(self):
+        self.tracker = Tracker(detect_every=3, max_misses=1)
+
+    def test_instance_persists_while_object_moves(self):
+        for t in range(5):
+            boxes, classes, scores, instances = self.tracker.update(moving_box(t), np.array([1]), np.array([.9]),
+                                                                    now=float(t))
+            self.assertEqual(instances.tolist(), [1])
+        np.testing.assert_allclose(self.tracker.velocities[0], [.05, 0, .05, 0], atol=.01)
+
+    def test_predicts_between_detections(self):
+        self.tracker.update(moving_box(0), np.array([1]), np.array([.9]), now=0.)
+        self.tracker.update(moving_box(1), np.array([1]), np.array([.9]), now=1.)
+        boxes, classes, scores, instances = self.tracker.predict(now=1.5)
+        self.assertTrue(np.all(boxes[0] > moving_box(1)[0] - 1e-9))
+        self.assertLess(scores[0], .9)
+        self.assertEqual(instances.tolist(), [1])
+
+    def test_new_objects_and_other_classes_get_new_instances(self):
+        self.tracker.update(moving_box(0), np.array([1]), np.array([.9]), now=0.)
+        boxes, classes, scores, instances = self.tracker.update(
+            np.concatenate([moving_box(0), moving_box(0), [[.7, .7, .9, .9]]]), np.array([1, 2, 1]),
+            np.array([.9, .8, .7]), now=1.)
+        self.assertEqual(sorted(zip(classes.tolist(), instances.tolist())), [(1, 1), (1, 3), (2, 2)])
+
+    def test_low_scoring_detections_are_ignored(self):
+        boxes, classes, scores, instances = self.tracker.update(moving_box(0), np.array([1]), np.array([.3]), now=0.)
+        self.assertEqual(len(instances), 0)
+
+    def test_lost_tracks_are_dropped(self):
+        self.tracker.update(moving_box(0), np.array([1]), np.array([.9]), now=0.)
+        self.assertEqual(len(self.tracker.update(np.zeros((0, 4)), np.zeros(0), np.zeros(0), now=1.)[3]), 1)
+        self.assertEqual(len(self.tracker.update(np.zeros((0, 4)), np.zeros(0), np.zeros(0), now=2.)[3]), 0)
+
+    def test_detects_every_k_frames(self):
+        detected = []
+        for t in range(7):
+            detected.append(self.tracker.should_detect())
+            if detected[-1]:
+                self.tracker.update(moving_box(t, speed=.001), np.array([1]), np.array([.9]), now=float(t))
+            else:
+                self.tracker.predict(now=float(t))
+        self.assertEqual(detected, [True, False, False, True, False, False, True])
+
+    def test_schedule_matches_should_detect(self):
+        self.tracker.update(moving_box(0), np.array([1]), np.array([.9]), now=0.)
+        self.assertEqual(self.tracker.schedule(6).tolist(), [False, False, True, False, False, True])
+
+    def test_detects_early_when_confidence_decays(self):
+        self.tracker.update(moving_box(0), np.array([1]), np.array([.52]), now=0.)
+        self.assertTrue(self.tracker.should_detect())
+
+    def test_schedule_counts_frames_still_in_flight(self):
+        self.tracker.update(moving_box(0), np.array([1]), np.array([.9]), now=0.)
+        self.assertFalse(self.tracker.should_detect(pending=[False]))
+        self.assertTrue(self.tracker.should_detect(pending=[False, False]))
+        self.assertFalse(self.tracker.should_detect(pending=[False, False, True]))
+        self.assertEqual(self.tracker.schedule(3, pending=[False]).tolist(), [False, True, False])
+
+    def test_pending_detection_refreshes_decayed_confidence(self):
+        self.tracker.update(moving_box(0), np.array([1]), np.array([.52]), now=0.)
+        self.assertFalse(self.tracker.should_detect(pending=[True]))
+
+    def test_hold_keeps_tracks_without_decay(self):
+        self.tracker.update(moving_box(0), np.array([1]), np.array([.9]), now=0.)
+        self.tracker.update(moving_box(1), np.array([1]), np.array([.9]), now=1.)
+        held = self.tracker.hold(now=2.)[0]
+        np.testing.assert_allclose(self.tracker.hold(now=10.)[0], held)
+        self.assertEqual(self.tracker.scores.tolist(), [.9])
+
+
+class TestTrackingAcrossWorkers(unittest.TestCase):
+    def test_instances_are_unique_and_persist_across_workers(self):
+        tracker, reorder_buffer, instances = Tracker(), ReorderBuffer(max_wait=10), []
+        with Pool(2) as pool:
+            for seq, detections in pool.imap_unordered(_detect, range(8)):
+                reorder_buffer.push(seq, detections)
+                for seq, detections in reorder_buffer.pop_ready():
+                    if detections is None:
+                        tracks = tracker.predict(now=float(seq))
+                    else:
+                        tracks = tracker.update(*detections, now=float(seq))
+                    instances.append(dict(zip(tracks[1].tolist(), tracks[3].tolist())))
+        self.assertEqual(instances, [{1: 1, 18: 2}] * 8)
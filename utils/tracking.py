@@ -0,0 +1,209 @@
+""" Tracking detected objects between detector runs, so the detector doesn't have to run on every frame """
+import time
+
+import numpy as np
+
+from object_detection.utils import np_box_ops
+
+
+class Tracker:
+    """ Multi-object tracker: IoU association of detections to tracks plus constant-velocity prediction in between
+
+    Each track keeps the box, class and score of the detection it was last matched to, a smoothed velocity of its box
+    coordinates (per second, so frames may arrive at any rate) and a persistent instance id. On frames the detector
+    runs on, call `update` with its detections; on the others, `predict` extrapolates the tracks and decays their
+    confidence. `should_detect` says which one a frame needs: every `detect_every`-th frame, or sooner once a track's
+    confidence would fall below `min_score`.
+
+    >>> tracker = Tracker(detect_every=3)
+    >>> boxes, classes, scores, instances = tracker.update(np.array([[.1, .1, .3, .3]]), np.array([1]),
+    ...                                                    np.array([.9]), now=0.)
+    >>> boxes, classes, scores, instances = tracker.update(np.array([[.2, .1, .4, .3]]), np.array([1]),
+    ...                                                    np.array([.9]), now=1.)
+    >>> instances.tolist()
+    [1]
+    >>> tracker.should_detect()
+    False
+    >>> boxes, classes, scores, instances = tracker.predict(now=2.)
+    >>> boxes.round(2).tolist(), instances.tolist()
+    ([[0.25, 0.1, 0.45, 0.3]], [1])
+    """
+
+    def __init__(self, detect_every=1, iou_thres=.3, min_score=.5, max_misses=2, confidence_decay=.95,
+                 velocity_smoothing=.5):
+        """
+        Args:
+            detect_every (int): run the detector on every `detect_every`-th frame (1 for every frame)
+            iou_thres (float): minimum IoU between a track's predicted box and a detection of the same class to match
+            min_score (float): detections scoring at or below this are ignored, and a detection is due as soon as a
+                decayed track confidence would drop below it
+            max_misses (int): drop tracks that went unmatched for more than this many detector runs in a row
+            confidence_decay (float): factor a track's confidence is multiplied by for every frame it isn't matched
+            velocity_smoothing (float): weight of the newest velocity measurement in the smoothed velocity
+        """
+        self.detect_every = detect_every
+        self.iou_thres = iou_thres
+        self.min_score = min_score
+        self.max_misses = max_misses
+        self.confidence_decay = confidence_decay
+        self.velocity_smoothing = velocity_smoothing
+
+        self.boxes = np.zeros((0, 4))  # box at the last match
+        self.velocities = np.zeros((0, 4))  # box coordinates per second
+        self.classes = np.zeros(0, dtype=int)
+        self.scores = np.zeros(0)
+        self.instances = np.zeros(0, dtype=np.int32)
+        self.updated_at = np.zeros(0)  # time of the last match
+        self.misses = np.zeros(0, dtype=int)
+        self.frames_since_detection = None  # None until the detector has run once
+        self._next_instance = 1
+
+    def __len__(self):
+        return len(self.instances)
+
+    def schedule(self, num_frames, pending=()):
+        """ Decide up front which of the next `num_frames` frames go through the detector, so they can be batched
+
+        Tracks are assumed to be refreshed by every scheduled detection.
+
+        Args:
+            num_frames (int): number of frames to decide for
+            pending (list of bool): the decisions already taken for frames that come before those, but that haven't
+                reached `update`/`predict` yet (e.g. still in a worker), in capture order
+
+        Returns:
+            np.array: `num_frames` booleans, True for the frames to run the detector on
+        """
+        decisions = list(pending) + [None] * num_frames
+        frames_since_detection = self.frames_since_detection
+        min_score = self.scores.min() if len(self) else None
+        for i, decision in enumerate(decisions):
+            if min_score is not None:
+                min_score *= self.confidence_decay
+            if decision is None:
+                decisions[i] = decision = (frames_since_detection is None or
+                                           frames_since_detection + 1 >= self.detect_every or
+                                           (min_score is not None and min_score <= self.min_score))
+            if decision:
+                frames_since_detection = 0
+                min_score = None
+            elif frames_since_detection is not None:
+                frames_since_detection += 1
+        return np.array(decisions[len(decisions) - num_frames:], dtype=bool)
+
+    def should_detect(self, pending=()):
+        """ Whether the next frame should go through the detector rather than be predicted (see `schedule`) """
+        return bool(self.schedule(1, pending=pending)[0])
+
+    def predicted_boxes(self, now=None):
+        now = time.time() if now is None else now
+        boxes = self.boxes + self.velocities * (now - self.updated_at)[:, np.newaxis]
+        return np.clip(boxes, 0., 1.)
+
+    def _match(self, predicted_boxes, boxes, classes):
+        """ Greedily pair tracks and detections of the same class, highest IoU first
+
+        Returns:
+            tuple: (track indices, detection indices) of the matched pairs
+        """
+        if not len(predicted_boxes) or not len(boxes):
+            return np.zeros(0, dtype=int), np.zeros(0, dtype=int)
+        iou = np_box_ops.iou(predicted_boxes, boxes)
+        iou[self.classes[:, np.newaxis] != classes[np.newaxis, :]] = 0.
+        rows, cols = np.nonzero(iou >= self.iou_thres)
+        order = np.argsort(-iou[rows, cols], kind='mergesort')
+        matched_tracks, matched_detections = [], []
+        used_tracks, used_detections = set(), set()
+        for row, col in zip(rows[order], cols[order]):
+            if row not in used_tracks and col not in used_detections:
+                used_tracks.add(row)
+                used_detections.add(col)
+                matched_tracks.append(row)
+                matched_detections.append(col)
+        return np.array(matched_tracks, dtype=int), np.array(matched_detections, dtype=int)
+
+    def update(self, boxes, classes, scores, now=None):
+        """ Associate the detections of a frame with the tracks, start tracks for new objects and drop lost ones
+
+        Args:
+            boxes (np.array): (N, 4) detected (ymin, xmin, ymax, xmax) boxes, normalized to [0, 1]
+            classes (np.array): N class ids
+            scores (np.array): N detection scores
+            now (float): time the frame was captured, in seconds
+
+        Returns:
+            tuple: (boxes, classes, scores, instances) of the current tracks
+        """
+        now = time.time() if now is None else now
+        keep = np.asarray(scores) > self.min_score
+        boxes = np.asarray(boxes, dtype=float).reshape(-1, 4)[keep]
+        classes, scores = np.asarray(classes)[keep], np.asarray(scores)[keep]
+
+        matched_tracks, matched_detections = self._match(self.predicted_boxes(now), boxes, classes)
+
+        # matched tracks move to their detection, and their velocity towards the measured one
+        elapsed = now - self.updated_at[matched_tracks]
+        moving = elapsed > 0
+        measured = (boxes[matched_detections] - self.boxes[matched_tracks])[moving] / elapsed[moving, np.newaxis]
+        self.velocities[matched_tracks[moving]] += self.velocity_smoothing * (
+            measured - self.velocities[matched_tracks[moving]])
+        self.boxes[matched_tracks] = boxes[matched_detections]
+        self.scores[matched_tracks] = scores[matched_detections]
+        self.updated_at[matched_tracks] = now
+        self.misses += 1
+        self.misses[matched_tracks] = 0
+
+        # unmatched tracks lose confidence and are dropped after too many misses
+        unmatched = np.ones(len(self), dtype=bool)
+        unmatched[matched_tracks] = False
+        self.scores[unmatched] *= self.confidence_decay
+        alive = self.misses <= self.max_misses
+        self._select(alive)
+
+        # unmatched detections start new tracks
+        new = np.ones(len(boxes), dtype=bool)
+        new[matched_detections] = False
+        num_new = int(new.sum())
+        self.boxes = np.concatenate([self.boxes, boxes[new]])
+        self.velocities = np.concatenate([self.velocities, np.zeros((num_new, 4))])
+        self.classes = np.concatenate([self.classes, classes[new]]).astype(int)
+        self.scores = np.concatenate([self.scores, scores[new]])
+        self.instances = np.concatenate([self.instances, np.arange(self._next_instance, self._next_instance + num_new,
+                                                                   dtype=np.int32)])
+        self.updated_at = np.concatenate([self.updated_at, np.full(num_new, now)])
+        self.misses = np.concatenate([self.misses, np.zeros(num_new, dtype=int)])
+        self._next_instance += num_new
+
+        self.frames_since_detection = 0
+        return self.tracks(now)
+
+    def predict(self, now=None):
+        """ Extrapolate the tracks to a frame the detector didn't run on
+
+        Returns:
+            tuple: (boxes, classes, scores, instances) of the current tracks
+        """
+        if self.frames_since_detection is not None:
+            self.frames_since_detection += 1
+        self.scores *= self.confidence_decay
+        return self.tracks(now)
+
+    def hold(self, now=None):
+        """ Keep the tracks where they are for a frame in which nothing moved, without decaying their confidence
+
+        Returns:
+            tuple: (boxes, classes, scores, instances) of the current tracks
+        """
+        now = time.time() if now is None else now
+        self.boxes = self.predicted_boxes(now)
+        self.velocities[:] = 0.
+        self.updated_at[:] = now
+        return self.tracks(now)
+
+    def tracks(self, now=None):
+        """ (boxes, classes, scores, instances) of the current tracks, with the boxes predicted at time `now` """
+        return self.predicted_boxes(now), self.classes.copy(), self.scores.copy(), self.instances.copy()
+
+    def _select(self, mask):
+        for name in ('boxes', 'velocities', 'classes', 'scores', 'instances', 'updated_at', 'misses'):
+            setattr(self, name, getattr(self, name)[mask])